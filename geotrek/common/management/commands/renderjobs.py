@@ -0,0 +1,66 @@
+import time
+import logging
+from optparse import make_option
+from multiprocessing.pool import ThreadPool
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from geotrek.common import rendering
+
+
+logger = logging.getLogger(__name__)
+
+
+def render(job, rooturl):
+    try:
+        rendering.render(job, rooturl)
+        rendering.done(job)
+    except Exception as e:
+        # Claimed again after timeout
+        logger.exception("Could not render %s: %s" % (job, e))
+    finally:
+        # Each thread has its own connection
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Render queued elevation charts and map images with a pool of workers.\n'
+    help += 'Documents views only serve these files, and queue them when outdated.\n'
+    can_import_settings = True
+
+    option_list = BaseCommand.option_list + (
+        make_option('--workers',
+                    type='int',
+                    default=4,
+                    help='Number of concurrent renderings.'),
+        make_option('--interval',
+                    type='int',
+                    default=0,
+                    help='Seconds between queue polls (process queue once if 0).'),
+        make_option('--rooturl',
+                    default='http://localhost/',
+                    help='Root URL of site, for files queued when objects are saved.'),
+        make_option('--scan',
+                    action='store_true',
+                    default=False,
+                    help='Queue missing or outdated files of all objects first.'),
+    )
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        rooturl = options['rooturl']
+        pool = ThreadPool(workers)
+        if options['scan']:
+            count = rendering.enqueue_outdated(rooturl)
+            logger.info("%s outdated files queued." % count)
+        while True:
+            jobs = rendering.claim(workers * 4)
+            while jobs:
+                pool.map(lambda job: render(job, rooturl), jobs)
+                jobs = rendering.claim(workers * 4)
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+        pool.close()
+        pool.join()
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding model 'RenderJob'
+        db.create_table('fl_t_rendu', (
+            ('id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('kind', self.gf('django.db.models.fields.CharField')(max_length=32, db_column='type')),
+            ('content_type', self.gf('django.db.models.fields.related.ForeignKey')(to=orm['contenttypes.ContentType'], db_column='type_contenu')),
+            ('object_id', self.gf('django.db.models.fields.PositiveIntegerField')(db_column='objet')),
+            ('rooturl', self.gf('django.db.models.fields.CharField')(max_length=256, db_column='url_racine')),
+            ('date_insert', self.gf('django.db.models.fields.DateTimeField')(auto_now_add=True, db_column='date_insert', blank=True)),
+        ))
+        db.send_create_signal('common', ['RenderJob'])
+
+        # Adding unique constraint on 'RenderJob', fields ['kind', 'content_type', 'object_id']
+        db.create_unique('fl_t_rendu', ['type', 'type_contenu', 'objet'])
+
+    def backwards(self, orm):
+        # Removing unique constraint on 'RenderJob', fields ['kind', 'content_type', 'object_id']
+        db.delete_unique('fl_t_rendu', ['type', 'type_contenu', 'objet'])
+
+        # Deleting model 'RenderJob'
+        db.delete_table('fl_t_rendu')
+
+    models = {
+        'authent.structure': {
+            'Meta': {'ordering': "['name']", 'object_name': 'Structure'},
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '256'})
+        },
+        'common.filetype': {
+            'Meta': {'ordering': "['type']", 'object_name': 'FileType', 'db_table': "'fl_b_fichier'"},
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'structure': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['authent.Structure']", 'db_column': "'structure'"}),
+            'type': ('django.db.models.fields.CharField', [], {'max_length': '128'})
+        },
+        'common.organism': {
+            'Meta': {'ordering': "['organism']", 'object_name': 'Organism', 'db_table': "'m_b_organisme'"},
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'organism': ('django.db.models.fields.CharField', [], {'max_length': '128', 'db_column': "'organisme'"}),
+            'structure': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['authent.Structure']", 'db_column': "'structure'"})
+        },
+        'common.renderjob': {
+            'Meta': {'ordering': "['id']", 'unique_together': "(('kind', 'content_type', 'object_id'),)", 'object_name': 'RenderJob', 'db_table': "'fl_t_rendu'"},
+            'content_type': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['contenttypes.ContentType']", 'db_column': "'type_contenu'"}),
+            'date_insert': ('django.db.models.fields.DateTimeField', [], {'auto_now_add': 'True', 'db_column': "'date_insert'", 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'kind': ('django.db.models.fields.CharField', [], {'max_length': '32', 'db_column': "'type'"}),
+            'object_id': ('django.db.models.fields.PositiveIntegerField', [], {'db_column': "'objet'"}),
+            'rooturl': ('django.db.models.fields.CharField', [], {'max_length': '256', 'db_column': "'url_racine'"})
+        },
+        'contenttypes.contenttype': {
+            'Meta': {'ordering': "('name',)", 'unique_together': "(('app_label', 'model'),)", 'object_name': 'ContentType', 'db_table': "'django_content_type'"},
+            'app_label': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '100'})
+        }
+    }
+
+    complete_apps = ['common']
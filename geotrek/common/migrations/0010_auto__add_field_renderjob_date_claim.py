@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding field 'RenderJob.date_claim'
+        db.add_column('fl_t_rendu', 'date_claim',
+                      self.gf('django.db.models.fields.DateTimeField')(null=True, db_column='date_prise', blank=True),
+                      keep_default=False)
+
+    def backwards(self, orm):
+        # Deleting field 'RenderJob.date_claim'
+        db.delete_column('fl_t_rendu', 'date_prise')
+
+    models = {
+        'authent.structure': {
+            'Meta': {'ordering': "['name']", 'object_name': 'Structure'},
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '256'})
+        },
+        'common.filetype': {
+            'Meta': {'ordering': "['type']", 'object_name': 'FileType', 'db_table': "'fl_b_fichier'"},
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'structure': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['authent.Structure']", 'db_column': "'structure'"}),
+            'type': ('django.db.models.fields.CharField', [], {'max_length': '128'})
+        },
+        'common.organism': {
+            'Meta': {'ordering': "['organism']", 'object_name': 'Organism', 'db_table': "'m_b_organisme'"},
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'organism': ('django.db.models.fields.CharField', [], {'max_length': '128', 'db_column': "'organisme'"}),
+            'structure': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['authent.Structure']", 'db_column': "'structure'"})
+        },
+        'common.renderjob': {
+            'Meta': {'ordering': "['id']", 'unique_together': "(('kind', 'content_type', 'object_id'),)", 'object_name': 'RenderJob', 'db_table': "'fl_t_rendu'"},
+            'content_type': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['contenttypes.ContentType']", 'db_column': "'type_contenu'"}),
+            'date_claim': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'db_column': "'date_prise'", 'blank': 'True'}),
+            'date_insert': ('django.db.models.fields.DateTimeField', [], {'auto_now_add': 'True', 'db_column': "'date_insert'", 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'kind': ('django.db.models.fields.CharField', [], {'max_length': '32', 'db_column': "'type'"}),
+            'object_id': ('django.db.models.fields.PositiveIntegerField', [], {'db_column': "'objet'"}),
+            'rooturl': ('django.db.models.fields.CharField', [], {'max_length': '256', 'db_column': "'url_racine'"})
+        },
+        'contenttypes.contenttype': {
+            'Meta': {'ordering': "('name',)", 'unique_together': "(('app_label', 'model'),)", 'object_name': 'ContentType', 'db_table': "'django_content_type'"},
+            'app_label': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '100'})
+        }
+    }
+
+    complete_apps = ['common']
@@ -1,6 +1,7 @@
 from django.db import models
 from django.db.models import Manager as DefaultManager
 from django.utils.translation import ugettext_lazy as _
+from django.contrib.contenttypes.models import ContentType
 
 from paperclip.models import FileType as BaseFileType
 
@@ -80,3 +81,33 @@ class FileType(StructureRelated, BaseFileType):
     """
     class Meta(BaseFileType.Meta):
         db_table = 'fl_b_fichier'
+
+
+class RenderJob(models.Model):
+    """
+    Queued rendering of an object file (elevation chart, map image),
+    processed in background by ``renderjobs`` command.
+    """
+    ELEVATION_CHART = 'elevation_chart'
+    MAP_IMAGE = 'map_image'
+    KIND_CHOICES = (
+        (ELEVATION_CHART, _(u"Elevation chart")),
+        (MAP_IMAGE, _(u"Map image")),
+    )
+
+    kind = models.CharField(max_length=32, choices=KIND_CHOICES, db_column='type', verbose_name=_(u"Kind"))
+    content_type = models.ForeignKey(ContentType, db_column='type_contenu', verbose_name=_(u"Content type"))
+    object_id = models.PositiveIntegerField(db_column='objet', verbose_name=_(u"Object"))
+    rooturl = models.CharField(max_length=256, db_column='url_racine', verbose_name=_(u"Root URL"))
+    date_insert = models.DateTimeField(auto_now_add=True, editable=False, verbose_name=_(u"Insertion date"), db_column='date_insert')
+    date_claim = models.DateTimeField(null=True, blank=True, editable=False, verbose_name=_(u"Claim date"), db_column='date_prise')
+
+    class Meta:
+        db_table = 'fl_t_rendu'
+        verbose_name = _(u"Render job")
+        verbose_name_plural = _(u"Render jobs")
+        unique_together = (('kind', 'content_type', 'object_id'),)
+        ordering = ['id']
+
+    def __unicode__(self):
+        return u"%s %s-%s" % (self.kind, self.content_type, self.object_id)
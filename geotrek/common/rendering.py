@@ -0,0 +1,151 @@
+"""
+    Background rendering of objects files (elevation charts, map images).
+
+    Documents views only serve rendered files: outdated ones are queued
+    (see ``RenderJob``) when objects are saved or when served, and rendered
+    by a pool of workers (``renderjobs`` command). Views render
+    synchronously only when no file exists yet.
+
+    Models list their files with ``get_rendered_files()``, and provide
+    ``render_elevation_chart(request)`` and/or ``render_map_image(rooturl)``.
+"""
+import os
+import calendar
+import logging
+from urlparse import urlparse
+
+from django.db import connection, transaction
+from django.db.models import get_models
+from django.db.models.signals import post_save
+from django.http import HttpRequest
+from django.contrib.contenttypes.models import ContentType
+
+from .models import RenderJob
+
+
+logger = logging.getLogger(__name__)
+
+
+def is_outdated(path, date):
+    """
+    True if file at ``path`` was written before ``date`` (aware datetime).
+    """
+    timestamp = calendar.timegm(date.utctimetuple()) + date.microsecond / 1000000.0
+    return os.path.getmtime(path) < timestamp
+
+
+def prepare(obj, kind, path, date, render, rooturl):
+    """
+    Makes sure file at ``path`` exists: rendered right now with ``render()``
+    if missing (or empty), rendered in background if older than ``date``.
+    """
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        render()
+    elif is_outdated(path, date):
+        enqueue(obj, kind, rooturl)
+
+
+# Claimed jobs are given to another worker after this delay (seconds)
+CLAIM_TIMEOUT = 600
+
+
+def enqueue(obj, kind, rooturl):
+    content_type = ContentType.objects.get_for_model(obj)
+    job, created = RenderJob.objects.get_or_create(kind=kind, content_type=content_type, object_id=obj.pk,
+                                                   defaults={'rooturl': rooturl})
+    if not created and job.date_claim is not None:
+        # Being rendered from previous version: render again
+        RenderJob.objects.filter(pk=job.pk).update(date_claim=None)
+
+
+def enqueue_saved(sender, instance, **kwargs):
+    """
+    Queue rendering of existing files of saved objects (``post_save``).
+    Root URL is given by workers.
+    """
+    if not hasattr(sender, 'get_rendered_files') or getattr(instance, 'deleted', False):
+        return
+    for kind, path, date in instance.get_rendered_files():
+        if os.path.exists(path):
+            enqueue(instance, kind, '')
+
+post_save.connect(enqueue_saved, dispatch_uid='rendering_enqueue_saved')
+
+
+def enqueue_outdated(rooturl):
+    """
+    Queue rendering of missing or outdated files, of all models. Files
+    of saved objects are queued anyway, this is only useful once (e.g.
+    after upgrade or restore).
+    """
+    count = 0
+    for model in get_models():
+        if not hasattr(model, 'get_rendered_files'):
+            continue
+        manager = model.objects
+        queryset = manager.existing() if hasattr(manager, 'existing') else manager.all()
+        for obj in queryset.iterator():
+            for kind, path, date in obj.get_rendered_files():
+                if not os.path.exists(path) or is_outdated(path, date):
+                    enqueue(obj, kind, rooturl)
+                    count += 1
+    return count
+
+
+def claim(count):
+    """
+    Marks at most ``count`` jobs of queue as claimed, and returns them.
+    Concurrent workers never get the same jobs. Jobs stay in queue until
+    ``done()``, and are claimed again after ``CLAIM_TIMEOUT`` (e.g. if
+    worker died or rendering failed).
+    """
+    cursor = connection.cursor()
+    cursor.execute("""
+        UPDATE fl_t_rendu SET date_prise = now()
+        WHERE id IN (SELECT id FROM fl_t_rendu
+                     WHERE date_prise IS NULL OR date_prise < now() - %s * interval '1 second'
+                     ORDER BY id LIMIT %s FOR UPDATE)
+        RETURNING id, date_prise, type, type_contenu, objet, url_racine
+    """, [CLAIM_TIMEOUT, count])
+    jobs = cursor.fetchall()
+    transaction.commit_unless_managed()
+    return jobs
+
+
+def done(job):
+    """
+    Removes a rendered job from queue, unless it was queued again
+    meanwhile.
+    """
+    cursor = connection.cursor()
+    cursor.execute("DELETE FROM fl_t_rendu WHERE id = %s AND date_prise = %s", job[:2])
+    transaction.commit_unless_managed()
+
+
+def request_for(rooturl):
+    """
+    A request on ``rooturl``, to build absolute URLs outside of views.
+    """
+    url = urlparse(rooturl)
+    request = HttpRequest()
+    request.META['SERVER_NAME'] = url.hostname
+    request.META['SERVER_PORT'] = str(url.port or 80)
+    return request
+
+
+def render(job, rooturl=None):
+    """
+    Renders file of a job returned by ``claim()``. Jobs queued on save
+    are rendered with ``rooturl``.
+    """
+    pk, date_claim, kind, content_type_id, object_id, job_rooturl = job
+    rooturl = job_rooturl or rooturl
+    model = ContentType.objects.get_for_id(content_type_id).model_class()
+    try:
+        obj = model.objects.get(pk=object_id)
+    except model.DoesNotExist:
+        return
+    if kind == RenderJob.ELEVATION_CHART:
+        obj.render_elevation_chart(request_for(rooturl))
+    elif kind == RenderJob.MAP_IMAGE:
+        obj.render_map_image(rooturl)
@@ -8,8 +8,11 @@ from django.core.exceptions import ImproperlyConfigured
 from mapentity.tests import MapEntityTest
 
 from geotrek.settings import EnvIniReader
+from geotrek.core.factories import PathFactory
 from .factories import AttachmentFactory
-from .utils import almostequal, smart_urljoin, sampling
+from .models import RenderJob
+from . import rendering
+from .utils import almostequal, smart_urljoin, sampling, polyline_encode, polyline_decode
 
 
 class CommonTest(MapEntityTest):
@@ -29,6 +32,62 @@ class ViewsTest(TestCase):
         self.assertEqual(response.status_code, 200)
 
 
+class RenderingTest(TestCase):
+    def setUp(self):
+        self.path = PathFactory.create()
+        self.chart = self.path.get_elevation_chart_path()
+        self.request = rendering.request_for('http://localhost/')
+        self.tearDown()
+
+    def tearDown(self):
+        if os.path.exists(self.chart):
+            os.remove(self.chart)
+
+    def test_missing_file_is_rendered_right_away(self):
+        self.path.prepare_elevation_chart(self.request)
+        self.assertTrue(os.path.exists(self.chart))
+        self.assertEqual(RenderJob.objects.count(), 0)
+
+    def test_outdated_file_is_queued(self):
+        with open(self.chart, 'w') as f:
+            f.write('***')
+        os.utime(self.chart, (0, 0))
+        self.path.prepare_elevation_chart(self.request)
+        self.path.prepare_elevation_chart(self.request)
+        self.assertEqual(RenderJob.objects.count(), 1)
+        # Served as is until rendered
+        self.assertEqual(open(self.chart).read(), '***')
+
+        jobs = rendering.claim(10)
+        self.assertEqual(len(jobs), 1)
+        self.assertEqual(rendering.claim(10), [])
+        rendering.render(jobs[0])
+        self.assertFalse(rendering.is_outdated(self.chart, self.path.get_elevation_chart_date()))
+        # Kept in queue until done
+        self.assertEqual(RenderJob.objects.count(), 1)
+        rendering.done(jobs[0])
+        self.assertEqual(RenderJob.objects.count(), 0)
+
+    def test_saved_object_is_queued(self):
+        self.path.save()
+        self.assertEqual(RenderJob.objects.count(), 0)
+        with open(self.chart, 'w') as f:
+            f.write('***')
+        self.path.save()
+        self.assertEqual(RenderJob.objects.count(), 1)
+        jobs = rendering.claim(10)
+        self.assertEqual(jobs[0][-1], '')
+        # Saved while rendering: queued again
+        self.path.save()
+        rendering.done(jobs[0])
+        self.assertEqual(RenderJob.objects.count(), 1)
+        self.assertEqual(len(rendering.claim(10)), 1)
+
+    def test_request_for_rooturl(self):
+        request = rendering.request_for('http://server.com:8080/')
+        self.assertEqual(request.build_absolute_uri('/foo/'), 'http://server.com:8080/foo/')
+
+
 class UtilsTest(TestCase):
     def test_almostequal(self):
         self.assertTrue(almostequal(0.001, 0.002))
@@ -49,6 +108,12 @@ class UtilsTest(TestCase):
         self.assertEqual('http://server.com/foo/bar/path-12.ext',
                          smart_urljoin('http://server.com/foo/', '/bar/path-12.ext'))
 
+    def test_polyline(self):
+        self.assertEqual('_p~iF~ps|U_ulLnnqC_mqNvxq`@',
+                         polyline_encode([(3850000, -12020000), (4070000, -12095000), (4325200, -12645300)]))
+        rows = [[0, 1200, 145000, 4312000], [25, 1187, 145012, 4312031]]
+        self.assertEqual(rows, polyline_decode(polyline_encode(rows), 4))
+
     def test_sampling(self):
         self.assertEqual([0, 2, 4, 6, 8], sampling(range(10), 5))
         self.assertEqual([0, 3, 6, 9], sampling(range(10), 3))
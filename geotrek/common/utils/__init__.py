@@ -150,3 +150,52 @@ def sampling(values, total):
     """
     step = max(1, int(len(values)/total))
     return list(islice(values, 0, len(values), step))
+
+
+def polyline_encode(rows):
+    """
+    Encode rows of integers with Google's polyline algorithm, each value
+    as the difference with the same value of previous row.
+    >>> polyline_encode([(3850000, -12020000), (4070000, -12095000)])
+    '_p~iF~ps|U_ulLnnqC'
+    """
+    chunks = []
+    previous = None
+    for row in rows:
+        if previous is None:
+            previous = [0] * len(row)
+        for i, value in enumerate(row):
+            delta = value - previous[i]
+            previous[i] = value
+            delta = ~(delta << 1) if delta < 0 else delta << 1
+            while delta >= 0x20:
+                chunks.append(chr((0x20 | (delta & 0x1f)) + 63))
+                delta >>= 5
+            chunks.append(chr(delta + 63))
+    return ''.join(chunks)
+
+
+def polyline_decode(encoded, dimensions=2):
+    """
+    Decode rows of ``dimensions`` integers encoded with ``polyline_encode()``.
+    >>> polyline_decode('_p~iF~ps|U_ulLnnqC')
+    [[3850000, -12020000], [4070000, -12095000]]
+    """
+    values = []
+    index = 0
+    while index < len(encoded):
+        result, shift = 0, 0
+        while True:
+            byte = ord(encoded[index]) - 63
+            index += 1
+            result |= (byte & 0x1f) << shift
+            shift += 5
+            if byte < 0x20:
+                break
+        values.append(~(result >> 1) if result & 1 else result >> 1)
+    rows = []
+    previous = [0] * dimensions
+    for i in range(0, len(values), dimensions):
+        previous = [p + v for p, v in zip(previous, values[i:i + dimensions])]
+        rows.append(previous)
+    return rows
@@ -2,6 +2,7 @@ import re
 import os
 import logging
 import traceback
+import itertools
 from functools import wraps
 
 from django.db import connection, transaction, models
@@ -10,6 +11,8 @@ from django.conf import settings
 
 logger = logging.getLogger(__name__)
 
+_stream_ids = itertools.count()
+
 
 def debug_pg_notices(f):
 
@@ -90,3 +93,27 @@ def load_sql_files(app_label):
             raise
         else:
             transaction.commit_unless_managed()
+
+
+def stream_queryset(qs, itersize=2000):
+    """
+    Iterate over rows of a ``values_list()`` queryset with a server-side
+    cursor: rows are fetched by chunks instead of being loaded at once.
+    """
+    sql, params = qs.query.sql_with_params()
+    return stream_sql(sql, params, itersize)
+
+
+def stream_sql(sql, params=None, itersize=2000):
+    """
+    Iterate over rows of a raw SQL query with a server-side cursor.
+    """
+    connection.cursor()  # Make sure connection is opened
+    cursor = connection.connection.cursor(name='stream_%s' % next(_stream_ids))
+    cursor.itersize = itersize
+    try:
+        cursor.execute(sql, params or [])
+        for row in cursor:
+            yield row
+    finally:
+        cursor.close()
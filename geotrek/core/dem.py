@@ -0,0 +1,251 @@
+"""
+    In-process sampling of DEM.
+
+    ``loaddem`` keeps a copy of the clipped DEM as a NumPy array (see
+    ``settings.DEM_ARRAY_PATH``), which is memory-mapped here and sampled
+    without querying the database.
+
+    Samples follow the same rules as SQL functions (see ``ft_drape_line()``
+    and ``ft_elevation_infos()``), thus results are identical.
+"""
+import os
+import json
+import math
+import logging
+
+from django.conf import settings
+from django.contrib.gis.geos import Point, MultiPoint
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+logger = logging.getLogger(__name__)
+
+
+def pg_integer(value):
+    """
+    Cast float to integer like PostgreSQL (round half to even).
+    """
+    if value is None or math.isnan(value):
+        return None
+    return int(numpy.rint(value))
+
+
+def length2d(coords):
+    return sum(math.hypot(b[0] - a[0], b[1] - a[1]) for a, b in zip(coords[:-1], coords[1:]))
+
+
+def length3d(coords):
+    """
+    Length of line, or of several lines (like ``ST_3DLength()``).
+    """
+    if coords and isinstance(coords[0][0], tuple):
+        return sum(length3d(line) for line in coords)
+    return sum(math.sqrt(sum((v - u) ** 2 for u, v in zip(a, b)))
+               for a, b in zip(coords[:-1], coords[1:]))
+
+
+class DEMSampler(object):
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime = os.path.getmtime(path)
+        self.values = numpy.load(path, mmap_mode='r')
+        with open(path + '.json') as f:
+            meta = json.load(f)
+        self.origin_x, self.scale_x, _, self.origin_y, _, self.scale_y = meta['geotransform']
+        self.nodata = meta.get('nodata')
+
+    @classmethod
+    def store(cls, dataset, path):
+        """
+        Store first band of GDAL ``dataset`` for sampling, next to ``path``.
+        Files are only used once published (see ``publish()``).
+        """
+        band = dataset.GetRasterBand(1)
+        meta = {'geotransform': dataset.GetGeoTransform(),
+                'nodata': band.GetNoDataValue()}
+        with open(path + '.tmp', 'wb') as f:
+            numpy.save(f, band.ReadAsArray())
+        with open(path + '.json.tmp', 'w') as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def publish(cls, path):
+        """
+        Replace DEM at ``path`` with the one stored (atomically, sampler
+        may be in use).
+        """
+        os.rename(path + '.json.tmp', path + '.json')
+        os.rename(path + '.tmp', path)
+
+    @classmethod
+    def discard(cls, path):
+        """
+        Remove DEM stored but not published.
+        """
+        for tmp in (path + '.tmp', path + '.json.tmp'):
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def _values_at(self, rows, cols):
+        height, width = self.values.shape
+        inside = (rows >= 0) & (rows < height) & (cols >= 0) & (cols < width)
+        result = numpy.empty(rows.shape)
+        result.fill(numpy.nan)
+        values = self.values[rows[inside], cols[inside]].astype(float)
+        if self.nodata is not None:
+            values[values == self.nodata] = numpy.nan
+        result[inside] = values
+        return result
+
+    def sample(self, xs, ys, method='nearest'):
+        """
+        Elevations of points (NaN outside DEM or on nodata). ``nearest``
+        gives the value of pixel containing points (like ``ST_Value()``),
+        ``bilinear`` interpolates between pixels centers.
+        """
+        cols = (numpy.asarray(xs, dtype=float) - self.origin_x) / self.scale_x
+        rows = (numpy.asarray(ys, dtype=float) - self.origin_y) / self.scale_y
+        if method == 'nearest':
+            return self._values_at(numpy.floor(rows).astype(int),
+                                   numpy.floor(cols).astype(int))
+        if method != 'bilinear':
+            raise ValueError("Unknown sampling method '%s'" % method)
+        height, width = self.values.shape
+        outside = numpy.isnan(self._values_at(numpy.floor(rows).astype(int),
+                                              numpy.floor(cols).astype(int)))
+        # Between borders and first pixels centers, edge values are repeated
+        cols = numpy.clip(cols - 0.5, 0, width - 1)
+        rows = numpy.clip(rows - 0.5, 0, height - 1)
+        col0 = numpy.minimum(numpy.floor(cols), width - 2).clip(0)
+        row0 = numpy.minimum(numpy.floor(rows), height - 2).clip(0)
+        fcol, frow = cols - col0, rows - row0
+        col0, row0 = col0.astype(int), row0.astype(int)
+        col1, row1 = numpy.minimum(col0 + 1, width - 1), numpy.minimum(row0 + 1, height - 1)
+        result = (self._values_at(row0, col0) * (1 - fcol) * (1 - frow) +
+                  self._values_at(row0, col1) * fcol * (1 - frow) +
+                  self._values_at(row1, col0) * (1 - fcol) * frow +
+                  self._values_at(row1, col1) * fcol * frow)
+        result[outside] = numpy.nan
+        return result
+
+    def elevate(self, coords, method='nearest'):
+        """
+        Elevation of points: their own if above zero, DEM otherwise
+        (like ``ft_elevate_point()``). ``None`` outside DEM.
+        """
+        if not coords:
+            return []
+        dem = self.sample([c[0] for c in coords], [c[1] for c in coords], method)
+        elevations = []
+        for c, value in zip(coords, dem):
+            z = c[2] if len(c) > 2 else None
+            if z is not None and (pg_integer(z) or 0) > 0:
+                elevations.append(z)
+            else:
+                elevations.append(pg_integer(value))
+        return elevations
+
+    @classmethod
+    def line_samples(cls, coords, step):
+        """
+        Returns ``(distance, coords)`` samples along line, every ``step``
+        meters (like ``ft_line_samples()``).
+        """
+        distances = [0.0]
+        for a, b in zip(coords[:-1], coords[1:]):
+            distances.append(distances[-1] + length2d([a, b]))
+        length = distances[-1]
+        smart_step = step
+        if length < step:
+            # Keep at least a middle point
+            smart_step = pg_integer(length / 2)
+
+        samples = [(0.0, coords[0])]
+        if smart_step > 0:
+            segment = 0
+            for measure in xrange(smart_step, pg_integer(length) + 1, smart_step):
+                if measure >= length:
+                    break
+                while distances[segment + 1] < measure:
+                    segment += 1
+                a, b = coords[segment], coords[segment + 1]
+                ratio = (measure - distances[segment]) / (distances[segment + 1] - distances[segment])
+                samples.append((float(measure), tuple(u + (v - u) * ratio for u, v in zip(a, b))))
+        samples.append((length, coords[-1]))
+        return samples
+
+    def elevation_profile(self, geometry, precision, offset=0, method='nearest'):
+        """
+        Same as ``AltimetryHelper.elevation_profile()``, for a LineString.
+        """
+        samples = self.line_samples(geometry.coords, precision)
+        elevations = self.elevate([c for d, c in samples], method)
+        points = MultiPoint([Point(c[0], c[1]) for d, c in samples],
+                            srid=geometry.srid or settings.SRID)
+        points.transform(settings.API_SRID)
+        return [(offset + d, p.x, p.y, h)
+                for (d, c), p, h in zip(samples, points, elevations)]
+
+    def elevation_infos(self, geometry, precision=None, method='nearest'):
+        """
+        Elevation-based indicators of a Point or a LineString (like
+        ``ft_elevation_infos()``), keyed by ``AltimetryMixin`` fields names.
+        """
+        precision = precision or settings.ALTIMETRIC_PROFILE_PRECISION
+        if geometry.geom_type == 'Point':
+            [z] = self.elevate([geometry.coords], method)
+            z = pg_integer(z)
+            return dict(length=0.0, slope=0.0, ascent=0, descent=0,
+                        min_elevation=z, max_elevation=z)
+
+        if geometry.geom_type != 'LineString':
+            return dict(length=length3d(geometry.coords), slope=0.0, ascent=0, descent=0,
+                        min_elevation=0, max_elevation=0)
+
+        coords = geometry.coords
+        # Vertices outside DEM are dropped from 3D geometry
+        geom3d = [(c[0], c[1], z) for c, z in zip(coords, self.elevate(coords, method))
+                  if z is not None]
+        elevations = [z for x, y, z in geom3d]
+        infos = dict(min_elevation=pg_integer(min(elevations)) if elevations else None,
+                     max_elevation=pg_integer(max(elevations)) if elevations else None,
+                     slope=0.0)
+        if length2d(geom3d) > 0:
+            infos['slope'] = float(infos['max_elevation'] - infos['min_elevation']) / length2d(coords)
+
+        samples = self.line_samples(coords, precision)
+        draped = [(c[0], c[1], z) for (d, c), z in zip(samples, self.elevate([c for d, c in samples], method))
+                  if z is not None]
+        ascent = descent = 0
+        for a, b in zip(draped[:-1], draped[1:]):
+            gain = pg_integer(b[2]) - pg_integer(a[2])
+            ascent += max(gain, 0)
+            descent += min(gain, 0)
+        infos.update(ascent=ascent, descent=descent, length=length3d(draped))
+        return infos
+
+
+_sampler = {}
+
+
+def get_sampler():
+    """
+    Returns the DEM sampler, or ``None`` if not available (no NumPy, or
+    no DEM stored by ``loaddem``). Sampler is reloaded when DEM changes.
+    """
+    path = settings.DEM_ARRAY_PATH
+    if numpy is None or not path or not os.path.exists(path):
+        return None
+    sampler = _sampler.get('sampler')
+    if sampler is None or sampler.path != path or sampler.mtime != os.path.getmtime(path):
+        try:
+            sampler = _sampler['sampler'] = DEMSampler(path)
+        except (IOError, ValueError) as e:
+            logger.error("Could not load DEM array from '%s': %s" % (path, e))
+            return None
+    return sampler
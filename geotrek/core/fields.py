@@ -11,6 +11,7 @@ import floppyforms as forms
 
 from .models import Topology, Path
 from .widgets import PointLineTopologyWidget, SnappedLineStringWidget
+from .helpers import PathHelper
 
 from geotrek.common.utils import wkt_to_geom
 
@@ -76,18 +77,13 @@ class SnappedLineStringField(forms.gis.LineStringField):
             snaplist = value.get('snap', [])
             if geom.num_coords != len(snaplist):
                 raise ValueError("Snap list length != %s (%s)" % (geom.num_coords, snaplist))
-            paths_pk = [(i, p) for (i, p) in enumerate(snaplist)]
-            paths = [(i, Path.objects.get(pk=pk)) for (i, pk) in paths_pk if pk is not None]
-            paths = dict(paths)
-            coords = list(geom.coords)
-            for i, vertex in enumerate(coords):
-                if len(vertex) == 2:
-                    vertex = (vertex[0], vertex[1], 0.0)
-                path = paths.get(i)
-                if path:
-                    snap = path.snap(Point(*vertex, srid=geom.srid))
-                    vertex = snap.coords
-                coords[i] = vertex
+            coords = [vertex if len(vertex) == 3 else (vertex[0], vertex[1], 0.0)
+                      for vertex in geom.coords]
+            # Snap all vertices at once
+            snapped = [i for (i, pk) in enumerate(snaplist) if pk is not None]
+            pairs = [(int(snaplist[i]), Point(*coords[i], srid=geom.srid)) for i in snapped]
+            for i, point in zip(snapped, PathHelper.snap_many(pairs)):
+                coords[i] = point.coords
             return LineString(*coords, srid=settings.SRID)
         except (TypeError, Path.DoesNotExist, ValueError) as e:
             logger.warning("User input error: %s" % e)
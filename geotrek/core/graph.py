@@ -1,5 +1,10 @@
+import math
+import heapq
+from array import array
 from collections import defaultdict
 
+from geotrek.common.utils.postgresql import stream_queryset
+
 
 def graph_edges_nodes_of_qs(qs, key_modifier=lambda x: x, value_modifier=lambda x: x):
     """
@@ -43,6 +48,32 @@ def graph_edges_nodes_of_qs(qs, key_modifier=lambda x: x, value_modifier=lambda
     }
 
 
+def graph_edges_nodes_of_rows(rows):
+    """
+    Same graph as ``graph_edges_nodes_of_qs()``, built from rows of
+    ``(id, length, start node, end node)`` (e.g. paths node ids), without
+    any geometry parsing.
+    """
+    edges = {}
+    nodes = defaultdict(dict)
+
+    for edge_id, length, k_start_point, k_end_point in rows:
+        if length is None or math.isnan(length):
+            length = 0.0
+        nodes[k_start_point][k_end_point] = edge_id
+        nodes[k_end_point][k_start_point] = edge_id
+        edges[edge_id] = {
+            'id': edge_id,
+            'length': length,
+            'nodes_id': [k_start_point, k_end_point],
+        }
+
+    return {
+        'edges': edges,
+        'nodes': dict(nodes),
+    }
+
+
 def graph_of_qs(qs, key_modifier=lambda x: x, value_modifier=lambda x: x):
     """
     return a graph on the form:
@@ -71,11 +102,21 @@ def graph_of_qs(qs, key_modifier=lambda x: x, value_modifier=lambda x: x):
 json_key_point_modifier = lambda x: '%s_%s' % (x[0], x[1])
 
 
-def get_key_optimizer():
-    next_id = iter(xrange(1, 1000000)).next
-    mapping = defaultdict(next_id)
+def get_key_optimizer(mapping=None):
+    """
+    Returns a function giving integer ids to keys. Ids are kept in ``mapping``,
+    which can be given to carry on numbering of a previous graph.
+    """
+    if mapping is None:
+        mapping = {}
+
+    def optimizer(x):
+        key = mapping.get(x)
+        if key is None:
+            key = mapping[x] = len(mapping) + 1
+        return key
 
-    return lambda x: mapping[x]
+    return optimizer
 
 
 def graph_of_qs_string_keys(qs, **kwargs):
@@ -97,3 +138,198 @@ def optimize_graph(orig_graph):
             g[get_mapping(p2)] = path
 
     return graph
+
+
+class RoutingGraph(object):
+    """
+    Compact graph of paths, used for server-side routing.
+
+    Nodes and edges are stored in flat arrays, adjacency is kept as
+    a compressed list (``offsets`` and ``adjacency``). Nodes keep their
+    coordinates, used by the A* heuristic.
+    """
+
+    def __init__(self):
+        self.node_x = array('d')
+        self.node_y = array('d')
+        self.edge_id = array('l')
+        self.edge_source = array('l')
+        self.edge_target = array('l')
+        self.edge_length = array('d')
+        self.offsets = array('l')
+        self.adjacency = array('l')
+        # Edge id (path pk) -> index in edge arrays
+        self.edges_index = {}
+
+    @classmethod
+    def from_edges(cls, edges, coords=None):
+        """
+        Build graph from an iterable of ``(id, length, start_point, end_point)``,
+        where points are coordinates tuples. If ``coords`` is given, points
+        are node ids, and ``coords`` gives their coordinates.
+        """
+        graph = cls()
+        nodes = {}
+
+        def node_of(point):
+            key = (point[0], point[1]) if coords is None else point
+            node = nodes.get(key)
+            if node is None:
+                node = nodes[key] = len(nodes)
+                x, y = point[:2] if coords is None else coords[point][:2]
+                graph.node_x.append(x)
+                graph.node_y.append(y)
+            return node
+
+        for edge_id, length, start_point, end_point in edges:
+            source, target = node_of(start_point), node_of(end_point)
+            # Weight is never shorter than straight line (keeps A* heuristic admissible)
+            straight = graph.distance(source, target)
+            if length is None or math.isnan(length) or length < straight:
+                length = straight
+            graph.edges_index[edge_id] = len(graph.edge_id)
+            graph.edge_id.append(edge_id)
+            graph.edge_source.append(source)
+            graph.edge_target.append(target)
+            graph.edge_length.append(length)
+
+        # Compressed adjacency lists
+        degrees = [0] * (len(nodes) + 1)
+        for e in xrange(len(graph.edge_id)):
+            degrees[graph.edge_source[e] + 1] += 1
+            if graph.edge_target[e] != graph.edge_source[e]:
+                degrees[graph.edge_target[e] + 1] += 1
+        for i in xrange(1, len(degrees)):
+            degrees[i] += degrees[i - 1]
+        graph.offsets = array('l', degrees)
+        graph.adjacency = array('l', [0] * degrees[-1])
+        cursor = list(degrees[:-1])
+        for e in xrange(len(graph.edge_id)):
+            for node in set([graph.edge_source[e], graph.edge_target[e]]):
+                graph.adjacency[cursor[node]] = e
+                cursor[node] += 1
+        return graph
+
+    def __len__(self):
+        return len(self.edge_id)
+
+    def distance(self, a, b):
+        return math.hypot(self.node_x[b] - self.node_x[a],
+                          self.node_y[b] - self.node_y[a])
+
+    def shortest_path(self, sources, targets):
+        """
+        A* search between two sets of nodes. ``sources`` and ``targets``
+        are dicts ``{node: extra cost}``.
+
+        Returns a tuple ``(cost, first node, edges, last node)``, where edges
+        are indices in edge arrays, or ``None`` if targets are unreachable.
+        """
+        def heuristic(node):
+            return min(self.distance(node, target) for target in targets)
+
+        best = dict(sources)
+        previous = {}
+        settled = set()
+        heap = [(cost + heuristic(node), cost, node) for node, cost in sources.items()]
+        heapq.heapify(heap)
+        found, found_cost = None, float('inf')
+
+        while heap:
+            estimate, cost, node = heapq.heappop(heap)
+            if estimate >= found_cost:
+                break
+            if node in settled:
+                continue
+            settled.add(node)
+            if node in targets and cost + targets[node] < found_cost:
+                found, found_cost = node, cost + targets[node]
+            for i in xrange(self.offsets[node], self.offsets[node + 1]):
+                e = self.adjacency[i]
+                other = self.edge_target[e] if self.edge_source[e] == node else self.edge_source[e]
+                other_cost = cost + self.edge_length[e]
+                if other_cost < best.get(other, float('inf')):
+                    best[other] = other_cost
+                    previous[other] = (node, e)
+                    heapq.heappush(heap, (other_cost + heuristic(other), other_cost, other))
+
+        if found is None:
+            return None
+        edges = []
+        node = found
+        while node in previous:
+            node, e = previous[node]
+            edges.insert(0, e)
+        return found_cost, node, edges, found
+
+    def route(self, start, end):
+        """
+        Shortest route between two positions on paths, given as tuples
+        ``(path id, position)``.
+
+        Returns the serialized topology (see ``TopologyHelper.deserialize``)
+        and the route length, or ``None`` if there is no route.
+        """
+        start_edge, start_position = self.edges_index[start[0]], start[1]
+        end_edge, end_position = self.edges_index[end[0]], end[1]
+
+        def add(costs, node, cost):
+            costs[node] = min(cost, costs.get(node, float('inf')))
+
+        sources = {}
+        length = self.edge_length[start_edge]
+        add(sources, self.edge_source[start_edge], start_position * length)
+        add(sources, self.edge_target[start_edge], (1.0 - start_position) * length)
+        targets = {}
+        length = self.edge_length[end_edge]
+        add(targets, self.edge_source[end_edge], end_position * length)
+        add(targets, self.edge_target[end_edge], (1.0 - end_position) * length)
+
+        steps = None
+        found = self.shortest_path(sources, targets)
+        if found is not None:
+            cost, first, edges, last = found
+            steps = [(start_edge, start_position, self._position_at(start_edge, first, start_position))]
+            node = first
+            for e in edges:
+                forward = self.edge_source[e] == node
+                steps.append((e, 0.0, 1.0) if forward else (e, 1.0, 0.0))
+                node = self.edge_target[e] if forward else self.edge_source[e]
+            steps.append((end_edge, self._position_at(end_edge, last, end_position), end_position))
+            # Remove empty extremities
+            if len(steps) > 1 and steps[0][1] == steps[0][2]:
+                steps.pop(0)
+            if len(steps) > 1 and steps[-1][1] == steps[-1][2]:
+                steps.pop(-1)
+
+        # Route along a single path
+        if start_edge == end_edge:
+            direct = abs(end_position - start_position) * self.edge_length[start_edge]
+            if found is None or direct <= cost:
+                cost = direct
+                steps = [(start_edge, start_position, end_position)]
+
+        if steps is None:
+            return None
+
+        serialized = {'paths': [], 'positions': {}}
+        for i, (e, start_position, end_position) in enumerate(steps):
+            serialized['paths'].append(self.edge_id[e])
+            if (start_position, end_position) != (0.0, 1.0):
+                serialized['positions'][str(i)] = (start_position, end_position)
+        return serialized, cost
+
+    def _position_at(self, edge, node, position):
+        """Position of node on edge, ambiguous for loops."""
+        if self.edge_source[edge] == self.edge_target[edge]:
+            return 0.0 if position < 0.5 else 1.0
+        return 0.0 if self.edge_source[edge] == node else 1.0
+
+
+def routing_graph_of_qs(qs):
+    """
+    Build routing graph from paths node ids, without parsing geometries.
+    """
+    from .helpers import PathHelper
+    edges = stream_queryset(qs.values_list('pk', 'length', 'source_node', 'target_node'))
+    return RoutingGraph.from_edges(edges, coords=PathHelper.nodes_coords())
@@ -1,17 +1,31 @@
+import sys
 import json
+import time
+import hashlib
+import math
+import struct
 import logging
+from array import array
+from operator import attrgetter
+from functools import wraps
+from contextlib import contextmanager
 
 from django.conf import settings
-from django.db import connection
+from django.db import connection, DatabaseError
 from django.contrib.gis.geos import Point
 from django.db.models.query import QuerySet
-from django.utils.translation import ugettext_lazy as _
+from django.core.cache import get_cache
+from django.utils.translation import ugettext_lazy as _, get_language
 from django.contrib.gis.geos import LineString
 
-from geotrek.common.utils import sqlfunction, sampling
+from geotrek.common.utils import sqlfunction, sampling, polyline_encode
+from geotrek.common.utils.postgresql import stream_queryset
+
+from . import graph as graph_lib
+from . import dem
 
 import pygal
-from pygal.style import LightSolarizedStyle
+from pygal.style import Style, LightSolarizedStyle
 
 
 
@@ -69,22 +83,33 @@ class TopologyHelper(object):
             raise ValueError("Invalid serialized topology : empty list found")
         kind = objdict[0].get('kind')
         offset = objdict[0].get('offset', 0.0)
-        topology = TopologyFactory.create(no_path=True, kind=kind, offset=offset)
-        PathAggregation.objects.filter(topo_object=topology).delete()
         try:
+            # Fetch all referenced paths at once
+            pks = set()
+            for subtopology in objdict:
+                pks.update([int(pk) for pk in subtopology['paths']])
+            paths = Path.objects.in_bulk(list(pks))
+            missing = pks - set(paths.keys())
+            if missing:
+                raise Path.DoesNotExist("Unknown paths %s" % sorted(missing))
+
+            aggregations = []
             counter = 0
             for j, subtopology in enumerate(objdict):
                 last_topo = j == len(objdict) - 1
                 positions = subtopology.get('positions', {})
-                paths = subtopology['paths']
+                subpaths = subtopology['paths']
                 # Create path aggregations
-                for i, path in enumerate(paths):
-                    last_path = i == len(paths) - 1
+                for i, pk in enumerate(subpaths):
+                    last_path = i == len(subpaths) - 1
                     # Javascript hash keys are parsed as a string
                     idx = str(i)
                     start_position, end_position = positions.get(idx, (0.0, 1.0))
-                    path = Path.objects.get(pk=path)
-                    topology.add_path(path, start=start_position, end=end_position, order=counter, reload=False)
+                    path = paths[int(pk)]
+                    aggregations.append(PathAggregation(path=path,
+                                                        start_position=start_position,
+                                                        end_position=end_position,
+                                                        order=counter))
                     if not last_topo and last_path:
                         # Intermediary marker.
                         # make sure pos will be [X, X]
@@ -102,16 +127,48 @@ class TopologyHelper(object):
                             pos = start_position
                         elif end_position == 1.0:
                             pos = start_position
-                        elif len(paths) == 1:
+                        elif len(subpaths) == 1:
                             pos = end_position
                         assert pos >= 0, "Invalid position (%s, %s)." % (start_position, end_position)
-                        topology.add_path(path, start=pos, end=pos, order=counter, reload=False)
+                        aggregations.append(PathAggregation(path=path,
+                                                            start_position=pos,
+                                                            end_position=pos,
+                                                            order=counter))
                     counter += 1
-        except (AssertionError, ValueError, KeyError, Path.DoesNotExist) as e:
+        except (AssertionError, ValueError, KeyError, TypeError, Path.DoesNotExist) as e:
             raise ValueError("Invalid serialized topology : %s" % e)
-        topology.save()
+
+        topology = TopologyFactory.create(no_path=True, kind=kind, offset=offset)
+        PathAggregation.objects.filter(topo_object=topology).delete()
+        for aggr in aggregations:
+            aggr.topo_object = topology
+        # Insert all aggregations in one statement, and compute geometry once.
+        with cls.deferred_geometry():
+            PathAggregation.objects.bulk_create(aggregations)
+        sqlfunction('SELECT update_geometry_of_evenement', str(topology.pk))
+        topology.reload()
         return topology
 
+    @classmethod
+    @contextmanager
+    def deferred_geometry(cls):
+        """
+        Postpone geometry computation of topologies while their aggregations
+        are inserted (see ``ft_evenements_troncons_geometry()`` trigger).
+        Callers are responsible for running ``update_geometry_of_evenement()``
+        afterwards.
+        """
+        cursor = connection.cursor()
+        cursor.execute("CREATE TEMPORARY TABLE tmp_evenements_deferred (id integer) ON COMMIT DROP")
+        try:
+            yield
+        finally:
+            try:
+                cursor.execute("DROP TABLE IF EXISTS tmp_evenements_deferred")
+            except DatabaseError:
+                # Transaction is aborted: the table vanishes with its rollback.
+                pass
+
     @classmethod
     def _topologypoint(cls, lng, lat, kind=None, snap=None):
         """
@@ -124,18 +181,20 @@ class TopologyHelper(object):
         point = Point(lng, lat, srid=settings.API_SRID)
         point.transform(settings.SRID)
         if snap is None:
-            closest = Path.closest(point)
-            position, offset = closest.interpolate(point)
+            [closest] = PathHelper.closest_many([point])
+            if closest is None:
+                raise Path.DoesNotExist("No path to attach point")
+            [(position, offset)] = PathHelper.interpolate_many([(closest, point)])
         else:
-            closest = Path.objects.get(pk=snap)
-            position, offset = closest.interpolate(point)
+            closest = int(snap)
+            [(position, offset)] = PathHelper.interpolate_many([(closest, point)])
             offset = 0
         # We can now instantiante a Topology object
         topology = TopologyFactory.create(no_path=True, kind=kind, offset=offset)
         aggrobj = PathAggregation(topo_object=topology,
                                   start_position=position,
                                   end_position=position,
-                                  path=closest)
+                                  path_id=closest)
         aggrobj.save()
         point = Point(point.x, point.y, 0, srid=settings.SRID)
         topology.geom = point
@@ -177,41 +236,31 @@ class TopologyHelper(object):
 
     @classmethod
     def overlapping(cls, klass, queryset):
-        from .models import Path, Topology, PathAggregation
+        """
+        Return a ``klass`` queryset overlapping specified topologies (a
+        topology or a queryset, which is used as a subquery). Aggregations
+        intervals are compared using their spatial index (see ``intervalle``
+        column).
+        """
+        from .models import Topology, PathAggregation
 
-        topology_pks = []
         if isinstance(queryset, QuerySet):
-            topology_pks = [str(pk) for pk in queryset.values_list('pk', flat=True)]
+            subquery, params = queryset.values('pk').query.sql_with_params()
         else:
-            topology_pks = [str(queryset.pk)]
+            subquery, params = '%s', (queryset.pk,)
 
-        sql = """
-        WITH topologies AS (SELECT id FROM %(topology_table)s WHERE id IN (%(topology_list)s)),
-        -- Concerned aggregations
-             aggregations AS (SELECT * FROM %(aggregations_table)s a, topologies t
-                              WHERE a.evenement = t.id),
-        -- Concerned paths along with (start, end)
-             paths_aggr AS (SELECT a.pk_debut AS start, a.pk_fin AS end, p.id
-                            FROM %(paths_table)s p, aggregations a
-                            WHERE a.troncon = p.id)
-        -- Retrieve primary keys
-        SELECT DISTINCT(t.id)
-        FROM %(topology_table)s t, %(aggregations_table)s a, paths_aggr pa
-        WHERE a.troncon = pa.id AND a.evenement = t.id
-          AND least(a.pk_debut, a.pk_fin) <= greatest(pa.start, pa.end) AND
-              greatest(a.pk_debut, a.pk_fin) >= least(pa.start, pa.end);
+        where = """
+        %(table)s.%(pk)s IN (
+            SELECT a.evenement
+            FROM %(aggregations_table)s a JOIN %(aggregations_table)s o ON a.intervalle && o.intervalle
+            WHERE o.evenement IN (%(subquery)s))
         """ % {
-            'topology_table': Topology._meta.db_table,
+            'table': klass._meta.db_table,
+            'pk': klass._meta.pk.column,
             'aggregations_table': PathAggregation._meta.db_table,
-            'paths_table': Path._meta.db_table,
-            'topology_list': ','.join(topology_pks),
+            'subquery': subquery,
         }
-
-        cursor = connection.cursor()
-        cursor.execute(sql)
-        result = cursor.fetchall()
-        pks = [row[0] for row in result]
-        qs = klass.objects.existing().filter(pk__in=pks)
+        qs = klass.objects.existing().extra(where=[where], params=list(params))
 
         # Filter by kind if relevant
         if klass.KIND != Topology.KIND:
@@ -220,42 +269,260 @@ class TopologyHelper(object):
         return qs
 
 
+    # Relations of topologies which can be prefetched, by name
+    # (see ``add_relation()``)
+    relations = {}
+    # Lookups of topologies for models which are not topologies
+    # (e.g. ``'topology'`` for interventions)
+    topology_lookups = {}
+
+    @classmethod
+    def add_relation(cls, name, model, attribute=None, through=None, select_related=None):
+        """
+        Declares how the relation ``name`` (a property added with
+        ``add_property()``) is prefetched : ``model`` objects overlapping
+        (or linked to overlapping topologies ``through`` a lookup),
+        replaced by their ``attribute`` if specified (e.g. ``city``).
+        """
+        from .models import Path, Topology
+
+        if select_related is None:
+            select_related = [attribute] if attribute else []
+        cls.relations[name] = (model, attribute, through, select_related)
+        for prefetchable in [Path, Topology] + cls.topology_lookups.keys():
+            cls._install_prefetched(prefetchable, name)
+
+    @classmethod
+    def add_topology_lookup(cls, model, lookup):
+        cls.topology_lookups[model] = lookup
+        for name in cls.relations:
+            cls._install_prefetched(model, name)
+
+    @classmethod
+    def _overlapping_pairs(cls, model, pks):
+        """
+        ``(object pk, topology pk)`` of existing topologies overlapping
+        objects (or on paths, for paths), in one query.
+        """
+        from .models import Path, Topology
+
+        if issubclass(model, Path):
+            sources = "SELECT id AS source, NULL::integer AS topology FROM unnest(%s::integer[]) AS id"
+            join = "JOIN e_r_evenement_troncon a ON a.troncon = s.source"
+            params = [pks]
+        else:
+            if issubclass(model, Topology):
+                sources = "SELECT id AS source, id AS topology FROM unnest(%s::integer[]) AS id"
+                params = [pks]
+            else:
+                lookup = cls.topology_lookups[model]
+                queryset = model.objects.filter(pk__in=pks).values_list('pk', lookup)
+                sources, params = queryset.query.sql_with_params()
+            join = """JOIN e_r_evenement_troncon o ON o.evenement = s.topology
+                      JOIN e_r_evenement_troncon a ON a.intervalle && o.intervalle"""
+        sql = """
+        SELECT DISTINCT s.source, a.evenement
+        FROM (%s) AS s (source, topology)
+        %s
+        JOIN e_t_evenement e ON e.id = a.evenement AND NOT e.supprime
+        """ % (sources, join)
+        cursor = connection.cursor()
+        cursor.execute(sql, list(params))
+        return cursor.fetchall()
+
+    @classmethod
+    def _related_by_topology(cls, name, topology_pks):
+        """
+        Objects of relation ``name``, by topology pk, in one query
+        (two for relations ``through`` a lookup).
+        """
+        model, attribute, through, select_related = cls.relations[name]
+        manager = model.objects
+        queryset = manager.existing() if hasattr(manager, 'existing') else manager.all()
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        result = {}
+        if through is None:
+            for obj in queryset.filter(pk__in=topology_pks):
+                result[obj.pk] = [obj]
+        else:
+            queryset = queryset.filter(**{'%s__in' % through: topology_pks})
+            pairs = queryset.values_list('pk', through)
+            objects = dict((obj.pk, obj) for obj in queryset.distinct())
+            for pk, topology_pk in pairs:
+                result.setdefault(topology_pk, []).append(objects[pk])
+        if attribute:
+            for topology_pk, objects in result.items():
+                result[topology_pk] = [getattr(obj, attribute) for obj in objects]
+        return result
+
+    @classmethod
+    def _install_prefetched(cls, model, name):
+        """
+        Makes property ``name`` of ``model`` (if declared on it) return
+        prefetched values when available. Done once, when relation or
+        lookup is declared.
+        """
+        prop = model.__dict__.get(name)
+        if not isinstance(prop, property) or getattr(prop.fget, 'prefetched', False):
+            return
+        setattr(model, name, property(prefetched(name)(prop.fget)))
+
+    @classmethod
+    def prefetch_relations(cls, objects, names):
+        objects = list(objects)
+        if not objects or not names:
+            return objects
+        model = objects[0].__class__
+        pairs = cls._overlapping_pairs(model, [obj.pk for obj in objects])
+        topology_pks = set(topology_pk for pk, topology_pk in pairs)
+        for name in names:
+            related = cls._related_by_topology(name, topology_pks)
+            values = {}
+            for pk, topology_pk in pairs:
+                values.setdefault(pk, []).extend(related.get(topology_pk, []))
+            csv_display = '%s_csv_display' % name
+            for obj in objects:
+                value = sorted(dict((v.pk, v) for v in values.get(obj.pk, [])).values(),
+                               key=attrgetter('pk'))
+                obj.__dict__.setdefault('_prefetched_relations', {})[name] = value
+                if not hasattr(model, csv_display):
+                    setattr(obj, csv_display, value)
+        return objects
+
+
+def prefetched(name):
+    """
+    Decorates the getter of relation ``name``, to return values computed
+    by ``prefetch_topology_relations()`` when available. Properties added
+    with ``add_property()`` are decorated when the relation is declared,
+    properties overriding them in subclasses must be decorated explicitly.
+    """
+    def decorator(fget):
+        @wraps(fget)
+        def getter(self):
+            values = self.__dict__.get('_prefetched_relations', {})
+            if name in values:
+                return values[name]
+            return fget(self)
+        getter.prefetched = True
+        return getter
+    return decorator
+
+
+def prefetch_topology_relations(objects, *names):
+    """
+    Computes relations ``names`` (e.g. ``'cities'``, ``'treks'``, see
+    ``TopologyHelper.add_relation()``) of all ``objects`` (paths,
+    topologies, interventions or projects) at once, with one query per
+    relation instead of queries per object.
+
+    Prefetched relations are lists, returned by the relation properties
+    (thus by ``serializable_*`` ones) and set as ``*_csv_display``
+    attributes. Returns the list of objects.
+    """
+    return TopologyHelper.prefetch_relations(objects, names)
+
+
 class PathHelper(object):
+    @classmethod
+    def _batch_params(cls, pairs):
+        """
+        Arrays of paths pks and points (EWKT, in paths SRID) for batch queries.
+        """
+        pks, points = [], []
+        for pk, point in pairs:
+            if pk is None:
+                raise ValueError("Cannot compute on unsaved path")
+            if point.srid != settings.SRID:
+                point = point.transform(settings.SRID, clone=True)
+            pks.append(pk)
+            points.append(point.ewkt)
+        return pks, points
+
+    @classmethod
+    def _batch_results(cls, pairs, rows):
+        from .models import Path
+        if len(rows) != len(pairs):
+            found = set(row[0] for row in rows)
+            missing = [pk for i, (pk, point) in enumerate(pairs) if i + 1 not in found]
+            raise Path.DoesNotExist("Unknown paths %s" % sorted(set(missing)))
+        return [row[1:] for row in rows]
+
+    @classmethod
+    def snap_many(cls, pairs):
+        """
+        Snap points on paths, all at once. ``pairs`` is a list of
+        ``(path pk, point)``, snapped points are returned in the same order.
+        """
+        if not pairs:
+            return []
+        pks, points = cls._batch_params(pairs)
+        cursor = connection.cursor()
+        sql = """
+        WITH p AS (SELECT i, ST_ClosestPoint(t.geom, (%s::geometry[])[i]) AS geom
+                   FROM generate_subscripts(%s::integer[], 1) AS i
+                   JOIN l_t_troncon t ON t.id = (%s::integer[])[i])
+        SELECT i, ST_X(p.geom), ST_Y(p.geom), coalesce(ST_Z(p.geom), 0.0) FROM p ORDER BY i
+        """
+        cursor.execute(sql, [points, pks, pks])
+        result = cls._batch_results(pairs, cursor.fetchall())
+        return [Point(*coords, srid=settings.SRID) for coords in result]
+
+    @classmethod
+    def interpolate_many(cls, pairs):
+        """
+        Position ([0.0-1.0]) and offset of points along paths, all at once.
+        ``pairs`` is a list of ``(path pk, point)``, ``(position, offset)``
+        tuples are returned in the same order.
+        """
+        if not pairs:
+            return []
+        pks, points = cls._batch_params(pairs)
+        cursor = connection.cursor()
+        sql = """
+        SELECT idx, position, distance
+        FROM ft_troncons_interpolate(%s::integer[], %s::geometry[])
+        ORDER BY idx
+        """
+        cursor.execute(sql, [pks, points])
+        return [tuple(r) for r in cls._batch_results(pairs, cursor.fetchall())]
+
+    @classmethod
+    def closest_many(cls, points, radius=None):
+        """
+        Pks of closest paths of points, all at once (``None`` if there is
+        no path at all). Paths within ``radius`` are looked up first, using
+        spatial index. Otherwise, nearest paths bounding boxes are used.
+        """
+        if not points:
+            return []
+        if radius is None:
+            radius = settings.PATH_CLOSEST_RADIUS
+        points = [point if point.srid == settings.SRID else point.transform(settings.SRID, clone=True)
+                  for point in points]
+        cursor = connection.cursor()
+        sql = """
+        SELECT ft_troncon_closest(point, %s)
+        FROM (SELECT i, (%s::geometry[])[i] AS point
+              FROM generate_subscripts(%s::geometry[], 1) AS i) AS p
+        ORDER BY i
+        """
+        ewkts = [point.ewkt for point in points]
+        cursor.execute(sql, [radius, ewkts, ewkts])
+        return [pk for pk, in cursor.fetchall()]
+
     @classmethod
     def snap(cls, path, point):
         if not path.pk:
             raise ValueError("Cannot compute snap on unsaved path")
-        if point.srid != path.geom.srid:
-            point.transform(path.geom.srid)
-        cursor = connection.cursor()
-        sql = """
-        WITH p AS (SELECT ST_ClosestPoint(geom, '%(ewkt)s'::geometry) AS geom
-                   FROM %(table)s
-                   WHERE id = '%(pk)s')
-        SELECT ST_X(p.geom), ST_Y(p.geom), coalesce(ST_Z(p.geom), 0.0) FROM p
-        """ % {'ewkt': point.ewkt, 'table': path._meta.db_table, 'pk': path.pk}
-        cursor.execute(sql)
-        result = cursor.fetchall()
-        return Point(*result[0], srid=path.geom.srid)
+        return cls.snap_many([(path.pk, point)])[0]
 
     @classmethod
     def interpolate(cls, path, point):
         if not path.pk:
             raise ValueError("Cannot compute interpolation on unsaved path")
-        if point.srid != path.geom.srid:
-            point.transform(path.geom.srid)
-        cursor = connection.cursor()
-        sql = """
-        SELECT position, distance
-        FROM ft_troncon_interpolate(%(pk)s, ST_GeomFromText('POINT(%(x)s %(y)s)',%(srid)s))
-             AS (position FLOAT, distance FLOAT)
-        """ % {'pk': path.pk,
-               'x': point.x,
-               'y': point.y,
-               'srid': path.geom.srid}
-        cursor.execute(sql)
-        result = cursor.fetchall()
-        return result[0]
+        return cls.interpolate_many([(path.pk, point)])[0]
 
     @classmethod
     def disjoint(cls, geom, pk):
@@ -264,12 +531,320 @@ class PathHelper(object):
         TODO: this could be a constraint at DB-level. But this would mean that
         path never ever overlap, even during trigger computation, like path splitting...
         """
-        wkt = "ST_GeomFromText('%s', %s)" % (geom, settings.SRID)
-        disjoint = sqlfunction('SELECT * FROM check_path_not_overlap', str(pk), wkt)
-        return disjoint[0]
+        cursor = connection.cursor()
+        cursor.execute("SELECT check_path_not_overlap(%s, ST_GeomFromText(%s, %s))",
+                       [pk, geom.wkt, settings.SRID])
+        return cursor.fetchone()[0]
+
+    @classmethod
+    def overlapping_many(cls, pairs):
+        """
+        Paths overlapped by lines, all at once. ``pairs`` is a list of
+        ``(path pk, line)`` (``None`` pk for unsaved paths), sets of
+        overlapped paths pks are returned in the same order.
+        """
+        if not pairs:
+            return []
+        pks, lines = [], []
+        for pk, line in pairs:
+            if line.srid != settings.SRID:
+                line = line.transform(settings.SRID, clone=True)
+            pks.append(pk)
+            lines.append(line.ewkt)
+        cursor = connection.cursor()
+        cursor.execute("SELECT idx, troncon FROM ft_troncons_overlap(%s::integer[], %s::geometry[])",
+                       [pks, lines])
+        result = [set() for pair in pairs]
+        for i, pk in cursor.fetchall():
+            result[i - 1].add(pk)
+        return result
+
+    @classmethod
+    def nodes_coords(cls):
+        """
+        Returns coordinates of paths network nodes, by node id.
+        """
+        cursor = connection.cursor()
+        cursor.execute("SELECT id, ST_X(geom), ST_Y(geom) FROM l_t_noeud")
+        return dict((nid, (x, y)) for nid, x, y in cursor.fetchall())
+
+
+class GraphHelper(object):
+    """
+    The paths graph (see ``graph_edges_nodes_of_rows()``) is kept in cache,
+    along with its version and the recent history of changes, from which
+    deltas are computed.
+
+    Changes are read from the log table fed by paths triggers, which also
+    purge it (reading the graph never writes). Each graph update mints a
+    new version from the log sequence, thus versions are monotonic and
+    never shared between two different graphs.
+    """
+    cache_key = 'path_graph_nodes'
+    log_table = 'l_t_troncon_graph_log'
+    # Number of log versions kept for deltas (same as log purge trigger)
+    history_size = 1000
+    # Concurrent updates of cached state before it is rebuilt
+    max_conflicts = 3
+    # Deepest zoom level of graph tiles
+    max_zoom = 22
+
+    @classmethod
+    def _graph_of_qs(cls, qs):
+        rows = stream_queryset(qs.values_list('pk', 'length', 'source_node', 'target_node'))
+        return graph_lib.graph_edges_nodes_of_rows(rows)
+
+    @classmethod
+    def _next_version(cls):
+        cursor = connection.cursor()
+        cursor.execute("SELECT nextval(pg_get_serial_sequence(%s, 'version'))", [cls.log_table])
+        return cursor.fetchone()[0]
+
+    @classmethod
+    def _log_entries(cls, since):
+        cursor = connection.cursor()
+        cursor.execute("SELECT version, troncon FROM " + cls.log_table + " WHERE version > %s", [since])
+        return cursor.fetchall()
+
+    @classmethod
+    def log_version(cls):
+        """
+        Version of the last committed change of paths network. Never goes
+        backwards, since log purge always keeps the newest entry.
+        """
+        cursor = connection.cursor()
+        cursor.execute("SELECT coalesce(max(version), 0) FROM " + cls.log_table)
+        return cursor.fetchone()[0]
+
+    @classmethod
+    def build_state(cls):
+        from .models import Path
+        version = cls._next_version()
+        # Entries already committed are part of the graph
+        seen = set(v for v, pk in cls._log_entries(version - cls.history_size))
+        graph = cls._graph_of_qs(Path.objects.order_by('pk'))
+        return {
+            'version': version,
+            'oldest': version,
+            'graph': graph,
+            'seen': seen,
+            'history': [],
+        }
+
+    @classmethod
+    def apply_changes(cls, state, entries):
+        """
+        Update the graph with paths changed in log ``entries``. Applying
+        an entry twice has no effect, paths are always read again.
+        """
+        from .models import Path
+        pks = set(pk for version, pk in entries)
+        nodes, edges = state['graph']['nodes'], state['graph']['edges']
+        touched = set()
+
+        # Remove previous edges
+        for pk in pks:
+            edge = edges.pop(pk, None)
+            if edge is None:
+                continue
+            a, b = edge['nodes_id']
+            for k1, k2 in ((a, b), (b, a)):
+                if nodes.get(k1, {}).get(k2) == pk:
+                    del nodes[k1][k2]
+                    if not nodes[k1]:
+                        del nodes[k1]
+            touched.update([a, b])
+
+        # Add current ones
+        changed = cls._graph_of_qs(Path.objects.filter(pk__in=pks).order_by('pk'))
+        edges.update(changed['edges'])
+        for node, adjacency in changed['nodes'].items():
+            nodes.setdefault(node, {}).update(adjacency)
+            touched.add(node)
+
+        version = cls._next_version()
+        state['version'] = version
+        state['seen'] = set(v for v in state['seen'] if v > version - cls.history_size)
+        state['seen'].update(v for v, pk in entries)
+        state['history'].append((version, pks, touched))
+        while state['history'] and state['history'][0][0] <= version - cls.history_size:
+            state['oldest'], _, _ = state['history'].pop(0)
+
+    @classmethod
+    def get_state(cls):
+        """
+        Returns the up-to-date graph state.
+        """
+        cache = get_cache('fat')
+        state = cache.get(cls.cache_key)
+        if state is None:
+            state = cls.build_state()
+            cache.set(cls.cache_key, state)
+            return state
+        for attempt in range(cls.max_conflicts):
+            # Look back in log for entries committed late by concurrent transactions
+            entries = [(v, pk) for (v, pk) in cls._log_entries(state['version'] - cls.history_size)
+                       if v not in state['seen']]
+            if not entries:
+                return state
+            base = state['version']
+            cls.apply_changes(state, entries)
+            # Do not overwrite a state stored meanwhile by another worker:
+            # changes are applied again on top of it.
+            current = cache.get(cls.cache_key)
+            if current is None or current['version'] == base:
+                cache.set(cls.cache_key, state)
+                return state
+            state = current
+        state = cls.build_state()
+        cache.set(cls.cache_key, state)
+        return state
+
+    @classmethod
+    def graph(cls, state):
+        graph = dict(state['graph'])
+        graph['version'] = state['version']
+        return graph
+
+    @classmethod
+    def delta(cls, state, since):
+        """
+        Edges and nodes changed since specified version. Removed ones
+        are ``None``. Returns ``None`` if delta cannot be computed.
+        """
+        if since < state['oldest'] or since > state['version']:
+            return None
+        edges, nodes = set(), set()
+        for version, pks, touched in state['history']:
+            if version > since:
+                edges.update(pks)
+                nodes.update(touched)
+        graph = state['graph']
+        return {
+            'version': state['version'],
+            'since': since,
+            'edges': dict((pk, graph['edges'].get(pk)) for pk in edges),
+            'nodes': dict((node, graph['nodes'].get(node)) for node in nodes),
+        }
+
+    @classmethod
+    def encode(cls, graph):
+        """
+        Compact binary encoding of graph edges (little-endian): number
+        of edges and graph version as uint32, followed by the arrays of
+        edges ids, source nodes, target nodes (int32) and lengths (float32),
+        then the number of neighbour tiles as uint32 and their ``z, x, y``
+        (int32).
+        """
+        edges = [graph['edges'][pk] for pk in sorted(graph['edges'])]
+        ids = array('i', [edge['id'] for edge in edges])
+        sources = array('i', [edge['nodes_id'][0] or 0 for edge in edges])
+        targets = array('i', [edge['nodes_id'][1] or 0 for edge in edges])
+        lengths = array('f', [edge['length'] for edge in edges])
+        columns = (ids, sources, targets, lengths)
+        if sys.byteorder == 'big':
+            for column in columns:
+                column.byteswap()
+        header = struct.pack('<II', len(edges), graph.get('version', 0))
+        neighbours = graph.get('neighbours', [])
+        trailer = struct.pack('<I%si' % (3 * len(neighbours)), len(neighbours),
+                              *[v for tile in neighbours for v in tile])
+        return header + ''.join(column.tostring() for column in columns) + trailer
+
+    @classmethod
+    def tile_bounds(cls, z, x, y):
+        """
+        Returns ``(west, south, east, north)`` of a tile (slippy map scheme).
+        """
+        if not (0 <= z <= cls.max_zoom):
+            raise ValueError("Invalid tile %s/%s/%s" % (z, x, y))
+        n = 2.0 ** z
+        if not (0 <= x < n and 0 <= y < n):
+            raise ValueError("Invalid tile %s/%s/%s" % (z, x, y))
+
+        def lat(y):
+            return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+        return (x / n * 360.0 - 180.0, lat(y + 1), (x + 1) / n * 360.0 - 180.0, lat(y))
+
+    @classmethod
+    def tile_neighbours(cls, z, x, y):
+        n = 2 ** z
+        neighbours = []
+        for dy in (-1, 0, 1):
+            for dx in (-1, 0, 1):
+                # Wrap around antimeridian
+                tile = [z, (x + dx) % n, y + dy]
+                if 0 <= tile[2] < n and tile != [z, x, y] and tile not in neighbours:
+                    neighbours.append(tile)
+        return neighbours
+
+    @classmethod
+    def subgraph(cls, bbox):
+        """
+        Graph of paths intersecting ``bbox`` (a polygon), with their
+        extremity nodes. Adjacency of nodes is limited to these paths.
+        """
+        from .models import Path
+        if bbox.srid != settings.SRID:
+            bbox = bbox.transform(settings.SRID, clone=True)
+        return cls._graph_of_qs(Path.objects.filter(geom__intersects=bbox).order_by('pk'))
 
 
 class AltimetryHelper(object):
+    dem_version_key = 'dem_version'
+
+    @classmethod
+    def dem_version(cls):
+        """
+        Version stamp of DEM (milliseconds since epoch), written by
+        ``loaddem`` as comment of DEM table. 0 if unknown.
+        """
+        cache = get_cache('fat')
+        version = cache.get(cls.dem_version_key)
+        if version is None:
+            cursor = connection.cursor()
+            cursor.execute("SELECT obj_description(oid, 'pg_class') FROM pg_class WHERE relname = 'mnt'")
+            row = cursor.fetchone()
+            version = int(row[0]) if row and row[0] and row[0].isdigit() else 0
+            cache.set(cls.dem_version_key, version)
+        return version
+
+    @classmethod
+    def stamp_dem(cls):
+        """
+        Write a new DEM version stamp, invalidating cached profiles.
+        """
+        version = int(time.time() * 1000)
+        cursor = connection.cursor()
+        cursor.execute("COMMENT ON TABLE mnt IS '%s'" % version)
+        get_cache('fat').set(cls.dem_version_key, version)
+        return version
+
+    @classmethod
+    def profile_cache_key(cls, obj):
+        """
+        Cache key of elevation profile of ``obj``, which changes with its
+        geometry and with DEM.
+        """
+        return 'elevation_profile-%s-%s-%s-%s-%s' % (obj._meta.module_name, obj.pk,
+                                                     hashlib.md5(obj.geom.wkb).hexdigest(),
+                                                     cls.dem_version(),
+                                                     settings.ALTIMETRIC_PROFILE_PRECISION)
+
+    @classmethod
+    def cached_elevation_profile(cls, obj):
+        """
+        Elevation profile of ``obj`` geometry, computed once as long as
+        geometry and DEM do not change.
+        """
+        cache = get_cache('fat')
+        key = cls.profile_cache_key(obj)
+        profile = cache.get(key)
+        if profile is None:
+            profile = cls.elevation_profile(obj.geom)
+            cache.set(key, profile)
+        return profile
+
     @classmethod
     def elevation_profile(cls, geometry, precision=None, offset=0):
         """Extract elevation profile from a 3D geometry.
@@ -287,6 +862,10 @@ class AltimetryHelper(object):
                 profile.extend(subprofile)
             return profile
 
+        sampler = dem.get_sampler()
+        if sampler is not None:
+            return sampler.elevation_profile(geometry, precision, offset)
+
         sql = """
         SELECT (%(offset)s + distance) as abscissa,
                ST_X(ST_Transform(geom, %(api_srid)s)) as lng,
@@ -300,21 +879,125 @@ class AltimetryHelper(object):
         result = cursor.fetchall()
         return result
 
+    @classmethod
+    def simplify_profile(cls, profile, count=None, tolerance=None):
+        """
+        Douglas-Peucker simplification of the (distance, elevation) curve.
+
+        :count:  maximum number of samples kept
+        :tolerance:  samples closer than this (in meters) from the simplified
+                     curve are dropped
+
+        Extremities are always kept.
+        """
+        n = len(profile)
+        if n <= 2:
+            return list(profile)
+        # Each sample gets the deviation at which Douglas-Peucker keeps it,
+        # bounded by its parent's (so that thresholds give nested curves)
+        importance = [0.0] * n
+        importance[0] = importance[-1] = float('inf')
+        stack = [(0, n - 1, float('inf'))]
+        while stack:
+            first, last, bound = stack.pop()
+            if last - first < 2:
+                continue
+            x0, y0 = profile[first][0], profile[first][3] or 0
+            dx, dy = profile[last][0] - x0, (profile[last][3] or 0) - y0
+            norm = math.hypot(dx, dy)
+            deviation, index = -1, None
+            for i in xrange(first + 1, last):
+                x, y = profile[i][0] - x0, (profile[i][3] or 0) - y0
+                d = abs(dy * x - dx * y) / norm if norm else math.hypot(x, y)
+                if d > deviation:
+                    deviation, index = d, i
+            importance[index] = min(deviation, bound)
+            stack.append((first, index, importance[index]))
+            stack.append((index, last, importance[index]))
+
+        keep = range(n)
+        if tolerance is not None:
+            keep = [i for i in keep if importance[i] > tolerance]
+        if count is not None and len(keep) > count:
+            keep = sorted(sorted(keep, key=lambda i: importance[i], reverse=True)[:max(count, 2)])
+        return [profile[i] for i in keep]
+
+    @classmethod
+    def encode_profile(cls, profile):
+        """
+        Encode profile as a polyline string, with distance and elevation
+        in meters, and coordinates in 1e-5 degrees.
+        """
+        return polyline_encode([(int(round(d)), int(round(h or 0)),
+                                 int(round(lng * 1e5)), int(round(lat * 1e5)))
+                                for d, lng, lat, h in profile])
+
     @classmethod
     def profile_svg(cls, profile):
         """
         Plot the altimetric graph in SVG using PyGal.
-        Most of the job done here is dedicated to preparing
-        nice labels scales.
         """
-        distances = [v[0] for v in profile]
-        elevations = [v[3] for v in profile]
+        return profile_renderer.render(profile)
+
+    @classmethod
+    def cached_profile_svg(cls, obj):
+        """
+        Altimetric graph of ``obj``, rendered once per version of object
+        (and DEM) and language.
+        """
+        cache = get_cache('fat')
+        key = '%s-svg-%s-%s' % (cls.profile_cache_key(obj),
+                                obj.date_update.isoformat() if obj.date_update else '',
+                                get_language())
+        svg = cache.get(key)
+        if svg is None:
+            svg = cls.profile_svg(obj.get_elevation_profile())
+            cache.set(key, svg)
+        return svg
+
+
+class ProfileRenderer(object):
+    """
+    Renders elevation profiles in SVG using PyGal.
+
+    Style and base configuration are built once and never modified
+    (each chart works on a copy), thus a renderer can be shared between
+    threads.
+    """
+    style = Style(background='white',
+                  plot_background=LightSolarizedStyle.plot_background,
+                  foreground=LightSolarizedStyle.foreground,
+                  foreground_light=LightSolarizedStyle.foreground_light,
+                  foreground_dark=LightSolarizedStyle.foreground_dark,
+                  opacity=LightSolarizedStyle.opacity,
+                  opacity_hover=LightSolarizedStyle.opacity_hover,
+                  transition=LightSolarizedStyle.transition,
+                  colors=('#5393E8',))
+
+    def __init__(self):
+        self.config = pygal.Config(style=self.style,
+                                   fill=True,
+                                   show_legend=False,
+                                   print_values=False,
+                                   show_dots=False,
+                                   show_minor_x_labels=False,
+                                   width=800,
+                                   height=400,
+                                   title_font_size=25,
+                                   label_font_size=20,
+                                   major_label_font_size=25,
+                                   js=[])
+
+    def labels(self, elevations):
+        """
+        Most of the job is dedicated to preparing nice labels scales.
+        Returns Y labels and range.
+        """
         min_elevation = int(min(elevations))
         floor_elevation = min_elevation - min_elevation % 10
         max_elevation = int(max(elevations))
         ceil_elevation = max_elevation + 10 - max_elevation % 10
 
-        x_labels = distances
         y_labels = [min_elevation] + sampling(range(floor_elevation + 20, ceil_elevation - 10, 10), 3) + [max_elevation]
 
         # Prevent Y labels to overlap
@@ -324,27 +1007,21 @@ class AltimetryHelper(object):
         if len(y_labels) > 2:
             if y_labels[-1] - y_labels[-2] < 25:
                 y_labels.pop(-2)
+        return y_labels, [floor_elevation, max_elevation]
 
-        config = dict(show_legend=False,
-                      print_values=False,
-                      show_dots=False,
-                      x_labels_major_every=int(len(profile)/2),
-                      show_minor_x_labels=False,
-                      width=800,
-                      height=400,
-                      title_font_size=25,
-                      label_font_size=20,
-                      major_label_font_size=25,
-                      js=[])
-
-        style = LightSolarizedStyle
-        style.background = 'white'
-        style.colors = ('#5393E8',)
-        line_chart = pygal.StackedLine(fill=True, style=style, **config)
-        line_chart.x_title = unicode(_("Distance (m)"))
-        line_chart.x_labels = [str(i) for i in x_labels]
-        line_chart.y_title = unicode(_("Altitude (m)"))
-        line_chart.y_labels = [str(i) for i in y_labels]
-        line_chart.range = [floor_elevation, max_elevation]
+    def render(self, profile):
+        distances = [v[0] for v in profile]
+        elevations = [v[3] for v in profile]
+        y_labels, y_range = self.labels(elevations)
+        line_chart = pygal.StackedLine(self.config,
+                                       x_labels_major_every=int(len(profile) / 2),
+                                       x_title=unicode(_("Distance (m)")),
+                                       x_labels=[str(i) for i in distances],
+                                       y_title=unicode(_("Altitude (m)")),
+                                       y_labels=[str(i) for i in y_labels],
+                                       range=y_range)
         line_chart.add('', elevations)
         return line_chart.render()
+
+
+profile_renderer = ProfileRenderer()
@@ -0,0 +1,81 @@
+import random
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.conf import settings
+from django.contrib.gis.geos import Point
+
+from geotrek.authent.models import default_structure
+from geotrek.core.models import Path
+from geotrek.core.helpers import PathHelper
+
+
+class Command(BaseCommand):
+    help = 'Measure closest path lookups as the number of paths grows.\n'
+    help += 'Paths are created in a transaction which is rolled back.\n'
+    can_import_settings = True
+
+    option_list = BaseCommand.option_list + (
+        make_option('--sizes',
+                    default='1000,10000,100000',
+                    help='Numbers of paths to measure with (comma separated).'),
+        make_option('--lookups',
+                    type='int',
+                    default=100,
+                    help='Number of lookups for each size.'),
+    )
+
+    def add_paths(self, cursor, start, end):
+        # Grid of 50m paths, every 100m, in project extent
+        minx, maxy = settings.SPATIAL_EXTENT[0], settings.SPATIAL_EXTENT[1]
+        sql = """
+        INSERT INTO l_t_troncon (geom, valide, structure)
+        SELECT ST_SetSRID(ST_MakeLine(ST_MakePoint(%(x)s + (i %% 500) * 100, %(y)s - (i / 500) * 100, 0),
+                                      ST_MakePoint(%(x)s + (i %% 500) * 100 + 50, %(y)s - (i / 500) * 100, 0)), %(srid)s),
+               TRUE, %(structure)s
+        FROM generate_series(%(start)s, %(end)s - 1) AS i
+        """ % {'x': minx, 'y': maxy, 'srid': settings.SRID,
+               'start': start, 'end': end, 'structure': default_structure().pk}
+        cursor.execute(sql)
+        cursor.execute("ANALYZE l_t_troncon")
+
+    def measure(self, lookup, points):
+        start = time.time()
+        for point in points:
+            lookup(point)
+        return (time.time() - start) * 1000.0 / len(points)
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        lookups = options['lookups']
+
+        def fullscan(point):
+            return Path.objects.all().distance(point).order_by('distance')[0]
+
+        def knn(point):
+            return PathHelper.closest_many([point])
+
+        transaction.enter_transaction_management()
+        transaction.managed(True)
+        try:
+            cursor = connection.cursor()
+            # Paths triggers are not relevant here (snapping, splitting, etc.),
+            # disabled in this transaction only (requires superuser)
+            cursor.execute("SET LOCAL session_replication_role = replica")
+            count = Path.objects.count()
+            self.stdout.write('paths\tindexed (ms)\tfull scan (ms)\n')
+            for size in sorted(sizes):
+                if size > count:
+                    self.add_paths(cursor, count, size)
+                    count = size
+                minx, maxy, maxx, miny = settings.SPATIAL_EXTENT
+                points = [Point(random.uniform(minx, maxx), random.uniform(miny, maxy), srid=settings.SRID)
+                          for i in range(lookups)]
+                self.stdout.write('%s\t%.2f\t%.2f\n' % (count,
+                                                        self.measure(knn, points),
+                                                        self.measure(fullscan, points)))
+        finally:
+            transaction.rollback()
+            transaction.leave_transaction_management()
@@ -0,0 +1,82 @@
+import math
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.core.cache import get_cache
+from django.conf import settings
+
+import pygal
+
+from geotrek.common.utils import sampling
+from geotrek.core.helpers import ProfileRenderer, profile_renderer
+
+
+def legacy_render(profile):
+    """
+    Elevation chart as rendered before ``ProfileRenderer``: whole
+    configuration is built for each chart.
+    """
+    distances = [v[0] for v in profile]
+    elevations = [v[3] for v in profile]
+    min_elevation = int(min(elevations))
+    floor_elevation = min_elevation - min_elevation % 10
+    max_elevation = int(max(elevations))
+    ceil_elevation = max_elevation + 10 - max_elevation % 10
+    y_labels = [min_elevation] + sampling(range(floor_elevation + 20, ceil_elevation - 10, 10), 3) + [max_elevation]
+    line_chart = pygal.StackedLine(fill=True, style=ProfileRenderer.style,
+                                   show_legend=False, print_values=False, show_dots=False,
+                                   x_labels_major_every=int(len(profile) / 2),
+                                   show_minor_x_labels=False, width=800, height=400,
+                                   title_font_size=25, label_font_size=20,
+                                   major_label_font_size=25, js=[])
+    line_chart.x_title = "Distance (m)"
+    line_chart.x_labels = [str(i) for i in distances]
+    line_chart.y_title = "Altitude (m)"
+    line_chart.y_labels = [str(i) for i in y_labels]
+    line_chart.range = [floor_elevation, max_elevation]
+    line_chart.add('', elevations)
+    return line_chart.render()
+
+
+class Command(BaseCommand):
+    help = 'Measure SVG elevation charts throughput on a synthetic trek profile.\n'
+    can_import_settings = True
+
+    option_list = BaseCommand.option_list + (
+        make_option('--length',
+                    type='int',
+                    default=50000,
+                    help='Length of trek in meters.'),
+        make_option('--renders',
+                    type='int',
+                    default=20,
+                    help='Number of charts rendered for each method.'),
+    )
+
+    def measure(self, render, profile, count):
+        start = time.time()
+        for i in range(count):
+            render(profile)
+        return count / (time.time() - start)
+
+    def handle(self, *args, **options):
+        step = settings.ALTIMETRIC_PROFILE_PRECISION
+        profile = [(float(d), 0.0, 0.0, 1000 + 300 * math.sin(d / 3000.0) + 20 * math.sin(d / 200.0))
+                   for d in range(0, options['length'] + 1, step)]
+        count = options['renders']
+
+        cache = get_cache('fat')
+        key = 'benchprofile-svg'
+        cache.set(key, profile_renderer.render(profile))
+
+        def cached(profile):
+            return cache.get(key)
+
+        self.stdout.write('%s samples, %s renders\n' % (len(profile), count))
+        self.stdout.write('method\tcharts/s\n')
+        for name, render in [('legacy', legacy_render),
+                             ('renderer', profile_renderer.render),
+                             ('cached (%s)' % cache.__class__.__name__, cached)]:
+            self.stdout.write('%s\t%.2f\n' % (name, self.measure(render, profile, count)))
+        cache.delete(key)
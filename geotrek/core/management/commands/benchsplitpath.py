@@ -0,0 +1,103 @@
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.conf import settings
+from django.contrib.gis.geos import LineString
+
+from geotrek.authent.models import default_structure
+from geotrek.core.models import Path
+
+
+# Paths inserted in order, same as split path tests scenarios
+SCENARIOS = [
+    ('tee', [[(0, 0, 0), (4, 0, 0)],
+             [(2, 0, 0), (2, 2, 0)]]),
+    ('cross', [[(0, 0, 0), (4, 0, 0)],
+               [(2, -2, 0), (2, 2, 0)]]),
+    ('twice', [[(0, 0, 0), (4, 0, 0)],
+               [(1, 2, 0), (1, -2, 0), (3, -2, 0), (3, 2, 0)]]),
+    ('almost', [[(0, 0, 0), (4, 0, 0)],
+                [(1, 1, 0), (2, -0.2, 0), (3, 1, 0)]]),
+    ('shortest_path', [[(0, 0, 0), (4, 0, 0), (6, -2, 0), (8, -2, 0)],
+                       [(14, 0, 0), (12, 0, 0), (10, -2, 0), (8, -2, 0)],
+                       [(4, 0, 0), (12, 0, 0)]]),
+    ('multiple', [[(1, -2, 0), (1, 2, 0)],
+                  [(2, -2, 0), (2, 2, 0)],
+                  [(3, -2, 0), (3, 2, 0)],
+                  [(4, -2, 0), (4, 2, 0)],
+                  [(0, 0, 0), (5, 0, 0)]]),
+    ('multiple_overlap', [[(0, 0, 0), (10, 0, 0)],
+                          [(2, 0, 0), (2, -1, 0), (8, -1, 0), (8, 0, 0)],
+                          [(2, 1, 0), (5, -2, 0), (8, 1, 0)],
+                          [(3, 1, 0), (5, -2, 0), (7, 1, 0)]]),
+]
+
+
+class Command(BaseCommand):
+    help = 'Measure paths insertion latency (snapping and splitting triggers) on split path scenarios.\n'
+    help += 'Scenarios are replayed among a grid of background paths, in a transaction which is rolled back.\n'
+    can_import_settings = True
+
+    option_list = BaseCommand.option_list + (
+        make_option('--background',
+                    type='int',
+                    default=10000,
+                    help='Number of background paths.'),
+        make_option('--repeat',
+                    type='int',
+                    default=5,
+                    help='Number of runs of each scenario.'),
+    )
+
+    def add_paths(self, cursor, count):
+        # Grid of 50m paths, every 100m, in project extent (far from scenarios)
+        minx, maxy = settings.SPATIAL_EXTENT[0], settings.SPATIAL_EXTENT[1]
+        cursor.execute("SET LOCAL session_replication_role = replica")
+        sql = """
+        INSERT INTO l_t_troncon (geom, valide, structure)
+        SELECT ST_SetSRID(ST_MakeLine(ST_MakePoint(%(x)s + (i %% 500) * 100, %(y)s - (i / 500) * 100, 0),
+                                      ST_MakePoint(%(x)s + (i %% 500) * 100 + 50, %(y)s - (i / 500) * 100, 0)), %(srid)s),
+               TRUE, %(structure)s
+        FROM generate_series(0, %(count)s - 1) AS i
+        """ % {'x': minx, 'y': maxy, 'srid': settings.SRID,
+               'count': count, 'structure': default_structure().pk}
+        cursor.execute(sql)
+        cursor.execute("SET LOCAL session_replication_role = DEFAULT")
+        cursor.execute("ANALYZE l_t_troncon")
+
+    def handle(self, *args, **options):
+        structure = default_structure()
+        transaction.enter_transaction_management()
+        transaction.managed(True)
+        try:
+            cursor = connection.cursor()
+            self.add_paths(cursor, options['background'])
+            self.stdout.write('%s background paths\n' % Path.objects.count())
+            self.stdout.write('scenario\tinserts\tmean (ms)\tmax (ms)\n')
+            total = []
+            for name, geoms in SCENARIOS:
+                latencies = []
+                status = ''
+                for i in range(options['repeat']):
+                    cursor.execute("SAVEPOINT benchsplitpath")
+                    try:
+                        for coords in geoms:
+                            path = Path(geom=LineString(coords, srid=settings.SRID), structure=structure)
+                            started = time.time()
+                            path.save()
+                            latencies.append((time.time() - started) * 1000.0)
+                    except Exception as e:
+                        status = '\t(failed: %s)' % e
+                    cursor.execute("ROLLBACK TO SAVEPOINT benchsplitpath")
+                total.extend(latencies)
+                if latencies:
+                    self.stdout.write('%s\t%s\t%.2f\t%.2f%s\n' % (name, len(geoms),
+                                                               sum(latencies) / len(latencies), max(latencies),
+                                                               status))
+            if total:
+                self.stdout.write('all\t%s\t%.2f\t%.2f\n' % (len(total), sum(total) / len(total), max(total)))
+        finally:
+            transaction.rollback()
+            transaction.leave_transaction_management()
@@ -6,6 +6,9 @@ import os.path
 from subprocess import call
 import tempfile
 
+from geotrek.core import dem
+from geotrek.core.helpers import AltimetryHelper
+
 
 class Command(BaseCommand):
     args = '<dem_path>'
@@ -113,7 +116,7 @@ class Command(BaseCommand):
             cur = connection.cursor()
             sql = 'DROP TABLE mnt'
             cur.execute(sql)
-            transaction.commit_unless_managed()
+            # Committed along with new DEM
             cur.close()
         elif dem_exists and not replace:
             raise CommandError('DEM file exists, use --replace to overwrite')
@@ -145,6 +148,17 @@ class Command(BaseCommand):
             raise CommandError(msg)
         self.stdout.write('DEM successfully clipped/projected.\n')
 
+        # Keep a copy for in-process sampling (see geotrek.core.dem),
+        # published once loaded in database
+        array_path = settings.DEM_ARRAY_PATH
+        if array_path and dem.numpy is None:
+            self.stdout.write('NumPy is not available, DEM will only be sampled in database.\n')
+            array_path = None
+        if array_path:
+            ds = gdal.Open(new_dem.name)
+            dem.DEMSampler.store(ds, array_path)
+            ds = None
+
         # Step 2: Convert to PostGISRaster format
         output = tempfile.NamedTemporaryFile()  # SQL code for raster creation
         cmd = 'raster2pgsql -c -C -I -M -t 100x100 %s mnt' % new_dem.name
@@ -156,6 +170,8 @@ class Command(BaseCommand):
                 raise Exception('raster2pgsql failed with exit code %d' % ret)
         except Exception as e:
             output.close()
+            if array_path:
+                dem.DEMSampler.discard(array_path)
             msg = 'Caught %s: %s' % (e.__class__.__name__, e,)
             raise CommandError(msg)
         finally:
@@ -166,10 +182,22 @@ class Command(BaseCommand):
         self.stdout.write('\n-- Loading DEM into database -----------\n')
         cur = connection.cursor()
         output.file.seek(0)
-        for sql_line in output.file:
-            cur.execute(sql_line)
-        transaction.commit_unless_managed()
-        cur.close()
-        output.close()
+        try:
+            for sql_line in output.file:
+                cur.execute(sql_line)
+            # Cached elevation profiles are obsolete
+            AltimetryHelper.stamp_dem()
+            transaction.commit_unless_managed()
+        except:
+            transaction.rollback_unless_managed()
+            if array_path:
+                dem.DEMSampler.discard(array_path)
+            raise
+        finally:
+            cur.close()
+            output.close()
         self.stdout.write('DEM successfully loaded.\n')
+        if array_path:
+            dem.DEMSampler.publish(array_path)
+            self.stdout.write('DEM array stored at %s.\n' % array_path)
         return
@@ -0,0 +1,428 @@
+import os.path
+from cStringIO import StringIO
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.conf import settings
+
+from geotrek.authent.models import Structure, default_structure
+
+
+# Same as in troncons_snap_extremities()
+SNAP_DISTANCE = 1
+# Same as in troncons_evenement_intersect_split()
+MIN_SEGMENT_LENGTH = 1
+
+# Same as in lien_auto_troncon_couches_sig_iu()
+LAND_LAYERS = [
+    # (layer table, id column, link table, fk column, topology kind)
+    ('l_commune', 'insee', 'f_t_commune', 'commune', 'CITYEDGE'),
+    ('l_secteur', 'id', 'f_t_secteur', 'secteur', 'DISTRICTEDGE'),
+    ('l_zonage_reglementaire', 'id', 'f_t_zonage', 'zone', 'RESTRICTEDAREAEDGE'),
+]
+
+
+def copy_value(value):
+    if value is None:
+        return '\\N'
+    value = unicode(value).encode('utf-8')
+    for char, escaped in [('\\', '\\\\'), ('\t', '\\t'), ('\n', '\\n'), ('\r', '\\r')]:
+        value = value.replace(char, escaped)
+    return value
+
+
+class Command(BaseCommand):
+    args = '<gis_file>'
+    help = 'Load paths from a GIS file (any OGR format).\n'
+    help += 'Paths are snapped, split, draped and linked to land layers all at once, '
+    help += 'following the same rules as database triggers, which are disabled meanwhile '
+    help += '(in this transaction only, requires superuser).\n'
+    can_import_settings = True
+
+    option_list = BaseCommand.option_list + (
+        make_option('--name-field',
+                    default=None,
+                    help='Attribute of features used as paths names.'),
+        make_option('--comments-field',
+                    default=None,
+                    help='Attribute of features used as paths comments.'),
+        make_option('--structure',
+                    default=None,
+                    help='Name of structure of paths (default structure if not set).'),
+        make_option('--srid',
+                    type='int',
+                    default=None,
+                    help='SRID of file, if not known by OGR.'),
+        make_option('--dry-run',
+                    action='store_true',
+                    default=False,
+                    help='Only report what would be loaded (nothing is saved).'),
+    )
+
+    chunk_size = 5000
+
+    def execute_sql(self, sql, params=None):
+        self.cursor.execute(sql % self.context, params)
+        return self.cursor.rowcount
+
+    def scalar(self, sql, params=None):
+        self.execute_sql(sql, params)
+        return self.cursor.fetchone()[0]
+
+    def read_features(self, path, options):
+        try:
+            from osgeo import ogr, osr
+        except ImportError:
+            raise CommandError('GDAL Python bindings are not available. Can not proceed.')
+
+        if not os.path.exists(path):
+            raise CommandError('File does not exists at: %s' % path)
+        datasource = ogr.Open(path)
+        if datasource is None:
+            raise CommandError('File format is not recognized by OGR.')
+
+        target = osr.SpatialReference()
+        target.ImportFromEPSG(settings.SRID)
+        for layer in datasource:
+            source = layer.GetSpatialRef()
+            if options['srid']:
+                source = osr.SpatialReference()
+                source.ImportFromEPSG(options['srid'])
+            if source is None:
+                raise CommandError('Coordinate system of layer %s is unknown (see --srid).' % layer.GetName())
+            transform = osr.CoordinateTransformation(source, target)
+            for feature in layer:
+                geom = feature.GetGeometryRef()
+                if geom is None:
+                    continue
+                geom = geom.Clone()
+                geom.Transform(transform)
+                geom.FlattenTo2D()
+                if geom.GetGeometryType() == ogr.wkbMultiLineString:
+                    parts = [geom.GetGeometryRef(i) for i in range(geom.GetGeometryCount())]
+                else:
+                    parts = [geom]
+                name = feature.GetField(options['name_field']) if options['name_field'] else None
+                comments = feature.GetField(options['comments_field']) if options['comments_field'] else None
+                for part in parts:
+                    yield name, comments, part.ExportToWkb().encode('hex')
+
+    def stage(self, features):
+        """
+        Stream features into staging table with COPY.
+        """
+        self.execute_sql("""
+            CREATE TEMP TABLE tmp_import_brut (
+                nom text,
+                remarques text,
+                geom geometry
+            ) ON COMMIT DROP
+        """)
+        count = 0
+        buf = StringIO()
+        for name, comments, wkb in features:
+            if isinstance(name, str):
+                name = name.decode('utf-8')
+            if name is not None:
+                # Same length as ``Path.name``
+                name = unicode(name)[:20]
+            buf.write('\t'.join([copy_value(name),
+                                 copy_value(comments),
+                                 wkb]) + '\n')
+            count += 1
+            if count % self.chunk_size == 0:
+                buf.seek(0)
+                self.cursor.copy_from(buf, 'tmp_import_brut', columns=('nom', 'remarques', 'geom'))
+                buf = StringIO()
+        buf.seek(0)
+        self.cursor.copy_from(buf, 'tmp_import_brut', columns=('nom', 'remarques', 'geom'))
+        return count
+
+    def validate(self):
+        """
+        Keep lines that paths constraints accept.
+        """
+        self.execute_sql("""
+            CREATE TEMP TABLE tmp_import_troncon ON COMMIT DROP AS
+            SELECT row_number() OVER () AS id, nom, remarques, ST_SetSRID(geom, %(srid)s) AS geom
+            FROM tmp_import_brut
+            WHERE GeometryType(geom) = 'LINESTRING'
+              AND ST_NPoints(geom) > 1
+              AND ST_IsValid(geom) AND ST_IsSimple(geom)
+        """)
+        self.execute_sql("CREATE INDEX tmp_import_troncon_geom_idx ON tmp_import_troncon USING gist(geom)")
+        self.execute_sql("ANALYZE tmp_import_troncon")
+        return self.scalar("SELECT count(*) FROM tmp_import_troncon")
+
+    def snap(self):
+        """
+        Snap extremities to closest line within ``SNAP_DISTANCE`` (or
+        to its closest vertex within ``SNAP_DISTANCE``). Like trigger,
+        lines snap to existing paths and to lines imported before them.
+        """
+        # Each table is joined on its own indexed geometry column
+        self.execute_sql("""
+            CREATE TEMP TABLE tmp_import_accroche ON COMMIT DROP AS
+            WITH x AS (
+                SELECT id, 'start'::text AS cote, ST_StartPoint(geom) AS point FROM tmp_import_troncon
+                UNION ALL
+                SELECT id, 'end'::text AS cote, ST_EndPoint(geom) AS point FROM tmp_import_troncon
+            ), candidates AS (
+                SELECT x.id, x.cote, x.point, o.geom AS other
+                FROM x JOIN tmp_import_troncon o
+                  ON ST_DWithin(o.geom, x.point, %(snap)s) AND o.id < x.id
+                UNION ALL
+                SELECT x.id, x.cote, x.point, ST_Force_2D(p.geom)
+                FROM x JOIN l_t_troncon p
+                  ON ST_DWithin(p.geom, x.point, %(snap)s)
+            )
+            SELECT DISTINCT ON (id, cote)
+                   id, cote, point, ST_ClosestPoint(other, point) AS snapped, other
+            FROM candidates
+            WHERE ST_Distance(other, point) < %(snap)s
+            ORDER BY id, cote, ST_Distance(other, point)
+        """)
+        self.execute_sql("""
+            UPDATE tmp_import_accroche a SET snapped = v.vertex
+            FROM (SELECT DISTINCT ON (id, cote) id, cote, vertex
+                  FROM (SELECT id, cote, snapped, ST_PointN(other, generate_series(1, ST_NPoints(other))) AS vertex
+                        FROM tmp_import_accroche) AS sub
+                  WHERE ST_Distance(snapped, vertex) < %(snap)s
+                  ORDER BY id, cote, ST_Distance(snapped, vertex)) AS v
+            WHERE a.id = v.id AND a.cote = v.cote
+        """)
+        self.execute_sql("""
+            UPDATE tmp_import_troncon t SET geom = ST_SetPoint(t.geom, 0, a.snapped)
+            FROM tmp_import_accroche a WHERE a.id = t.id AND a.cote = 'start'
+        """)
+        self.execute_sql("""
+            UPDATE tmp_import_troncon t SET geom = ST_SetPoint(t.geom, ST_NPoints(t.geom) - 1, a.snapped)
+            FROM tmp_import_accroche a WHERE a.id = t.id AND a.cote = 'end'
+        """)
+        return self.scalar("SELECT count(*) FROM tmp_import_accroche WHERE NOT ST_Equals(point, snapped)")
+
+    def split(self):
+        """
+        Cut lines where they cross (or are touched by) other lines or
+        existing paths. Segments shorter than ``MIN_SEGMENT_LENGTH`` are
+        merged with the previous one.
+        """
+        self.execute_sql("""
+            CREATE TEMP TABLE tmp_import_coupure ON COMMIT DROP AS
+            SELECT DISTINCT id, fraction FROM (
+                SELECT t.id, 0::float AS fraction FROM tmp_import_troncon t
+                UNION ALL
+                SELECT t.id, 1::float FROM tmp_import_troncon t
+                UNION ALL
+                SELECT t.id, ST_Line_Locate_Point(t.geom, (ST_Dump(ST_Intersection(t.geom, o.geom))).geom)
+                FROM tmp_import_troncon t
+                JOIN (SELECT t.id, o.geom
+                      FROM tmp_import_troncon t JOIN tmp_import_troncon o
+                        ON o.geom && t.geom AND o.id != t.id
+                      UNION ALL
+                      SELECT t.id, ST_Force_2D(p.geom)
+                      FROM tmp_import_troncon t JOIN l_t_troncon p
+                        ON p.geom && t.geom) AS o
+                  ON o.id = t.id
+                 AND ST_Intersects(t.geom, o.geom)
+                 AND NOT ST_Relate(t.geom, o.geom, 'FF*F*****')
+                 AND GeometryType(ST_Intersection(t.geom, o.geom)) IN ('POINT', 'MULTIPOINT')
+            ) AS fractions
+        """)
+        # Drop cuts too close to previous one or to end of line
+        self.execute_sql("""
+            DELETE FROM tmp_import_coupure c
+            USING (SELECT c.id, c.fraction,
+                          ST_Length(t.geom) * (c.fraction - lag(c.fraction) OVER w) AS before,
+                          ST_Length(t.geom) * (1 - c.fraction) AS after
+                   FROM tmp_import_coupure c JOIN tmp_import_troncon t ON t.id = c.id
+                   WINDOW w AS (PARTITION BY c.id ORDER BY c.fraction)) AS d
+            WHERE c.id = d.id AND c.fraction = d.fraction
+              AND c.fraction > 0 AND c.fraction < 1
+              AND (d.before < %(min_length)s OR d.after < %(min_length)s)
+        """)
+        self.execute_sql("""
+            CREATE TEMP TABLE tmp_import_segment ON COMMIT DROP AS
+            SELECT DISTINCT ON (ST_AsBinary(geom)) id, nom, remarques, geom
+            FROM (SELECT s.id, s.nom, s.remarques, ST_Line_Substring(s.geom, s.a, s.b) AS geom
+                  FROM (SELECT t.id, t.nom, t.remarques, t.geom, c.fraction AS a,
+                               lead(c.fraction) OVER (PARTITION BY c.id ORDER BY c.fraction) AS b
+                        FROM tmp_import_coupure c JOIN tmp_import_troncon t ON t.id = c.id) AS s
+                  WHERE s.b IS NOT NULL) AS segments
+            ORDER BY ST_AsBinary(geom), id
+        """)
+        segments = self.scalar("SELECT count(*) FROM tmp_import_segment")
+        # Like trigger, skip segments that already exist
+        duplicates = self.execute_sql("""
+            DELETE FROM tmp_import_segment s
+            USING l_t_troncon p
+            WHERE p.geom && s.geom AND ST_Equals(ST_Force_2D(p.geom), s.geom)
+        """)
+        return segments, duplicates
+
+    def insert(self, structure):
+        """
+        Insert segments as paths, draped on DEM, with their nodes.
+        """
+        self.execute_sql("CREATE TEMP TABLE tmp_import_nouveau (id integer) ON COMMIT DROP")
+        self.execute_sql("""
+            WITH inserted AS (
+                INSERT INTO l_t_troncon (structure, valide, nom, remarques, depart, arrivee,
+                                         date_insert, date_update, geom, longueur, pente,
+                                         altitude_minimum, altitude_maximum,
+                                         denivelee_positive, denivelee_negative,
+                                         noeud_source, noeud_cible)
+                SELECT %%s, TRUE, nom, remarques, '', '', now(), now(),
+                       (e).geom3d, ST_3DLength((e).draped), (e).slope,
+                       (e).min_elevation, (e).max_elevation,
+                       (e).positive_gain, (e).negative_gain,
+                       ft_noeud(ST_StartPoint(geom)), ft_noeud(ST_EndPoint(geom))
+                FROM (SELECT nom, remarques, geom, ft_elevation_infos(geom) AS e
+                      FROM tmp_import_segment ORDER BY id OFFSET 0) AS draped
+                RETURNING id
+            )
+            INSERT INTO tmp_import_nouveau SELECT id FROM inserted
+        """, [structure.pk])
+        self.execute_sql("""
+            INSERT INTO l_t_troncon_graph_log (troncon) SELECT id FROM tmp_import_nouveau
+        """)
+        return self.scalar("SELECT count(*) FROM tmp_import_nouveau")
+
+    def link_land(self):
+        """
+        Create land topologies (cities, districts, restricted areas) of
+        new paths.
+        """
+        counts = {}
+        for layer, id_column, link_table, fk_column, kind in LAND_LAYERS:
+            context = dict(self.context, layer=layer, id_column=id_column,
+                           link_table=link_table, fk_column=fk_column)
+            self.cursor.execute("""
+                CREATE TEMP TABLE tmp_import_lien ON COMMIT DROP AS
+                SELECT nextval(pg_get_serial_sequence('e_t_evenement', 'id')) AS eid, land_id, troncon, tgeom,
+                       ST_Line_Locate_Point(tgeom, ST_StartPoint(egeom)) AS pk_a,
+                       ST_Line_Locate_Point(tgeom, ST_EndPoint(egeom)) AS pk_b
+                FROM (SELECT l.%(id_column)s AS land_id, t.id AS troncon, t.geom AS tgeom,
+                             (ST_Dump(ST_Multi(ST_Intersection(l.geom, t.geom)))).geom AS egeom
+                      FROM %(layer)s l
+                      JOIN l_t_troncon t ON ST_Intersects(l.geom, t.geom)
+                      WHERE t.id IN (SELECT id FROM tmp_import_nouveau)) AS sub
+            """ % context)
+            self.cursor.execute("""
+                INSERT INTO e_t_evenement (id, date_insert, date_update, kind, decallage, longueur, geom, supprime)
+                SELECT eid, now(), now(), %s, 0, 0, tgeom, FALSE FROM tmp_import_lien
+            """, [kind])
+            self.cursor.execute("""
+                INSERT INTO e_r_evenement_troncon (troncon, evenement, pk_debut, pk_fin, intervalle)
+                SELECT troncon, eid, least(pk_a, pk_b), greatest(pk_a, pk_b),
+                       ft_intervalle(troncon, pk_a, pk_b) FROM tmp_import_lien
+            """)
+            self.cursor.execute("""
+                INSERT INTO %(link_table)s (evenement, %(fk_column)s) SELECT eid, land_id FROM tmp_import_lien
+            """ % context)
+            self.cursor.execute("SELECT update_geometry_of_evenement(eid) FROM tmp_import_lien")
+            counts[kind] = self.scalar("SELECT count(*) FROM tmp_import_lien")
+            self.cursor.execute("DROP TABLE tmp_import_lien")
+        return counts
+
+    def split_existing(self):
+        """
+        Existing paths crossed by new ones are split by triggers (which
+        also take care of their topologies).
+        """
+        self.execute_sql("""
+            CREATE TEMP TABLE tmp_import_coupe ON COMMIT DROP AS
+            SELECT DISTINCT p.id
+            FROM l_t_troncon p JOIN l_t_troncon n ON p.geom && n.geom
+            WHERE n.id IN (SELECT id FROM tmp_import_nouveau)
+              AND p.id NOT IN (SELECT id FROM tmp_import_nouveau)
+              AND ST_Intersects(p.geom, n.geom)
+              AND NOT ST_Relate(p.geom, n.geom, 'FF*F*****')
+        """)
+        return self.execute_sql("""
+            UPDATE l_t_troncon SET geom = geom WHERE id IN (SELECT id FROM tmp_import_coupe)
+        """)
+
+    def report(self):
+        """
+        Consistency checks of new paths.
+        """
+        checks = [
+            ('overlapping other paths', """
+                SELECT count(DISTINCT (o).idx)
+                FROM (SELECT ft_troncons_overlap(array_agg(n.id ORDER BY n.id), array_agg(n.geom ORDER BY n.id)) AS o
+                      FROM l_t_troncon n WHERE n.id IN (SELECT id FROM tmp_import_nouveau)) AS overlaps"""),
+            ('shorter than %(min_length)s m', """
+                SELECT count(*) FROM l_t_troncon n WHERE n.id IN (SELECT id FROM tmp_import_nouveau)
+                AND ST_Length(n.geom) < %(min_length)s"""),
+            ('with a dangling extremity', """
+                SELECT count(*) FROM l_t_troncon n WHERE n.id IN (SELECT id FROM tmp_import_nouveau)
+                AND (NOT EXISTS (SELECT 1 FROM l_t_troncon o WHERE o.id != n.id
+                                 AND n.noeud_source IN (o.noeud_source, o.noeud_cible))
+                     OR NOT EXISTS (SELECT 1 FROM l_t_troncon o WHERE o.id != n.id
+                                    AND n.noeud_cible IN (o.noeud_source, o.noeud_cible)))"""),
+            ('without elevation', """
+                SELECT count(*) FROM l_t_troncon n WHERE n.id IN (SELECT id FROM tmp_import_nouveau)
+                AND n.altitude_maximum IS NULL"""),
+        ]
+        for label, sql in checks:
+            self.stdout.write('  New paths %s: %s\n' % (label % self.context, self.scalar(sql)))
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError(self.usage('loadpaths'))
+
+        if options['structure']:
+            try:
+                structure = Structure.objects.get(name=options['structure'])
+            except Structure.DoesNotExist:
+                raise CommandError("Structure '%s' does not exist." % options['structure'])
+        else:
+            structure = default_structure()
+
+        self.context = {'srid': settings.SRID,
+                        'snap': SNAP_DISTANCE,
+                        'min_length': MIN_SEGMENT_LENGTH}
+
+        transaction.enter_transaction_management()
+        transaction.managed(True)
+        # Dry run rolls back to it, even within an outer transaction
+        sid = transaction.savepoint()
+        try:
+            self.cursor = connection.cursor()
+            features = self.stage(self.read_features(args[0], options))
+            lines = self.validate()
+            self.stdout.write('%s lines read, %s skipped (invalid or not simple).\n' % (features, features - lines))
+
+            # Unlike ALTER TABLE ... DISABLE TRIGGER, does not lock tables
+            # nor disable triggers for other sessions
+            self.execute_sql("SET LOCAL session_replication_role = replica")
+
+            snapped = self.snap()
+            self.stdout.write('%s extremities snapped.\n' % snapped)
+            segments, duplicates = self.split()
+            self.stdout.write('%s segments after split, %s already existing.\n' % (segments, duplicates))
+            created = self.insert(structure)
+            self.stdout.write('%s paths created.\n' % created)
+            for kind, count in sorted(self.link_land().items()):
+                self.stdout.write('%s %s topologies created.\n' % (count, kind))
+
+            self.execute_sql("SET LOCAL session_replication_role = DEFAULT")
+
+            split = self.split_existing()
+            self.stdout.write('%s existing paths split.\n' % split)
+
+            self.stdout.write('Consistency report:\n')
+            self.report()
+            if options['dry_run']:
+                self.stdout.write('Dry run, nothing saved.\n')
+                transaction.savepoint_rollback(sid)
+                transaction.rollback()
+            else:
+                transaction.commit()
+        except:
+            transaction.rollback()
+            raise
+        finally:
+            transaction.leave_transaction_management()
@@ -0,0 +1,81 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from geotrek.core import dem
+from geotrek.core.models import AltimetryMixin, Path, Topology
+
+
+FIELDS = AltimetryMixin.COLUMNS
+
+
+class Command(BaseCommand):
+    help = 'Recompute elevation infos of paths and topologies from DEM array '
+    help += 'stored by loaddem, without querying DEM in database.\n'
+    can_import_settings = True
+
+    option_list = BaseCommand.option_list + (
+        make_option('--check',
+                    action='store_true',
+                    default=False,
+                    help='Only compare with elevation infos computed in database.'),
+    )
+
+    def columns(self, model):
+        return [model._meta.get_field(f).column for f in FIELDS]
+
+    def recompute(self, cursor, model, sampler):
+        table = model._meta.db_table
+        columns = self.columns(model)
+        # Skip unchanged rows, not to fire update triggers (date, graph log...)
+        sql = 'UPDATE %s SET %s WHERE id = %%s AND (%s) IS DISTINCT FROM (%s)' % (
+            table,
+            ', '.join('%s = %%s' % c for c in columns),
+            ', '.join(columns),
+            ', '.join(['%s'] * len(columns)))
+        updated = 0
+        for pk, geom in model.objects.exclude(geom=None).values_list('pk', 'geom').iterator():
+            infos = sampler.elevation_infos(geom)
+            values = [infos[f] for f in FIELDS]
+            cursor.execute(sql, values + [pk] + values)
+            updated += cursor.rowcount
+        return updated
+
+    def check(self, cursor, model, sampler):
+        mismatches = 0
+        sql = """SELECT ST_3DLength(draped), positive_gain, negative_gain,
+                        min_elevation, max_elevation, slope
+                 FROM ft_elevation_infos(%s::geometry)"""
+        for pk, geom in model.objects.exclude(geom=None).values_list('pk', 'geom').iterator():
+            infos = sampler.elevation_infos(geom)
+            cursor.execute(sql, [geom.ewkt])
+            expected = cursor.fetchone()
+            for field, value in zip(FIELDS, expected):
+                if value is None or infos[field] is None:
+                    same = value == infos[field]
+                else:
+                    same = abs(value - infos[field]) < 1e-6
+                if not same:
+                    mismatches += 1
+                    self.stdout.write('%s %s: %s is %s in database, %s in process\n' % (
+                        model._meta.object_name, pk, field, value, infos[field]))
+        return mismatches
+
+    def handle(self, *args, **options):
+        sampler = dem.get_sampler()
+        if sampler is None:
+            raise CommandError('DEM array is not available (see DEM_ARRAY_PATH setting and loaddem command).')
+
+        cursor = connection.cursor()
+        if options['check']:
+            mismatches = sum(self.check(cursor, model, sampler) for model in (Path, Topology))
+            if mismatches:
+                raise CommandError('%s values differ from database.' % mismatches)
+            self.stdout.write('Elevation infos are identical.\n')
+            return
+
+        for model in (Path, Topology):
+            count = self.recompute(cursor, model, sampler)
+            self.stdout.write('%s %s updated.\n' % (count, model._meta.verbose_name_plural))
+        transaction.commit_unless_managed()
@@ -8,13 +8,15 @@ import functools
 from django.contrib.gis.db import models
 from django.conf import settings
 from django.utils.translation import ugettext_lazy as _
+from django.utils.timezone import utc
 from django.contrib.gis.geos import LineString, Point
 
 from mapentity.models import MapEntityMixin
-from mapentity.helpers import is_file_newer, convertit_download
+from mapentity.helpers import convertit_download
 
 from geotrek.authent.models import StructureRelated
-from geotrek.common.models import TimeStampedModel, NoDeleteMixin
+from geotrek.common.models import TimeStampedModel, NoDeleteMixin, RenderJob
+from geotrek.common import rendering
 from geotrek.common.utils import classproperty
 from geotrek.common.utils.postgresql import debug_pg_notices
 
@@ -52,10 +54,10 @@ class AltimetryMixin(models.Model):
         return self
 
     def get_elevation_profile(self):
-        return AltimetryHelper.elevation_profile(self.geom)
+        return AltimetryHelper.cached_elevation_profile(self)
 
     def get_elevation_profile_svg(self):
-        return AltimetryHelper.profile_svg(self.get_elevation_profile())
+        return AltimetryHelper.cached_profile_svg(self)
 
     @models.permalink
     def get_elevation_chart_url(self):
@@ -74,18 +76,30 @@ class AltimetryMixin(models.Model):
             os.mkdir(basefolder)
         return os.path.join(basefolder, '%s-%s.png' % (self._meta.module_name, self.pk))
 
+    def get_elevation_chart_date(self):
+        """Elevation chart is outdated if older than object or DEM.
+        """
+        dem_loaded = datetime.fromtimestamp(AltimetryHelper.dem_version() / 1000.0, utc)
+        return max(self.date_update, dem_loaded)
+
     def prepare_elevation_chart(self, request):
+        """Makes sure PNG elevation chart exists on disk (rendered in
+        background if outdated, see ``geotrek.common.rendering``).
+        """
+        rendering.prepare(self, RenderJob.ELEVATION_CHART,
+                          self.get_elevation_chart_path(),
+                          self.get_elevation_chart_date(),
+                          lambda: self.render_elevation_chart(request),
+                          request.build_absolute_uri('/'))
+
+    def render_elevation_chart(self, request):
         """Converts SVG elevation URI to PNG on disk.
         """
         from .views import HttpSVGResponse
-        path = self.get_elevation_chart_path()
-        # Do nothing if image is up-to-date
-        if is_file_newer(path, self.date_update):
-            return
         # Download converted chart as png using convertit
         convertit_download(request,
                            self.get_elevation_chart_url(),
-                           path,
+                           self.get_elevation_chart_path(),
                            from_type=HttpSVGResponse.content_type,
                            to_type='image/png')
 
@@ -134,6 +148,9 @@ class Path(MapEntityMixin, AltimetryMixin, TimeStampedModel, StructureRelated):
     networks = models.ManyToManyField('Network',
                                       blank=True, null=True, related_name="paths",
                                       verbose_name=_(u"Networks"), db_table="l_r_troncon_reseau")
+    # Computed by triggers (see l_t_noeud table)
+    source_node = models.IntegerField(null=True, editable=False, db_index=True, db_column='noeud_source')
+    target_node = models.IntegerField(null=True, editable=False, db_index=True, db_column='noeud_cible')
 
     is_reversed = False
 
@@ -151,14 +168,34 @@ class Path(MapEntityMixin, AltimetryMixin, TimeStampedModel, StructureRelated):
         Returns the closest path of the point.
         Will fail if no path in database.
         """
-        # TODO: move to custom manager
-        if point.srid != settings.SRID:
-            point = point.transform(settings.SRID, clone=True)
-        return cls.objects.all().distance(point).order_by('distance')[0]
+        return cls.closest_many([point])[0]
+
+    @classmethod
+    def closest_many(cls, points):
+        """
+        Returns the closest path of each point, in one query.
+        Will fail if no path in database.
+        """
+        pks = PathHelper.closest_many(points)
+        if None in pks:
+            raise cls.DoesNotExist("No path in database")
+        paths = cls.objects.in_bulk(set(pks))
+        return [paths[pk] for pk in pks]
 
     def is_overlap(self):
         return not PathHelper.disjoint(self.geom, self.pk)
 
+    def get_rendered_files(self):
+        return [(RenderJob.ELEVATION_CHART, self.get_elevation_chart_path(), self.get_elevation_chart_date()),
+                (RenderJob.MAP_IMAGE, self.get_map_image_path(), self.date_update)]
+
+    def prepare_map_image(self, rooturl):
+        rendering.prepare(self, RenderJob.MAP_IMAGE, self.get_map_image_path(), self.date_update,
+                          lambda: self.render_map_image(rooturl), rooturl)
+
+    def render_map_image(self, rooturl):
+        super(Path, self).prepare_map_image(rooturl)
+
     def reverse(self):
         """
         Reverse the geometry.
@@ -190,6 +227,8 @@ class Path(MapEntityMixin, AltimetryMixin, TimeStampedModel, StructureRelated):
         if self.pk:
             fromdb = self.__class__.objects.get(pk=self.pk)
             self.geom = fromdb.geom
+            self.source_node = fromdb.source_node
+            self.target_node = fromdb.target_node
             AltimetryMixin.reload(self, fromdb)
             TimeStampedModel.reload(self, fromdb)
         return self
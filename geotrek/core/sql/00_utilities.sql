@@ -68,7 +68,16 @@ CREATE TYPE elevation_infos AS (
 
 
 
-CREATE OR REPLACE FUNCTION ft_drape_line(linegeom geometry, step integer)
+CREATE OR REPLACE FUNCTION ft_elevate_point(point geometry, ele integer) RETURNS geometry AS $$
+    -- Keep existing elevation if any
+    SELECT CASE WHEN coalesce(ST_Z($1)::integer, 0) > 0 THEN $1
+                ELSE ST_SetSRID(ST_MakePoint(ST_X($1), ST_Y($1), $2), ST_SRID($1))
+           END;
+$$ LANGUAGE sql IMMUTABLE;
+
+
+
+CREATE OR REPLACE FUNCTION ft_line_samples(linegeom geometry, step integer)
     RETURNS TABLE (distance float, geom geometry) AS $$
 DECLARE
     smart_step integer;
@@ -94,7 +103,7 @@ BEGIN
                 SELECT i as distance, ST_GeometryN(ST_LocateAlong(linem, i), 1) AS geom FROM linemesure
                 UNION
                 SELECT length as distance, ST_EndPoint(linegeom) as geom)
-        SELECT p.distance, add_point_elevation(p.geom)
+        SELECT p.distance::float, p.geom
         FROM points2d p
         ORDER BY p.distance;
 END;
@@ -102,38 +111,63 @@ $$ LANGUAGE plpgsql;
 
 
 
-CREATE OR REPLACE FUNCTION add_point_elevation(geom geometry) RETURNS geometry AS $$
-DECLARE
-    ele integer;
-    geom3d geometry;
+CREATE OR REPLACE FUNCTION ft_drape_line(linegeom geometry, step integer)
+    RETURNS TABLE (distance float, geom geometry) AS $$
 BEGIN
-    ele := coalesce(ST_Z(geom)::integer, 0);
-    IF ele > 0 THEN
-        RETURN geom;
+    -- Ensure we have a DEM
+    PERFORM * FROM raster_columns WHERE r_table_name = 'mnt';
+    IF NOT FOUND THEN
+        RETURN QUERY
+            SELECT p.distance, ft_elevate_point(p.geom, 0)
+            FROM ft_line_samples(linegeom, step) p
+            ORDER BY p.distance;
+        RETURN;
     END IF;
 
+    -- All samples are looked up in DEM tiles at once
+    -- (points on tiles borders intersect several tiles)
+    RETURN QUERY
+        SELECT DISTINCT ON (p.distance) p.distance, ft_elevate_point(p.geom, ST_Value(m.rast, 1, p.geom)::integer)
+        FROM ft_line_samples(linegeom, step) p
+        LEFT JOIN mnt m ON ST_Intersects(m.rast, p.geom)
+        ORDER BY p.distance;
+END;
+$$ LANGUAGE plpgsql;
+
+
+
+CREATE OR REPLACE FUNCTION ft_drape_points(points geometry[])
+    RETURNS TABLE (idx integer, geom geometry) AS $$
+BEGIN
     -- Ensure we have a DEM
     PERFORM * FROM raster_columns WHERE r_table_name = 'mnt';
-    IF FOUND THEN
-        SELECT ST_Value(rast, 1, geom)::integer INTO ele
-        FROM mnt
-        WHERE ST_Intersects(rast, geom);
+    IF NOT FOUND THEN
+        RETURN QUERY
+            SELECT i, ft_elevate_point(points[i], 0)
+            FROM generate_subscripts(points, 1) AS i
+            ORDER BY i;
+        RETURN;
     END IF;
 
-    geom3d := ST_MakePoint(ST_X(geom), ST_Y(geom), ele);
-    geom3d := ST_SetSRID(geom3d, ST_SRID(geom));
-    RETURN geom3d;
+    RETURN QUERY
+        SELECT DISTINCT ON (p.i) p.i, ft_elevate_point(p.point, ST_Value(m.rast, 1, p.point)::integer)
+        FROM (SELECT i, points[i] AS point FROM generate_subscripts(points, 1) AS i) AS p
+        LEFT JOIN mnt m ON ST_Intersects(m.rast, p.point)
+        ORDER BY p.i;
 END;
 $$ LANGUAGE plpgsql;
 
 
+
+CREATE OR REPLACE FUNCTION add_point_elevation(geom geometry) RETURNS geometry AS $$
+    SELECT d.geom FROM ft_drape_points(ARRAY[$1]) d;
+$$ LANGUAGE sql;
+
+
 CREATE OR REPLACE FUNCTION ft_elevation_infos(geom geometry) RETURNS elevation_infos AS $$
 DECLARE
-    num_points integer;
+    line geometry;
     current geometry;
-    points3d geometry[];
-    ele integer;
-    last_ele integer;
     result elevation_infos;
     ALTIMETRIC_PROFILE_PRECISION integer;
 BEGIN
@@ -160,16 +194,12 @@ BEGIN
     END IF;
 
     -- Now geom is LineString only.
+    -- (avoid ambiguity with geom columns in queries below)
+    line := geom;
 
-    -- First build 3D version of geometry (same resolution)
-    num_points := ST_NPoints(geom);
-    points3d := ARRAY[]::geometry[];
-    FOR i IN 1..num_points LOOP
-        current := ST_PointN(geom, i);
-        -- Store new 3D points
-        points3d := array_append(points3d, add_point_elevation(current));
-    END LOOP;
-    result.geom3d := ST_SetSRID(ST_MakeLine(points3d), ST_SRID(geom));
+    -- First build 3D version of geometry (same resolution), all vertices at once
+    SELECT ST_SetSRID(ST_MakeLine(array_agg(d.geom ORDER BY d.idx)), ST_SRID(line)) INTO result.geom3d
+    FROM ft_drape_points(ARRAY(SELECT ST_PointN(line, n) FROM generate_series(1, ST_NPoints(line)) AS n ORDER BY n)) d;
 
     result.min_elevation := ST_ZMin(result.geom3d)::integer;
     result.max_elevation := ST_ZMax(result.geom3d)::integer;
@@ -177,24 +207,18 @@ BEGIN
     -- Compute slope
     result.slope := 0.0;
     IF ST_Length2D(result.geom3d) > 0 THEN
-        result.slope := (result.max_elevation - result.min_elevation) / ST_Length2D(geom);
+        result.slope := (result.max_elevation - result.min_elevation) / ST_Length2D(line);
     END IF;
 
     -- Compute gain and elevation using (higher resolution)
-    result.positive_gain := 0;
-    result.negative_gain := 0;
-    last_ele := NULL;
-    points3d := ARRAY[]::geometry[];
-    FOR current IN SELECT dl.geom FROM ft_drape_line(geom, ALTIMETRIC_PROFILE_PRECISION) dl LOOP
-        points3d := array_append(points3d, current);
-        ele := ST_Z(current)::integer;
-        -- Add positive only if ele - last_ele > 0
-        result.positive_gain := result.positive_gain + greatest(ele - coalesce(last_ele, ele), 0);
-        -- Add negative only if ele - last_ele < 0
-        result.negative_gain := result.negative_gain + least(ele - coalesce(last_ele, ele), 0);
-        last_ele := ele;
-    END LOOP;
-    result.draped := ST_SetSRID(ST_MakeLine(points3d), ST_SRID(geom));
+    -- Differences with previous sample are positive or negative gains
+    SELECT ST_SetSRID(ST_MakeLine(array_agg(s.geom ORDER BY s.distance)), ST_SRID(line)),
+           coalesce(sum(greatest(s.ele - s.previous, 0)), 0),
+           coalesce(sum(least(s.ele - s.previous, 0)), 0)
+      INTO result.draped, result.positive_gain, result.negative_gain
+    FROM (SELECT dl.distance, dl.geom, ST_Z(dl.geom)::integer AS ele,
+                 lag(ST_Z(dl.geom)::integer) OVER (ORDER BY dl.distance) AS previous
+          FROM ft_drape_line(line, ALTIMETRIC_PROFILE_PRECISION) dl) AS s;
     RETURN result;
 END;
 $$ LANGUAGE plpgsql;
@@ -38,6 +38,22 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Same as ft_troncon_interpolate() for arrays of paths and points, in one query.
+-- Results are indexed by position in arrays (starting at 1).
+CREATE OR REPLACE FUNCTION ft_troncons_interpolate(troncons integer[], points geometry[])
+RETURNS TABLE (idx integer, position float, distance float) AS $$
+    SELECT i,
+           ST_Line_Locate_Point(line, point),
+           -- Same rules as ST_InterpolateAlong()
+           CASE WHEN ST_Length(shortest) < 0.1 THEN 0.0
+                WHEN ST_LineCrossingDirection(line, shortest) < 0 THEN ST_Length(shortest)
+                WHEN ST_LineCrossingDirection(line, shortest) > 0 THEN -ST_Length(shortest)
+                ELSE 0.0 END
+    FROM (SELECT i, t.geom AS line, $2[i] AS point, ST_ShortestLine(t.geom, $2[i]) AS shortest
+          FROM generate_subscripts($1, 1) AS i
+          JOIN l_t_troncon t ON t.id = $1[i]) AS s;
+$$ LANGUAGE sql;
+
 
 -------------------------------------------------------------------------------
 -- Compute geometry of Evenements
@@ -45,11 +61,25 @@ $$ LANGUAGE plpgsql;
 
 DROP TRIGGER IF EXISTS e_r_evenement_troncon_geometry_tgr ON e_r_evenement_troncon;
 
+CREATE OR REPLACE FUNCTION ft_evenements_geometry_deferred() RETURNS boolean AS $$
+BEGIN
+    -- Bulk insertions create this temporary table in their session to postpone
+    -- geometry computation. They call update_geometry_of_evenement() once at the end.
+    PERFORM * FROM pg_class
+        WHERE relname = 'tmp_evenements_deferred' AND relnamespace = pg_my_temp_schema();
+    RETURN FOUND;
+END;
+$$ LANGUAGE plpgsql;
+
 CREATE OR REPLACE FUNCTION ft_evenements_troncons_geometry() RETURNS trigger AS $$
 DECLARE
     eid integer;
     eids integer[];
 BEGIN
+    IF ft_evenements_geometry_deferred() THEN
+        RETURN NULL;
+    END IF;
+
     IF TG_OP = 'INSERT' THEN
         eids := array_append(eids, NEW.evenement);
     ELSE
@@ -140,3 +170,47 @@ $$ LANGUAGE plpgsql VOLATILE;
 CREATE TRIGGER e_r_evenement_troncon_junction_point_iu_tgr
 AFTER INSERT OR UPDATE OF pk_debut, pk_fin ON e_r_evenement_troncon
 FOR EACH ROW EXECUTE PROCEDURE ft_evenements_troncons_junction_point_iu();
+
+
+-------------------------------------------------------------------------------
+-- Indexed intervals of aggregations, for overlapping lookups
+-- Range types are not available before PostgreSQL 9.2 : a box with paths
+-- id as x and positions as y is used instead. Two boxes overlap (&&) only
+-- on the same path, if intervals overlap (bounds included).
+-------------------------------------------------------------------------------
+
+DO LANGUAGE plpgsql $$
+BEGIN
+    PERFORM * FROM information_schema.columns
+        WHERE table_name = 'e_r_evenement_troncon' AND column_name = 'intervalle';
+    IF NOT FOUND THEN
+        ALTER TABLE e_r_evenement_troncon ADD COLUMN intervalle box;
+    END IF;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION ft_intervalle(troncon integer, pk_debut float, pk_fin float) RETURNS box AS $$
+    SELECT box(point($1, least($2, $3)), point($1, greatest($2, $3)));
+$$ LANGUAGE sql IMMUTABLE;
+
+DROP TRIGGER IF EXISTS e_r_evenement_troncon_intervalle_iu_tgr ON e_r_evenement_troncon;
+
+CREATE OR REPLACE FUNCTION update_intervalle_evenement_troncon() RETURNS trigger AS $$
+BEGIN
+    NEW.intervalle := ft_intervalle(NEW.troncon, NEW.pk_debut, NEW.pk_fin);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER e_r_evenement_troncon_intervalle_iu_tgr
+BEFORE INSERT OR UPDATE OF troncon, pk_debut, pk_fin ON e_r_evenement_troncon
+FOR EACH ROW EXECUTE PROCEDURE update_intervalle_evenement_troncon();
+
+-- Fill existing aggregations (geometries of topologies do not change)
+ALTER TABLE e_r_evenement_troncon DISABLE TRIGGER e_r_evenement_troncon_geometry_tgr;
+UPDATE e_r_evenement_troncon SET intervalle = ft_intervalle(troncon, pk_debut, pk_fin)
+    WHERE intervalle IS NULL;
+ALTER TABLE e_r_evenement_troncon ENABLE TRIGGER e_r_evenement_troncon_geometry_tgr;
+
+DROP INDEX IF EXISTS e_r_evenement_troncon_intervalle_idx;
+CREATE INDEX e_r_evenement_troncon_intervalle_idx ON e_r_evenement_troncon USING gist(intervalle);
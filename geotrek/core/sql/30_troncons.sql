@@ -32,6 +32,38 @@ DROP INDEX IF EXISTS l_t_troncon_geom_cadastre_idx;
 CREATE INDEX l_t_troncon_geom_cadastre_idx ON l_t_troncon USING gist(geom_cadastre);
 
 
+-------------------------------------------------------------------------------
+-- Closest path of a point
+-------------------------------------------------------------------------------
+
+CREATE OR REPLACE FUNCTION ft_troncon_closest(point geometry, radius float) RETURNS integer AS $$
+DECLARE
+    tid integer;
+    d float;
+BEGIN
+    -- Most of the time, the closest path is in the neighbourhood
+    SELECT id INTO tid FROM l_t_troncon
+    WHERE ST_DWithin(geom, point, radius)
+    ORDER BY ST_Distance(geom, point) LIMIT 1;
+    IF tid IS NOT NULL THEN
+        RETURN tid;
+    END IF;
+
+    -- Otherwise, nearest bounding boxes (KNN index scan) give an upper bound
+    -- of the distance to the closest path.
+    SELECT min(ST_Distance(geom, point)) INTO d
+    FROM (SELECT geom FROM l_t_troncon ORDER BY geom <#> point LIMIT 10) AS candidates;
+    IF d IS NULL THEN
+        RETURN NULL;
+    END IF;
+    SELECT id INTO tid FROM l_t_troncon
+    WHERE ST_DWithin(geom, point, d)
+    ORDER BY ST_Distance(geom, point) LIMIT 1;
+    RETURN tid;
+END;
+$$ LANGUAGE plpgsql;
+
+
 -------------------------------------------------------------------------------
 -- Keep dates up-to-date
 -------------------------------------------------------------------------------
@@ -52,32 +84,37 @@ CREATE TRIGGER l_t_troncon_date_update_tgr
 -------------------------------------------------------------------------------
 
 CREATE OR REPLACE FUNCTION check_path_not_overlap(pid integer, line geometry) RETURNS BOOL AS $$
-DECLARE
-    t_count integer;
-    tolerance float;
 BEGIN
     -- Note: I gave up with the idea of checking almost overlap/touch.
 
-    -- tolerance := 1.0;
-    -- Crossing and extremity touching is OK. 
-    -- Overlapping and --almost overlapping-- is KO.
-    SELECT COUNT(*) INTO t_count
-    FROM l_t_troncon 
-    WHERE pid != id 
-      AND ST_GeometryType(ST_intersection(geom, line)) IN ('ST_LineString', 'ST_MultiLineString');
-      -- not extremity touching
-      -- AND ST_Touches(geom, line) = false
-      -- not crossing
-      -- AND ST_GeometryType(ST_intersection(geom, line)) NOT IN ('ST_Point', 'ST_MultiPoint')
-      -- overlap is a line
-      -- AND ST_GeometryType(ST_intersection(geom, ST_buffer(line, tolerance))) IN ('ST_LineString', 'ST_MultiLineString')
-      -- not almost touching, at most twice
-      -- AND       ST_Length(ST_intersection(geom, ST_buffer(line, tolerance))) > (4 * tolerance);
-    RETURN t_count = 0;
+    -- Crossing and extremity touching is OK.
+    -- Overlapping (interiors share a line) is KO.
+    -- Bounding boxes comparison (&&) restricts the check to neighbour paths
+    -- using spatial index.
+    RETURN NOT EXISTS (
+        SELECT 1
+        FROM l_t_troncon
+        WHERE coalesce(pid, -1) != id
+          AND geom && line
+          AND ST_Relate(geom, line, '1********')
+    );
 END;
 $$ LANGUAGE plpgsql;
 
 
+-- Same as check_path_not_overlap() for arrays of paths and lines (to
+-- validate a whole set at once), in one query. Returns overlapping paths,
+-- indexed by position in arrays (starting at 1). Use NULL for unsaved paths.
+CREATE OR REPLACE FUNCTION ft_troncons_overlap(troncons integer[], lines geometry[])
+RETURNS TABLE (idx integer, troncon integer) AS $$
+    SELECT i, t.id
+    FROM generate_subscripts($2, 1) AS i
+    JOIN l_t_troncon t ON t.geom && $2[i]
+                      AND t.id != coalesce($1[i], -1)
+                      AND ST_Relate(t.geom, $2[i], '1********');
+$$ LANGUAGE sql;
+
+
 -------------------------------------------------------------------------------
 -- Update geometry of related topologies
 -------------------------------------------------------------------------------
@@ -209,3 +246,53 @@ $$ LANGUAGE plpgsql;
 CREATE TRIGGER l_t_troncon_latest_updated_d_tgr
 AFTER DELETE ON l_t_troncon
 FOR EACH ROW EXECUTE PROCEDURE troncon_latest_updated_d();
+
+
+-------------------------------------------------------------------------------
+-- Log changes of paths network (graph deltas)
+-------------------------------------------------------------------------------
+
+-- Entries are read by ranges of version (primary key index)
+CREATE TABLE IF NOT EXISTS l_t_troncon_graph_log (
+    version serial PRIMARY KEY,
+    troncon integer NOT NULL,
+    date timestamp NOT NULL DEFAULT now()
+);
+
+DROP TRIGGER IF EXISTS l_t_troncon_graph_log_iud_tgr ON l_t_troncon;
+
+CREATE OR REPLACE FUNCTION troncons_graph_log_iud() RETURNS trigger AS $$
+BEGIN
+    -- Paths created or shrunk by the split trigger are logged here too,
+    -- since it relies on regular INSERT and UPDATE statements.
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO l_t_troncon_graph_log (troncon) VALUES (OLD.id);
+    ELSE
+        INSERT INTO l_t_troncon_graph_log (troncon) VALUES (NEW.id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER l_t_troncon_graph_log_iud_tgr
+AFTER INSERT OR UPDATE OF geom OR DELETE ON l_t_troncon
+FOR EACH ROW EXECUTE PROCEDURE troncons_graph_log_iud();
+
+
+DROP TRIGGER IF EXISTS l_t_troncon_graph_log_purge_tgr ON l_t_troncon;
+
+CREATE OR REPLACE FUNCTION troncons_graph_log_purge() RETURNS trigger AS $$
+BEGIN
+    -- Keep the last 1000 changes (see GraphHelper.history_size). The
+    -- newest entry is never deleted: its version is used in graph ETags.
+    DELETE FROM l_t_troncon_graph_log
+    WHERE version < (SELECT version FROM l_t_troncon_graph_log
+                     ORDER BY version DESC OFFSET 999 LIMIT 1)
+      AND version < (SELECT max(version) FROM l_t_troncon_graph_log);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER l_t_troncon_graph_log_purge_tgr
+AFTER INSERT OR UPDATE OF geom OR DELETE ON l_t_troncon
+FOR EACH STATEMENT EXECUTE PROCEDURE troncons_graph_log_purge();
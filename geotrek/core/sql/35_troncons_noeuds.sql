@@ -0,0 +1,72 @@
+-------------------------------------------------------------------------------
+-- Nodes of paths network
+-- Paths extremities are snapped to nodes, whose ids are stable and stored
+-- in noeud_source/noeud_cible columns of paths.
+-------------------------------------------------------------------------------
+
+CREATE TABLE IF NOT EXISTS l_t_noeud (
+    id serial PRIMARY KEY,
+    geom geometry NOT NULL
+);
+
+DROP INDEX IF EXISTS l_t_noeud_geom_idx;
+CREATE INDEX l_t_noeud_geom_idx ON l_t_noeud USING gist(geom);
+
+
+CREATE OR REPLACE FUNCTION ft_noeud(point geometry) RETURNS integer AS $$
+DECLARE
+    nid integer;
+    p geometry;
+BEGIN
+    p := ST_Force_2D(point);
+    -- Prevent concurrent transactions from creating the same node twice
+    PERFORM pg_advisory_xact_lock(hashtext(ST_AsEWKT(p)));
+
+    SELECT id INTO nid FROM l_t_noeud WHERE geom && p AND ST_Equals(geom, p) LIMIT 1;
+    IF nid IS NULL THEN
+        INSERT INTO l_t_noeud (geom) VALUES (p) RETURNING id INTO nid;
+    END IF;
+    RETURN nid;
+END;
+$$ LANGUAGE plpgsql;
+
+
+DROP TRIGGER IF EXISTS l_t_troncon_20_noeuds_iu_tgr ON l_t_troncon;
+
+CREATE OR REPLACE FUNCTION troncons_noeuds_iu() RETURNS trigger AS $$
+BEGIN
+    -- Runs after snapping and draping (triggers are fired by name order)
+    NEW.noeud_source := ft_noeud(ST_StartPoint(NEW.geom));
+    NEW.noeud_cible := ft_noeud(ST_EndPoint(NEW.geom));
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER l_t_troncon_20_noeuds_iu_tgr
+BEFORE INSERT OR UPDATE OF geom ON l_t_troncon
+FOR EACH ROW EXECUTE PROCEDURE troncons_noeuds_iu();
+
+
+DROP TRIGGER IF EXISTS l_t_troncon_noeuds_ud_tgr ON l_t_troncon;
+
+CREATE OR REPLACE FUNCTION troncons_noeuds_ud() RETURNS trigger AS $$
+BEGIN
+    -- Remove nodes that are not used anymore
+    DELETE FROM l_t_noeud n
+    WHERE n.id IN (OLD.noeud_source, OLD.noeud_cible)
+      AND NOT EXISTS (SELECT 1 FROM l_t_troncon t
+                      WHERE t.noeud_source = n.id OR t.noeud_cible = n.id);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER l_t_troncon_noeuds_ud_tgr
+AFTER UPDATE OF geom OR DELETE ON l_t_troncon
+FOR EACH ROW EXECUTE PROCEDURE troncons_noeuds_ud();
+
+
+-- Paths created before nodes were introduced
+UPDATE l_t_troncon
+    SET noeud_source = ft_noeud(ST_StartPoint(geom)),
+        noeud_cible = ft_noeud(ST_EndPoint(geom))
+    WHERE noeud_source IS NULL OR noeud_cible IS NULL;
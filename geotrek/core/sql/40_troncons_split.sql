@@ -1,77 +1,52 @@
 DROP TRIGGER IF EXISTS l_t_troncon_00_snap_geom_iu_tgr ON l_t_troncon;
 
-CREATE OR REPLACE FUNCTION troncons_snap_extremities() RETURNS trigger AS $$
+CREATE OR REPLACE FUNCTION ft_snap_extremity(point geometry, pid integer, distance float8) RETURNS geometry AS $$
 DECLARE
-    linestart geometry;
-    lineend geometry;
     other geometry;
     result geometry;
-    newline geometry[];
-    d float8;
-
-    DISTANCE float8;
 BEGIN
-    DISTANCE := 1;
-
-    linestart := ST_StartPoint(NEW.geom);
-    lineend := ST_EndPoint(NEW.geom);
-
-    result := NULL;
-    SELECT ST_ClosestPoint(geom, linestart), geom INTO result, other
+    -- Only paths around the extremity are fetched (ST_DWithin() uses the
+    -- spatial index with the point bounding box expanded by distance)
+    SELECT ST_ClosestPoint(geom, point), geom INTO result, other
       FROM l_t_troncon
-      WHERE geom && ST_Buffer(NEW.geom, DISTANCE * 2)
-        AND id != NEW.id
-        AND ST_Distance(geom, linestart) < DISTANCE
-      ORDER BY ST_Distance(geom, linestart)
+      WHERE ST_DWithin(geom, point, distance)
+        AND id != pid
+        AND ST_Distance(geom, point) < distance
+      ORDER BY ST_Distance(geom, point)
       LIMIT 1;
 
     IF result IS NULL THEN
-        result := linestart;
-    ELSE
-        d := DISTANCE;
-        FOR i IN 1..ST_NPoints(other) LOOP
-            IF ST_Distance(result, ST_PointN(other, i)) < DISTANCE AND ST_Distance(result, ST_PointN(other, i)) < d THEN
-                d := ST_Distance(result, ST_PointN(other, i));
-                result := ST_PointN(other, i);
-            END IF;
-        END LOOP;
-        IF NOT ST_Equals(linestart, result) THEN
-            RAISE NOTICE 'Snapped start % to %, from %', ST_AsText(linestart), ST_AsText(result), ST_AsText(other);
-        END IF;
+        RETURN point;
     END IF;
-    newline := array_append(newline, result);
-
-    FOR i IN 2..ST_NPoints(NEW.geom)-1 LOOP
-        newline := array_append(newline, ST_PointN(NEW.geom, i));
-    END LOOP;
 
-    result := NULL;
-    SELECT ST_ClosestPoint(geom, lineend), geom INTO result, other
-      
-      FROM l_t_troncon
-      WHERE geom && ST_Buffer(NEW.geom, DISTANCE * 2)
-        AND id != NEW.id
-        AND ST_Distance(geom, lineend) < DISTANCE
-      ORDER BY ST_Distance(geom, lineend)
-      LIMIT 1;
-    IF result IS NULL THEN
-        result := lineend;
-    ELSE
-        d := DISTANCE;
-        FOR i IN 1..ST_NPoints(other) LOOP
-            IF ST_Distance(result, ST_PointN(other, i)) < DISTANCE AND ST_Distance(result, ST_PointN(other, i)) < d THEN
-                d := ST_Distance(result, ST_PointN(other, i));
-                result := ST_PointN(other, i);
-            END IF;
-        END LOOP;
-        IF NOT ST_Equals(lineend, result) THEN
-            RAISE NOTICE 'Snapped end % to %, from %', ST_AsText(lineend), ST_AsText(result), ST_AsText(other);
-        END IF;
+    -- Prefer closest vertex of other path, if close enough (first one on ties)
+    SELECT COALESCE(
+        (SELECT ST_PointN(other, i)
+           FROM generate_series(1, ST_NPoints(other)) AS i
+           WHERE ST_Distance(result, ST_PointN(other, i)) < distance
+           ORDER BY ST_Distance(result, ST_PointN(other, i)), i
+           LIMIT 1),
+        result) INTO result;
+
+    IF NOT ST_Equals(point, result) THEN
+        RAISE NOTICE 'Snapped % to %, from %', ST_AsText(point), ST_AsText(result), ST_AsText(other);
     END IF;
-    newline := array_append(newline, result);
+    RETURN result;
+END;
+$$ LANGUAGE plpgsql;
+
+
+CREATE OR REPLACE FUNCTION troncons_snap_extremities() RETURNS trigger AS $$
+DECLARE
+    DISTANCE float8;
+BEGIN
+    DISTANCE := 1;
 
-    RAISE NOTICE 'New geom %', ST_AsText(ST_MakeLine(newline));
-    NEW.geom := ST_Force_3D(ST_MakeLine(newline));
+    NEW.geom := ST_Force_3D(NEW.geom);
+    NEW.geom := ST_SetPoint(NEW.geom, 0,
+                            ST_Force_3D(ft_snap_extremity(ST_StartPoint(NEW.geom), NEW.id, DISTANCE)));
+    NEW.geom := ST_SetPoint(NEW.geom, ST_NPoints(NEW.geom) - 1,
+                            ST_Force_3D(ft_snap_extremity(ST_EndPoint(NEW.geom), NEW.id, DISTANCE)));
     RETURN NEW;
 END;
 $$ LANGUAGE plpgsql;
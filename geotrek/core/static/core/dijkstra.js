@@ -170,8 +170,38 @@ Geotrek.Dijkstra = (function() {
 
     };
 
+    // Graph from its binary encoding (see core.helpers#GraphHelper.encode)
+    function decode_graph(buffer) {
+        var header = new Uint32Array(buffer, 0, 2),
+            count = header[0],
+            ids = new Int32Array(buffer, 8, count),
+            sources = new Int32Array(buffer, 8 + 4 * count, count),
+            targets = new Int32Array(buffer, 8 + 8 * count, count),
+            lengths = new Float32Array(buffer, 8 + 12 * count, count),
+            trailer = 8 + 16 * count,
+            graph = {'version': header[1], 'edges': {}, 'nodes': {}};
+
+        if (buffer.byteLength > trailer) {
+            var ntiles = new Uint32Array(buffer, trailer, 1)[0],
+                tiles = new Int32Array(buffer, trailer + 4, 3 * ntiles);
+            graph.neighbours = [];
+            for (var t = 0; t < ntiles; t++) {
+                graph.neighbours.push([tiles[3 * t], tiles[3 * t + 1], tiles[3 * t + 2]]);
+            }
+        }
+
+        for (var i = 0; i < count; i++) {
+            var id = ids[i], source = sources[i], target = targets[i];
+            graph.edges[id] = {'id': id, 'length': lengths[i], 'nodes_id': [source, target]};
+            (graph.nodes[source] = graph.nodes[source] || {})[target] = id;
+            (graph.nodes[target] = graph.nodes[target] || {})[source] = id;
+        }
+        return graph;
+    }
+
     return {
-        'get_shortest_path_from_graph': get_shortest_path_from_graph
+        'get_shortest_path_from_graph': get_shortest_path_from_graph,
+        'decode_graph': decode_graph
     };
 })();
 
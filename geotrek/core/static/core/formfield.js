@@ -149,6 +149,123 @@ FormField.makeModule = function(module, module_settings) {
         return objectsLayer;
     };
 
+    module.getBinaryGraph = function(url) {
+        var deferred = $.Deferred(),
+            xhr = new XMLHttpRequest();
+        xhr.open('GET', url);
+        xhr.responseType = 'arraybuffer';
+        xhr.setRequestHeader('Accept', 'application/octet-stream');
+        xhr.onload = function () {
+            if (xhr.status == 200) deferred.resolve(Geotrek.Dijkstra.decode_graph(xhr.response));
+            else deferred.reject(xhr, xhr.statusText, null);
+        };
+        xhr.onerror = function () {
+            deferred.reject(xhr, 'error', null);
+        };
+        xhr.send();
+        return deferred.promise();
+    };
+
+    module.loadGraph = function(url, callback) {
+        /*
+         * Reuse graph stored locally if any, and fetch only
+         * changes since its version. Otherwise, fetch the
+         * whole graph in its binary encoding.
+         */
+        var storageKey = 'path_graph',
+            graph = null;
+        try {
+            graph = JSON.parse(window.localStorage.getItem(storageKey));
+        }
+        catch (e) {}
+
+        function loaded(graph) {
+            try {
+                window.localStorage.setItem(storageKey, JSON.stringify(graph));
+            }
+            catch (e) {}
+            callback(graph);
+        }
+
+        if (!graph || !graph.version) {
+            return module.getBinaryGraph(url).done(loaded);
+        }
+
+        url += (url.indexOf('?') < 0 ? '?' : '&') + 'since=' + graph.version;
+        return $.getJSON(url, function (data) {
+            if (data.since !== undefined) {
+                // Apply delta, removed items are null
+                $.each(['edges', 'nodes'], function (i, kind) {
+                    $.each(data[kind], function (key, value) {
+                        if (value === null) delete graph[kind][key];
+                        else graph[kind][key] = value;
+                    });
+                });
+                graph.version = data.version;
+            }
+            else {
+                graph = data;
+            }
+            loaded(graph);
+        });
+    };
+
+    module.loadGraphTiles = function(map, url, zoom, callback) {
+        /*
+         * Load graph of tiles covering map view, and complete it
+         * in place when map is moved.
+         */
+        var graph = {'edges': {}, 'nodes': {}},
+            loaded = {},
+            sep = url.indexOf('?') < 0 ? '?' : '&',
+            n = Math.pow(2, zoom);
+
+        function tileX(lng) {
+            return Math.floor((lng + 180) / 360 * n);
+        }
+        function tileY(lat) {
+            var r = lat * Math.PI / 180;
+            return Math.floor((1 - Math.log(Math.tan(r) + 1 / Math.cos(r)) / Math.PI) / 2 * n);
+        }
+        function tilesOf(bounds) {
+            var sw = bounds.getSouthWest(),
+                ne = bounds.getNorthEast(),
+                tiles = [];
+            for (var x = tileX(sw.lng); x <= tileX(ne.lng); x++) {
+                for (var y = tileY(ne.lat); y <= tileY(sw.lat); y++) {
+                    tiles.push([zoom, x, y].join('/'));
+                }
+            }
+            return tiles;
+        }
+        function merge(data) {
+            // Nodes on tiles borders are shared
+            $.extend(graph.edges, data.edges);
+            $.each(data.nodes, function (id, adjacency) {
+                graph.nodes[id] = $.extend(graph.nodes[id] || {}, adjacency);
+            });
+        }
+        function load(tiles) {
+            var requests = $.map(tiles, function (tile) {
+                if (loaded[tile]) return null;
+                loaded[tile] = true;
+                return $.getJSON(url + sep + 'tile=' + tile, merge);
+            });
+            return $.when.apply($, requests);
+        }
+
+        var bounds = map.getBounds(),
+            objectBounds = module_settings.init.objectBounds;
+        if (objectBounds) bounds.extend(L.latLngBounds(objectBounds));
+
+        map.on('moveend', function () {
+            load(tilesOf(map.getBounds()));
+        });
+        return load(tilesOf(bounds)).done(function () {
+            callback(graph);
+        });
+    };
+
     module.enableMultipath = function(map, snapObserver, layerStore, onStartOver) {
         var objectsLayer = snapObserver.guidesLayer();
 
@@ -193,7 +310,12 @@ FormField.makeModule = function(module, module_settings) {
             // Objects layer is ready, load graph !
             objectsLayer.fire('data:loading');
 
-            $.getJSON(module_settings.enableMultipath.path_json_graph_url, function (graph) {
+            var url = module_settings.enableMultipath.path_json_graph_url,
+                zoom = module_settings.enableMultipath.tile_zoom,
+                loading = zoom !== null ? module.loadGraphTiles(map, url, zoom, onGraphLoaded)
+                                        : module.loadGraph(url, onGraphLoaded);
+
+            function onGraphLoaded(graph) {
                 // Load graph
                 multipath_control.setGraph(graph);
 
@@ -211,8 +333,9 @@ FormField.makeModule = function(module, module_settings) {
 
                 // Stop spinning !
                 objectsLayer.fire('data:loaded');
-            })
-            .error(function (jqXHR, textStatus, errorThrown) {
+            }
+
+            loading.fail(function (jqXHR, textStatus, errorThrown) {
                 objectsLayer.fire('data:loaded');
                 $(map._container).addClass('map-error');
                 console.error("Could not load url '" + module_settings.enableMultipath.path_json_graph_url + "': " + textStatus);
@@ -725,9 +725,10 @@ L.Handler.MultiPath = L.Handler.extend({
 
 
 Geotrek.getNextId = (function() {
-    var next_id = 100000;
+    // Negative, to never collide with paths and nodes ids of database
+    var next_id = -1;
     return function() {
-        return next_id++;
+        return next_id--;
     };
 })();
 
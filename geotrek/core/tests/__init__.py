@@ -11,3 +11,4 @@ from .filters import *
 from .graph import *
 from .fields import *
 from .test_attachment import *
+from .test_loadpaths import *
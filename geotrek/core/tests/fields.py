@@ -2,6 +2,7 @@ from django.test import TestCase
 from django.core.exceptions import ValidationError
 from django.contrib.gis.geos import LineString
 from django.conf import settings
+from django.db import connection
 
 from geotrek.core.fields import SnappedLineStringField
 from geotrek.core.factories import PathFactory
@@ -22,3 +23,18 @@ class FieldsTest(TestCase):
         path = PathFactory.create()
         value = '{"geom": "LINESTRING(-0.77054223313507 -5.32573853776343,-0.168053647782867 -4.66595028627023)", "snap": [null, %s]}' % path.pk
         self.assertTrue(f.clean(value).equals_exact(LineString((100000, 100000), (2, 2), srid=settings.SRID), 0.1))
+
+        # Unknown path
+        value = '{"geom": "LINESTRING(-0.77054223313507 -5.32573853776343,-0.168053647782867 -4.66595028627023)", "snap": [null, 999999]}'
+        self.assertRaises(ValidationError, f.clean, value)
+
+    def test_snappedlinestring_number_queries(self):
+        f = SnappedLineStringField()
+        path = PathFactory.create()
+        value = '{"geom": "LINESTRING(-0.77054223313507 -5.32573853776343,-0.168053647782867 -4.66595028627023,0 0)", "snap": [%s, %s, %s]}' % ((path.pk,) * 3)
+        settings.DEBUG = True
+        before = len(connection.queries)
+        line = f.clean(value)
+        self.assertEqual(len(connection.queries) - before, 1)
+        settings.DEBUG = False
+        self.assertTrue(line.equals_exact(LineString((2, 2), (2, 2), (1, 1), srid=settings.SRID), 0.1))
@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-from geotrek.land.tests.filters import LandFiltersTest
+from geotrek.land.tests.filters import LandFiltersTest, EdgeFiltersQueriesTest
 
 from geotrek.core.filters import PathFilter
 
@@ -7,3 +7,8 @@ from geotrek.core.filters import PathFilter
 class PathFilterLandTest(LandFiltersTest):
 
     filterclass = PathFilter
+
+
+class PathFilterQueriesTest(EdgeFiltersQueriesTest):
+
+    filterclass = PathFilter
@@ -1,9 +1,17 @@
+import json
+import struct
+
+from django.conf import settings
+from django.db import connection
 from django.test import TestCase
-from django.contrib.gis.geos import LineString
+from django.core.urlresolvers import reverse
+from django.contrib.gis.geos import LineString, Polygon
 
 from geotrek.core.factories import PathFactory
-from geotrek.core.graph import graph_of_qs
-from geotrek.core.models import Path
+from geotrek.common.utils.postgresql import stream_queryset
+from geotrek.core.graph import graph_of_qs, graph_edges_nodes_of_rows, RoutingGraph
+from geotrek.core.models import Path, Topology
+from geotrek.core.helpers import GraphHelper
 
 
 class SimpleGraph(TestCase):
@@ -48,3 +56,265 @@ class SimpleGraph(TestCase):
 
         computed_graph = graph_of_qs(Path.objects.all())
         self.assertDictEqual(computed_graph, graph)
+
+    def test_graph_from_node_ids(self):
+        ab = PathFactory(geom=LineString((0, 0, 0), (10, 0, 0)))
+        bc = PathFactory(geom=LineString((10, 0, 0), (10, 10, 0)))
+        a, b, c = ab.source_node, ab.target_node, bc.target_node
+        rows = stream_queryset(Path.objects.order_by('pk').values_list('pk', 'length', 'source_node', 'target_node'))
+        computed_graph = graph_edges_nodes_of_rows(rows)
+        self.assertDictEqual(computed_graph['nodes'], {
+            a: {b: ab.pk},
+            b: {a: ab.pk, c: bc.pk},
+            c: {b: bc.pk},
+        })
+        self.assertEqual(computed_graph['edges'][bc.pk],
+                         {'id': bc.pk, 'length': 10.0, 'nodes_id': [b, c]})
+
+
+class RoutingGraphTest(TestCase):
+
+    def setUp(self):
+        self.graph = RoutingGraph.from_edges([
+            (1, 10.0, (0., 0., 0.), (10., 0., 0.)),
+            (2, 10.0, (10., 0., 0.), (20., 0., 0.)),
+            # Detour
+            (3, 30.0, (0., 0., 0.), (20., 0., 0.)),
+            # Drawn backwards
+            (4, 10.0, (30., 0., 0.), (20., 0., 0.)),
+            # Non connex
+            (5, 10.0, (100., 100., 0.), (110., 100., 0.)),
+        ])
+
+    def test_compact_structure(self):
+        self.assertEqual(len(self.graph), 5)
+        self.assertEqual(len(self.graph.node_x), 6)
+        # Node (20, 0) is shared by 3 edges
+        node = self.graph.edge_target[self.graph.edges_index[2]]
+        self.assertEqual(self.graph.offsets[node + 1] - self.graph.offsets[node], 3)
+
+    def test_route_along_edges(self):
+        serialized, length = self.graph.route((1, 0.5), (2, 0.5))
+        self.assertEqual(serialized['paths'], [1, 2])
+        self.assertEqual(serialized['positions'], {'0': (0.5, 1.0), '1': (0.0, 0.5)})
+        self.assertAlmostEqual(length, 10.0)
+
+    def test_route_backwards(self):
+        serialized, length = self.graph.route((2, 0.5), (1, 0.5))
+        self.assertEqual(serialized['paths'], [2, 1])
+        self.assertEqual(serialized['positions'], {'0': (0.5, 0.0), '1': (1.0, 0.5)})
+
+    def test_route_through_reversed_edge(self):
+        serialized, length = self.graph.route((1, 0.5), (4, 0.0))
+        self.assertEqual(serialized['paths'], [1, 2, 4])
+        self.assertEqual(serialized['positions'], {'0': (0.5, 1.0), '2': (1.0, 0.0)})
+        self.assertAlmostEqual(length, 25.0)
+
+    def test_route_on_same_edge(self):
+        serialized, length = self.graph.route((3, 0.2), (3, 0.8))
+        self.assertEqual(serialized['paths'], [3])
+        self.assertEqual(serialized['positions'], {'0': (0.2, 0.8)})
+        self.assertAlmostEqual(length, 18.0)
+
+    def test_route_shorter_around_same_edge(self):
+        serialized, length = self.graph.route((3, 0.05), (3, 0.95))
+        self.assertEqual(serialized['paths'], [3, 1, 2, 3])
+        self.assertEqual(serialized['positions'], {'0': (0.05, 0.0), '3': (1.0, 0.95)})
+        self.assertAlmostEqual(length, 23.0)
+
+    def test_no_route(self):
+        self.assertEqual(self.graph.route((1, 0.5), (5, 0.5)), None)
+
+
+class RoutingViewTest(TestCase):
+
+    def test_route_can_be_deserialized(self):
+        p1 = PathFactory.create(geom=LineString((0, 0, 0), (10, 0, 0)))
+        p2 = PathFactory.create(geom=LineString((10, 0, 0), (10, 10, 0)))
+        response = self.client.get(reverse('core:path_json_route'),
+                                   {'from_path': p1.pk, 'from_position': 0.5,
+                                    'to_path': p2.pk, 'to_position': 0.5})
+        self.assertEqual(response.status_code, 200)
+        serialized = json.loads(response.content)
+        self.assertEqual(serialized['paths'], [p1.pk, p2.pk])
+        self.assertAlmostEqual(serialized['length'], 10.0)
+
+        topology = Topology.deserialize(serialized)
+        self.assertAlmostEqual(topology.length, 10.0)
+
+    def test_route_bad_parameters(self):
+        response = self.client.get(reverse('core:path_json_route'),
+                                   {'from_path': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+
+class GraphDeltaTest(TestCase):
+    def setUp(self):
+        self.path = PathFactory.create(geom=LineString((0, 0, 0), (10, 0, 0)))
+        self.state = GraphHelper.build_state()
+        self.version = self.state['version']
+
+    def changes(self):
+        return GraphHelper._log_entries(self.version)
+
+    def test_full_graph_has_version(self):
+        graph = GraphHelper.graph(self.state)
+        self.assertEqual(graph['version'], self.version)
+        self.assertEqual(graph['edges'].keys(), [self.path.pk])
+
+    def test_delta_of_created_path(self):
+        p = PathFactory.create(geom=LineString((10, 0, 0), (10, 10, 0)))
+        GraphHelper.apply_changes(self.state, self.changes())
+        delta = GraphHelper.delta(self.state, self.version)
+        self.assertTrue(delta['version'] > self.version)
+        self.assertEqual(delta['edges'].keys(), [p.pk])
+        self.assertEqual(len(delta['nodes']), 2)
+        self.assertEqual(self.state['graph']['edges'][p.pk]['nodes_id'][0],
+                         self.state['graph']['edges'][self.path.pk]['nodes_id'][1])
+
+    def test_delta_of_deleted_path(self):
+        self.path.delete()
+        GraphHelper.apply_changes(self.state, self.changes())
+        delta = GraphHelper.delta(self.state, self.version)
+        self.assertEqual(delta['edges'], {self.path.pk: None})
+        self.assertEqual(delta['nodes'].values(), [None, None])
+        self.assertEqual(self.state['graph']['nodes'], {})
+
+    def test_log_is_purged_on_changes(self):
+        cursor = connection.cursor()
+        cursor.execute("INSERT INTO l_t_troncon_graph_log (troncon) "
+                       "SELECT %s FROM generate_series(1, %s)", [self.path.pk, GraphHelper.history_size])
+        self.path.geom = LineString((0, 0, 0), (10, 10, 0))
+        self.path.save()
+        versions = [v for v, pk in GraphHelper._log_entries(0)]
+        self.assertEqual(len(versions), GraphHelper.history_size)
+
+    def test_log_version_survives_purge(self):
+        version = GraphHelper.log_version()
+        cursor = connection.cursor()
+        cursor.execute("INSERT INTO l_t_troncon_graph_log (troncon) "
+                       "SELECT %s FROM generate_series(1, %s)", [self.path.pk, 2 * GraphHelper.history_size])
+        self.path.geom = LineString((0, 0, 0), (10, 10, 0))
+        self.path.save()
+        self.assertTrue(GraphHelper.log_version() > version)
+        self.assertEqual(GraphHelper.log_version(), max(v for v, pk in GraphHelper._log_entries(0)))
+
+    def test_no_delta_for_unknown_version(self):
+        self.assertEqual(GraphHelper.delta(self.state, self.version - 1), None)
+        self.assertEqual(GraphHelper.delta(self.state, self.version + 1), None)
+
+    def test_view_bad_since_parameter(self):
+        response = self.client.get(reverse('core:path_json_graph') + '?since=abc')
+        self.assertEqual(response.status_code, 400)
+
+
+class PartialGraphTest(TestCase):
+    def setUp(self):
+        self.inside = PathFactory.create(geom=LineString((0, 0, 0), (100, 0, 0)))
+        self.outside = PathFactory.create(geom=LineString((10000, 0, 0), (10100, 0, 0)))
+        self.url = reverse('core:path_json_graph')
+
+    def test_tile_bounds(self):
+        self.assertEqual(GraphHelper.tile_bounds(0, 0, 0)[0], -180.0)
+        west, south, east, north = GraphHelper.tile_bounds(1, 1, 0)
+        self.assertEqual((west, south, east), (0.0, 0.0, 180.0))
+        self.assertAlmostEqual(north, 85.0511, places=4)
+        self.assertRaises(ValueError, GraphHelper.tile_bounds, 1, 2, 0)
+        self.assertRaises(ValueError, GraphHelper.tile_bounds, -1, 0, 0)
+        self.assertRaises(ValueError, GraphHelper.tile_bounds, 5000, 0, 0)
+
+    def test_tile_neighbours(self):
+        self.assertEqual(len(GraphHelper.tile_neighbours(10, 5, 5)), 8)
+        self.assertEqual(len(GraphHelper.tile_neighbours(10, 5, 0)), 5)
+        self.assertTrue([10, 1023, 5] in GraphHelper.tile_neighbours(10, 0, 5))
+
+    def test_subgraph(self):
+        bbox = Polygon.from_bbox((-10, -10, 200, 10))
+        bbox.srid = settings.SRID
+        graph = GraphHelper.subgraph(bbox)
+        self.assertEqual(graph['edges'].keys(), [self.inside.pk])
+        self.assertEqual(sorted(graph['nodes'].keys()),
+                         sorted([self.inside.source_node, self.inside.target_node]))
+
+    def test_bbox_view(self):
+        bbox = Polygon.from_bbox((-10, -10, 200, 10))
+        bbox.srid = settings.SRID
+        bbox.transform(settings.API_SRID)
+        response = self.client.get(self.url + '?bbox=' + ','.join(['%s' % v for v in bbox.extent]))
+        graph = json.loads(response.content)
+        self.assertEqual(graph['edges'].keys(), [str(self.inside.pk)])
+
+    def test_tile_view(self):
+        response = self.client.get(self.url + '?tile=0/0/0')
+        graph = json.loads(response.content)
+        self.assertEqual(len(graph['edges']), 2)
+        self.assertEqual(graph['tile'], [0, 0, 0])
+        self.assertEqual(graph['neighbours'], [])
+
+    def test_bad_tile(self):
+        response = self.client.get(self.url + '?tile=1/4/0')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(self.url + '?tile=5000/0/0')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(self.url + '?bbox=1,2,3')
+        self.assertEqual(response.status_code, 400)
+
+
+class BinaryGraphTest(TestCase):
+    def setUp(self):
+        self.p1 = PathFactory.create(geom=LineString((0, 0, 0), (100, 0, 0)))
+        self.p2 = PathFactory.create(geom=LineString((100, 0, 0), (100, 50, 0)))
+        self.url = reverse('core:path_json_graph')
+
+    def decode(self, content):
+        count, version = struct.unpack('<II', content[:8])
+        columns = [struct.unpack('<%s%s' % (count, t), content[8 + 4 * count * i:8 + 4 * count * (i + 1)])
+                   for i, t in enumerate('iiif')]
+        return version, zip(*columns)
+
+    def test_encode(self):
+        bbox = Polygon.from_bbox((-1, -1, 101, 1))
+        bbox.srid = settings.SRID
+        version, edges = self.decode(GraphHelper.encode(GraphHelper.subgraph(bbox)))
+        self.assertEqual(version, 0)
+        self.assertEqual(len(edges), 2)
+        self.assertEqual(edges[0][:3], (self.p1.pk, self.p1.source_node, self.p1.target_node))
+        self.assertAlmostEqual(edges[0][3], self.p1.length, places=3)
+        self.assertEqual(edges[1][1], self.p1.target_node)
+
+    def test_binary_is_negotiated(self):
+        response = self.client.get(self.url, HTTP_ACCEPT='application/octet-stream')
+        self.assertEqual(response['Content-Type'], 'application/octet-stream')
+        self.assertTrue('ETag' in response)
+        version, edges = self.decode(response.content)
+        self.assertTrue(version > 0)
+        self.assertEqual(len(edges), 2)
+        self.assertEqual(len(response.content), 8 + 2 * 16 + 4)
+
+    def test_binary_tile_has_neighbours(self):
+        response = self.client.get(self.url + '?format=binary&tile=1/0/0')
+        edges, = struct.unpack('<I', response.content[:4])
+        trailer = response.content[8 + edges * 16:]
+        count, = struct.unpack('<I', trailer[:4])
+        neighbours = struct.unpack('<%si' % (3 * count), trailer[4:])
+        self.assertEqual(count, 3)
+        self.assertEqual([list(neighbours[i:i + 3]) for i in range(0, 9, 3)],
+                         GraphHelper.tile_neighbours(1, 0, 0))
+
+    def test_etag_ignores_cache_buster(self):
+        response = self.client.get(self.url + '?format=binary&tile=1/0/0&_u=1')
+        busted = self.client.get(self.url + '?format=binary&tile=1/0/0&_u=2')
+        self.assertEqual(response['ETag'], busted['ETag'])
+        other = self.client.get(self.url + '?format=binary&tile=1/1/0')
+        self.assertNotEqual(response['ETag'], other['ETag'])
+        PathFactory.create(geom=LineString((0, 0, 0), (0, 50, 0)))
+        changed = self.client.get(self.url + '?format=binary&tile=1/0/0&_u=1')
+        self.assertNotEqual(response['ETag'], changed['ETag'])
+
+    def test_etag_depends_on_encoding(self):
+        binary = self.client.get(self.url + '?format=binary')
+        response = self.client.get(self.url)
+        self.assertNotEqual(response['Content-Type'], 'application/octet-stream')
+        self.assertNotEqual(binary['ETag'], response['ETag'])
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
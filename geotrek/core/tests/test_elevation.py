@@ -1,12 +1,40 @@
+import os
+import json
+import tempfile
+
 from django.conf import settings
 from django.test import TestCase
-from django.db import connections, DEFAULT_DB_ALIAS
+from django.utils import unittest
+from django.db import connection, connections, DEFAULT_DB_ALIAS
+from django.core.cache import get_cache
 from django.contrib.gis.geos import LineString
 
 from geotrek.core.models import Path
 from geotrek.core.factories import TopologyFactory
+from geotrek.core.helpers import AltimetryHelper
+from geotrek.core import dem
     
 
+class FakeDataset(object):
+    """
+    Minimal GDAL dataset, with one band of ``values``.
+    """
+    def __init__(self, values):
+        self.values = values
+
+    def GetGeoTransform(self):
+        return [0, 1, 0, 3, 0, -1]
+
+    def GetRasterBand(self, index):
+        return self
+
+    def GetNoDataValue(self):
+        return None
+
+    def ReadAsArray(self):
+        return self.values
+
+
 class ElevationTest(TestCase):
 
     def setUp(self):
@@ -42,6 +70,57 @@ class ElevationTest(TestCase):
         self.assertTrue(2.4 < profile[-1][0] < 2.5)  # p.geom.length
         self.assertEqual(profile[-1][3], 3)
 
+    def test_elevation_profile_cached(self):
+        p = Path.objects.create(geom=LineString((1.5,1.5,0), (2.5,1.5,0), (1.5,2.5,0)))
+        locmem = {'default': settings.CACHES['default'],
+                  'fat': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                          'LOCATION': 'test_elevation_profile'}}
+        with self.settings(CACHES=locmem):
+            get_cache('fat').clear()
+            profile = p.get_elevation_profile()
+            settings.DEBUG = True
+            try:
+                before = len(connection.queries)
+                self.assertEqual(p.get_elevation_profile(), profile)
+                self.assertEqual(len(connection.queries), before)
+                # DEM replaced
+                AltimetryHelper.stamp_dem()
+                before = len(connection.queries)
+                self.assertEqual(p.get_elevation_profile(), profile)
+                self.assertTrue(len(connection.queries) > before)
+                # Geometry changed
+                p.geom = LineString((1.5,1.5,0), (2.5,2.5,0), srid=settings.SRID)
+                self.assertEqual(len(p.get_elevation_profile()), 3)
+            finally:
+                settings.DEBUG = False
+
+    def test_profile_svg(self):
+        from pygal.style import LightSolarizedStyle
+        background = LightSolarizedStyle.background
+        p = Path.objects.create(geom=LineString((1.5,1.5,0), (2.5,1.5,0), (1.5,2.5,0)))
+        svg = p.get_elevation_profile_svg()
+        self.assertTrue('<svg' in svg)
+        # Shared pygal style is left untouched
+        self.assertEqual(LightSolarizedStyle.background, background)
+        self.assertEqual(AltimetryHelper.profile_svg(p.get_elevation_profile()), svg)
+
+    def test_simplify_profile(self):
+        profile = [(d, 0, 0, h) for d, h in [(0, 0), (10, 1), (20, 0), (30, 50), (40, 0), (50, 1), (60, 0)]]
+        self.assertEqual(AltimetryHelper.simplify_profile(profile, count=3),
+                         [profile[0], profile[3], profile[-1]])
+        self.assertEqual(AltimetryHelper.simplify_profile(profile, tolerance=5),
+                         [profile[0], profile[2], profile[3], profile[4], profile[-1]])
+        self.assertEqual(AltimetryHelper.simplify_profile(profile, count=100), profile)
+        self.assertEqual(AltimetryHelper.simplify_profile(profile[:2], count=1), profile[:2])
+
+    def test_drape_points(self):
+        cur = connections[DEFAULT_DB_ALIAS].cursor()
+        cur.execute("""SELECT idx, ST_Z(geom) FROM ft_drape_points(ARRAY[
+                           ST_SetSRID(ST_MakePoint(0.5, 2.5), %(srid)s),
+                           ST_SetSRID(ST_MakePoint(2.5, 0.5), %(srid)s),
+                           ST_SetSRID(ST_MakePoint(1.5, 1.5), %(srid)s)])""" % {'srid': settings.SRID})
+        self.assertEqual(cur.fetchall(), [(1, 2), (2, 6), (3, 4)])
+
     def test_elevation_topology_line(self):
         p = Path(geom=LineString((1.5,1.5,0), (2.5,1.5,0), (1.5,2.5,0)))
         p.save()
@@ -66,4 +145,54 @@ class ElevationTest(TestCase):
         self.assertEqual(topo.ascent, 0)
         self.assertEqual(topo.descent, 0)
         self.assertEqual(topo.min_elevation, 5)
-        self.assertEqual(topo.max_elevation, 5)
\ No newline at end of file
+        self.assertEqual(topo.max_elevation, 5)
+
+    def _sampler(self):
+        # Same fake DEM as in database
+        values = dem.numpy.array([[x + y for x in range(1, 4)] for y in range(1, 4)], dtype='int16')
+        fd, path = tempfile.mkstemp(suffix='.npy')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        self.addCleanup(os.remove, path + '.json')
+        with open(path, 'wb') as f:
+            dem.numpy.save(f, values)
+        with open(path + '.json', 'w') as f:
+            json.dump({'geotransform': [0, 1, 0, 3, 0, -1], 'nodata': None}, f)
+        return dem.DEMSampler(path)
+
+    @unittest.skipIf(dem.numpy is None, "NumPy is not available")
+    def test_stored_dem_is_used_once_published(self):
+        sampler = self._sampler()
+        ds = FakeDataset(dem.numpy.zeros((3, 3), dtype='int16'))
+        dem.DEMSampler.store(ds, sampler.path)
+        self.assertEqual(list(dem.DEMSampler(sampler.path).sample([0.5], [2.5])), [2])
+        dem.DEMSampler.discard(sampler.path)
+        self.assertFalse(os.path.exists(sampler.path + '.tmp'))
+        dem.DEMSampler.store(ds, sampler.path)
+        dem.DEMSampler.publish(sampler.path)
+        self.assertEqual(list(dem.DEMSampler(sampler.path).sample([0.5], [2.5])), [0])
+
+    @unittest.skipIf(dem.numpy is None, "NumPy is not available")
+    def test_sampler_values(self):
+        sampler = self._sampler()
+        self.assertEqual(list(sampler.sample([0.5, 2.5, 1.5], [2.5, 0.5, 1.5])), [2, 6, 4])
+        self.assertTrue(dem.numpy.isnan(sampler.sample([4], [1])[0]))
+        self.assertEqual(list(sampler.sample([1.0, 1.5, 0.25], [2.0, 1.5, 2.75], method='bilinear')), [3, 4, 2])
+
+    @unittest.skipIf(dem.numpy is None, "NumPy is not available")
+    def test_sampler_same_as_database(self):
+        sampler = self._sampler()
+        line = LineString((0.5, 0.5, 0), (2.5, 1.5, 0), (1.5, 2.5, 0), srid=settings.SRID)
+        for precision in (1, 25):
+            with self.settings(DEM_ARRAY_PATH=None):
+                expected = AltimetryHelper.elevation_profile(line, precision)
+            profile = sampler.elevation_profile(line, precision)
+            self.assertEqual(len(profile), len(expected))
+            for sample, value in zip(profile, expected):
+                for a, b in zip(sample, value):
+                    self.assertAlmostEqual(a, b)
+
+        p = Path.objects.create(geom=line)
+        infos = sampler.elevation_infos(line)
+        for field in Path.COLUMNS:
+            self.assertAlmostEqual(infos[field], getattr(p, field))
@@ -0,0 +1,72 @@
+import os
+import json
+import tempfile
+from StringIO import StringIO
+
+from django.conf import settings
+from django.test import TestCase
+from django.utils import unittest
+from django.core.management import call_command
+from django.contrib.gis.geos import LineString
+
+from geotrek.core.factories import PathFactory
+from geotrek.core.models import Path
+
+try:
+    from osgeo import ogr
+except ImportError:
+    ogr = None
+
+
+@unittest.skipIf(ogr is None, "GDAL Python bindings are not installed")
+class LoadPathsCommandTest(TestCase):
+
+    def setUp(self):
+        """
+                    F
+                    |
+           E +------+------+ G
+                    |
+             C      |
+           A +------+------+ B   CF starts 0.5 m away from AB.
+        """
+        self.ab = PathFactory.create(name="AB", geom=LineString((0, 0, 0), (10, 0, 0)))
+        features = [('CF', [(5, 0.5), (5, 10)]),
+                    ('EG', [(0, 5), (10, 5)])]
+        collection = {
+            'type': 'FeatureCollection',
+            'features': [{'type': 'Feature',
+                          'properties': {'NAME': name},
+                          'geometry': {'type': 'LineString', 'coordinates': coords}}
+                         for name, coords in features]
+        }
+        fd, self.filename = tempfile.mkstemp(suffix='.geojson')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(collection, f)
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def load(self, **options):
+        call_command('loadpaths', self.filename, name_field='NAME', srid=settings.SRID,
+                     stdout=StringIO(), **options)
+
+    def test_paths_are_snapped_and_split(self):
+        self.load()
+        # AB, CF and EG are split in two
+        self.assertEqual(Path.objects.count(), 6)
+        self.assertEqual(Path.objects.filter(name='AB').count(), 2)
+        self.assertEqual(Path.objects.filter(name='EG').count(), 2)
+        cf = Path.objects.filter(name='CF').order_by('id')
+        self.assertEqual(len(cf), 2)
+        self.assertEqual(cf[0].geom.coords[0][:2], (5, 0))
+        self.assertEqual(cf[0].length, 5)
+        # Nodes are shared
+        self.assertEqual(Path.objects.filter(pk__in=cf).filter(source_node__isnull=True).count(), 0)
+
+    def test_dry_run(self):
+        self.load(dry_run=True)
+        self.assertEqual(Path.objects.count(), 1)
+        # Temporary tables were dropped too
+        self.load()
+        self.assertEqual(Path.objects.count(), 6)
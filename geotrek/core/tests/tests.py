@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 import math
 
+from django.conf import settings
 from django.test import TestCase
 from django.contrib.gis.geos import LineString
 from django.db import connections, DEFAULT_DB_ALIAS, IntegrityError
@@ -13,6 +14,7 @@ from geotrek.authent.factories import UserFactory, PathManagerFactory, Structure
 from geotrek.authent.models import Structure, default_structure
 from geotrek.core.factories import (PathFactory, StakeFactory, TrailFactory, ComfortFactory)
 from geotrek.core.models import Path
+from geotrek.core.helpers import PathHelper
 
 
 class ViewsTest(CommonTest):
@@ -232,6 +234,15 @@ class PathTest(TestCase):
         # Almost touching twice is also ok
         #PathFactory.create(geom=LineString((0.5,1,0),(1,1,0),(1.5,1,0)))
 
+    def test_overlapping_many(self):
+        ab = PathFactory.create(geom=LineString((0,0,0),(60,0,0)))
+        lines = [(None, LineString((40,0),(50,0), srid=settings.SRID)),
+                 (None, LineString((6,1),(6,-3), srid=settings.SRID)),
+                 (ab.pk, ab.geom)]
+        self.assertEqual(PathHelper.overlapping_many(lines), [set([ab.pk]), set(), set()])
+        self.assertFalse(PathHelper.disjoint(LineString((40,0),(50,0), srid=settings.SRID), -1))
+        self.assertTrue(PathHelper.disjoint(ab.geom, ab.pk))
+
     def test_snapping(self):
         # Sinosoid line
         coords = [(x, math.sin(x), 0) for x in range(10)]
@@ -267,6 +278,13 @@ class PathTest(TestCase):
         path_snapped = PathFactory.create(geom=LineString((8, 0, 0), (-50, -50, 0)))
         self.assertEqual(path_snapped.geom.coords, ((8, 0, 0), (-50, -50, 0)))
 
+    def test_snapping_long_line(self):
+        PathFactory.create(geom=LineString((0, 0, 0), (0, 10, 0)))
+        PathFactory.create(geom=LineString((1000, 0, 0), (1000, 5, 0), (1000, 10, 0)))
+        # Only extremities are snapped, to closest vertex when close enough
+        path_snapped = PathFactory.create(geom=LineString((0.5, 5.2, 0), (500, 0.5, 0), (999.5, 5.5, 0)))
+        self.assertEqual(path_snapped.geom.coords, ((0, 5.2, 0), (500, 0.5, 0), (1000, 5, 0)))
+
 
 class TrailTest(TestCase):
 
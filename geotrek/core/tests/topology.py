@@ -1,5 +1,6 @@
 from django.test import TestCase
 from django.conf import settings
+from django.db import connection
 import json
 from django.contrib.gis.geos import Point, LineString
 
@@ -7,6 +8,7 @@ from geotrek.common.utils import dbnow, almostequal
 from geotrek.core.factories import (PathFactory, PathAggregationFactory,
                                     TopologyFactory)
 from geotrek.core.models import Path, Topology, PathAggregation
+from geotrek.core.helpers import PathHelper, TopologyHelper
 
 
 class TopologyTest(TestCase):
@@ -51,6 +53,28 @@ class TopologyTest(TestCase):
         self.assertEqual(e.kind, LandEdge.KIND)
         self.assertEqual(1, len(Topology.objects.filter(kind='LANDEDGE')))
 
+    def test_overlapping(self):
+        p1 = PathFactory.create(geom=LineString((0, 0, 0), (10, 0, 0)))
+        p2 = PathFactory.create(geom=LineString((10, 0, 0), (10, 10, 0)))
+        t1 = TopologyFactory.create(no_path=True)
+        t1.add_path(p1, start=0.0, end=0.5)
+        t2 = TopologyFactory.create(no_path=True)
+        t2.add_path(p1, start=0.8, end=0.5)  # Reversed, touches t1
+        t3 = TopologyFactory.create(no_path=True)
+        t3.add_path(p1, start=0.6, end=0.7)
+        t4 = TopologyFactory.create(no_path=True)
+        t4.add_path(p2)
+
+        self.assertItemsEqual(Topology.overlapping(t1), [t1, t2])
+        self.assertItemsEqual(Topology.overlapping(t3), [t2, t3])
+        # Querysets are used as subqueries
+        settings.DEBUG = True
+        before = len(connection.queries)
+        overlapping = list(Topology.overlapping(Topology.objects.filter(pk__in=[t1.pk, t4.pk])))
+        self.assertEqual(len(connection.queries) - before, 1)
+        settings.DEBUG = False
+        self.assertItemsEqual(overlapping, [t1, t2, t4])
+
     def test_delete(self):
         topology = TopologyFactory.create(offset=1)
         path = topology.paths.get()
@@ -132,6 +156,38 @@ class TopologyTest(TestCase):
         self.assertTrue(almostequal(1, poitopo.geom.y))
         self.assertTrue(almostequal(0, poitopo.geom.z))
 
+    def test_interpolate_many(self):
+        p1 = PathFactory.create(geom=LineString((0, 0, 0), (4, 4, 0)))
+        p2 = PathFactory.create(geom=LineString((4, 4, 0), (8, 0, 0)))
+        points = [(p1.pk, Point(3, 1, srid=settings.SRID)),
+                  (p2.pk, Point(3, 1, srid=settings.SRID)),
+                  (p1.pk, Point(1, 3, srid=settings.SRID)),
+                  (p2.pk, Point(6, 2, srid=settings.SRID))]
+        results = PathHelper.interpolate_many(points)
+        self.assertEqual(len(results), 4)
+        self.assertTrue(almostequal(0.5, results[0][0]))
+        self.assertTrue(almostequal(-1.414, results[0][1]))
+        self.assertTrue(almostequal(0.25, results[1][0]))
+        self.assertTrue(almostequal(1.414, results[2][1]))
+        self.assertTrue(almostequal(0.5, results[3][0]))
+        self.assertEqual(results[3][1], 0.0)
+        self.assertRaises(Path.DoesNotExist, PathHelper.interpolate_many,
+                          [(p1.pk, points[0][1]), (999999, points[0][1])])
+
+    def test_closest_many(self):
+        p1 = PathFactory.create(geom=LineString((0, 0, 0), (10, 0, 0)))
+        p2 = PathFactory.create(geom=LineString((0, 1000, 0), (10, 1000, 0)))
+        points = [Point(5, 10, srid=settings.SRID),
+                  Point(5, 900, srid=settings.SRID),
+                  # Far beyond search radius
+                  Point(50000, -50000, srid=settings.SRID)]
+        self.assertEqual(Path.closest_many(points), [p1, p2, p1])
+        self.assertEqual(PathHelper.closest_many(points, radius=1), [p1.pk, p2.pk, p1.pk])
+        self.assertEqual(Path.closest(points[1]), p2)
+
+    def test_closest_without_path(self):
+        self.assertRaises(Path.DoesNotExist, Path.closest, Point(0, 0, srid=settings.SRID))
+
     def test_point_geom_not_moving(self):
         """
         Modify path, point not moving
@@ -616,6 +672,46 @@ class TopologySerialization(TestCase):
         self.assertEqual(topology.aggregations.all()[2].start_position, 0.0)
         self.assertEqual(topology.aggregations.all()[2].end_position, 0.7)
 
+    def test_deserialize_number_queries(self):
+        paths = [PathFactory.create(geom=LineString((i, 0, 0), (i + 1, 0, 0)))
+                 for i in range(10)]
+        pks = [p.pk for p in paths]
+
+        # Enable query counting
+        settings.DEBUG = True
+
+        def count_queries(serialized):
+            num_queries_old = len(connection.queries)
+            topology = Topology.deserialize(serialized)
+            num_queries_new = len(connection.queries)
+            return topology, num_queries_new - num_queries_old
+
+        short, nb_short = count_queries('{"paths": %s}' % pks[:2])
+        full, nb_full = count_queries('{"paths": %s}' % pks)
+
+        settings.DEBUG = False
+
+        self.assertEqual(nb_short, nb_full)
+        self.assertEqual(len(full.aggregations.all()), 10)
+        self.assertEqual(full.geom.coords[0], (0.0, 0.0, 0.0))
+        self.assertEqual(full.geom.coords[-1], (10.0, 0.0, 0.0))
+        self.assertAlmostEqual(full.length, 10.0)
+
+    def test_deferred_geometry_after_error(self):
+        def failing():
+            with TopologyHelper.deferred_geometry():
+                raise KeyError
+        self.assertRaises(KeyError, failing)
+        # Temporary table was dropped, it can be used again
+        path = PathFactory.create()
+        topology = Topology.deserialize('{"paths": [%s]}' % path.pk)
+        self.assertEqual(len(topology.aggregations.all()), 1)
+
+    def test_deserialize_unknown_path(self):
+        path = PathFactory.create()
+        self.assertRaises(ValueError, Topology.deserialize,
+                          '{"paths": [%s, %s]}' % (path.pk, path.pk + 1000))
+
     def test_deserialize_point(self):
         PathFactory.create()
         # Take a point
@@ -3,6 +3,9 @@ from django.contrib.gis.geos import LineString
 from django.db import connections, DEFAULT_DB_ALIAS
 from django.contrib.gis.geos import fromstr
 
+from geotrek.core.factories import PathFactory
+from geotrek.core.models import Path
+
 
 class TriggerTest(TestCase):
 
@@ -23,4 +26,37 @@ class TriggerTest(TestCase):
                             LineString((2,4),(2,0)),
                             LineString((2,0),(3,0)),
                          ]),
-                         LineString((0,0),(1,0),(2,0),(2,4),(2,0),(3,0)))
\ No newline at end of file
+                         LineString((0,0),(1,0),(2,0),(2,4),(2,0),(3,0)))
+
+class PathNodesTest(TestCase):
+
+    def nodes_count(self):
+        cursor = connections[DEFAULT_DB_ALIAS].cursor()
+        cursor.execute("SELECT COUNT(*) FROM l_t_noeud")
+        return cursor.fetchone()[0]
+
+    def test_paths_share_nodes(self):
+        p1 = PathFactory.create(geom=LineString((0, 0, 0), (10, 0, 0)))
+        p2 = PathFactory.create(geom=LineString((10, 0, 0), (10, 10, 0)))
+        self.assertNotEqual(p1.source_node, p1.target_node)
+        self.assertEqual(p1.target_node, p2.source_node)
+        self.assertEqual(self.nodes_count(), 3)
+
+    def test_split_paths_share_nodes(self):
+        p1 = PathFactory.create(geom=LineString((0, 0, 0), (10, 0, 0)))
+        p2 = PathFactory.create(geom=LineString((5, -5, 0), (5, 5, 0)))
+        p1.reload()
+        p2.reload()
+        others = Path.objects.exclude(pk__in=[p1.pk, p2.pk])
+        self.assertEqual(len(others), 2)
+        self.assertEqual(p1.target_node, p2.target_node)
+        self.assertEqual(self.nodes_count(), 5)
+
+    def test_unused_nodes_are_removed(self):
+        p1 = PathFactory.create(geom=LineString((0, 0, 0), (10, 0, 0)))
+        p2 = PathFactory.create(geom=LineString((10, 0, 0), (10, 10, 0)))
+        p2.geom = LineString((20, 0, 0), (20, 10, 0))
+        p2.save()
+        self.assertEqual(self.nodes_count(), 4)
+        p1.delete()
+        self.assertEqual(self.nodes_count(), 2)
@@ -6,11 +6,13 @@ from .models import Path, Trail
 from .views import (
     ElevationChart,
     get_graph_json,
+    get_route_json,
 )
 
 
 urlpatterns = patterns('',
     url(r'^api/graph.json$', get_graph_json, name="path_json_graph"),
+    url(r'^api/route.json$', get_route_json, name="path_json_route"),
     url(r'^api/path/(?P<pk>\d+)/profile.svg$', ElevationChart.as_view(model=Path), name='path_profile_svg'),
 )
 
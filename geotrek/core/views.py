@@ -1,14 +1,16 @@
 # -*- coding: utf-8 -*-
-import math
-
 import json
-from django.http import HttpResponse
+import hashlib
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseBadRequest
 from django.utils.decorators import method_decorator
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.http import last_modified as cache_last_modified
+from django.views.decorators.http import condition
+from django.utils.cache import patch_vary_headers
 from django.views.generic.edit import BaseDetailView
 from django.core.cache import get_cache
 from django.shortcuts import redirect
+from django.contrib.gis.geos import Point, Polygon
 
 from mapentity.views import (MapEntityLayer, MapEntityList, MapEntityJsonList,
                              MapEntityDetail, MapEntityDocument, MapEntityCreate, MapEntityUpdate,
@@ -20,6 +22,7 @@ from geotrek.authent.decorators import path_manager_required, same_structure_req
 from .models import Path, Trail
 from .forms import PathForm
 from .filters import PathFilter
+from .helpers import GraphHelper, AltimetryHelper
 from . import graph as graph_lib
 
 
@@ -47,16 +50,40 @@ class ElevationChart(LastModifiedMixin, BaseDetailView):
 
 
 class ElevationProfile(LastModifiedMixin, JSONResponseMixin, BaseDetailView):
-    """Extract elevation profile from a path and return it as JSON"""
+    """Extract elevation profile from a path and return it as JSON.
+
+    Profile can be simplified with ``points`` (maximum number of samples)
+    and/or ``tolerance`` (in meters) parameters. With ``format=polyline``,
+    samples are encoded as a polyline string.
+    """
+
+    def get(self, request, *args, **kwargs):
+        try:
+            self.points = int(request.GET['points']) if 'points' in request.GET else None
+            self.tolerance = float(request.GET['tolerance']) if 'tolerance' in request.GET else None
+        except ValueError:
+            return HttpResponseBadRequest('Invalid points or tolerance')
+        self.format = request.GET.get('format')
+        if self.format not in (None, 'polyline'):
+            return HttpResponseBadRequest('Unknown format')
+        return super(ElevationProfile, self).get(request, *args, **kwargs)
 
     def get_context_data(self, **kwargs):
         """
         Put elevation profile into response context.
         """
         obj = self.get_object()
+        profile = obj.get_elevation_profile()
+        if self.points is not None or self.tolerance is not None:
+            profile = AltimetryHelper.simplify_profile(profile, self.points, self.tolerance)
+        if self.format == 'polyline':
+            return {'profile': AltimetryHelper.encode_profile(profile),
+                    'format': 'polyline',
+                    'fields': ['distance', 'elevation', 'lng', 'lat'],
+                    'factors': [1, 1, 100000, 100000]}
         data = {}
         # Formatted as distance, elevation, [lng, lat]
-        for step in obj.get_elevation_profile():
+        for step in profile:
             formatted = step[0], step[3], step[1:3]
             data.setdefault('profile', []).append(formatted)
         return data
@@ -127,34 +154,148 @@ class PathDelete(MapEntityDelete):
         return super(PathDelete, self).dispatch(*args, **kwargs)
 
 
-@cache_last_modified(lambda x: Path.latest_updated())
-def get_graph_json(request):
-    cache = get_cache('fat')
-    key = 'path_graph_json'
+def graph_binary_requested(request):
+    return (request.GET.get('format') == 'binary' or
+            'application/octet-stream' in request.META.get('HTTP_ACCEPT', ''))
+
+
+def graph_etag(request):
+    """
+    Depends on graph version, requested area or delta, and negotiated
+    encoding. Other parameters (e.g. cache busters) are ignored.
+    """
+    params = [request.GET.get(name, '') for name in ('since', 'bbox', 'tile')]
+    key = u'%s-%s-%s' % (GraphHelper.log_version(), '-'.join(params),
+                         graph_binary_requested(request))
+    return hashlib.md5(key.encode('utf-8')).hexdigest()
 
-    result = cache.get(key)
-    latest = Path.latest_updated()
 
-    if result and latest:
-        cache_latest, json_graph = result
-        # Not empty and still valid
-        if cache_latest and cache_latest >= latest:
-            return HttpJSONResponse(json_graph)
-
-    # cache does not exist or is not up to date
-    # rebuild the graph and cache the json
-    def path_modifier(path):
-        l = 0.0 if math.isnan(path.length) else path.length
-        return { "id": path.pk, "length": l}
-
-    graph = graph_lib.graph_edges_nodes_of_qs(
-                Path.objects.all(),
-                value_modifier=path_modifier,
-                key_modifier=graph_lib.get_key_optimizer())
-    json_graph = json.dumps(graph)
-
-    cache.set(key, (latest, json_graph))
-    return HttpJSONResponse(json_graph)
+def graph_response(request, content):
+    if graph_binary_requested(request):
+        response = HttpResponse(content, content_type='application/octet-stream')
+    else:
+        response = HttpJSONResponse(content)
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+@condition(etag_func=graph_etag, last_modified_func=lambda x: Path.latest_updated())
+def get_graph_json(request):
+    """
+    Returns the whole paths graph, or only the changes since the version
+    given in ``since`` parameter when still available.
+
+    With ``bbox`` (``west,south,east,north``) or ``tile`` (``z/x/y``)
+    parameters, only paths intersecting this area are returned.
+
+    Graphs are encoded in binary (see ``GraphHelper.encode()``) if requested
+    with ``Accept: application/octet-stream`` or ``format=binary``. Deltas
+    are always JSON.
+    """
+    if 'bbox' in request.GET or 'tile' in request.GET:
+        return get_partial_graph_json(request)
+
+    state = GraphHelper.get_state()
+    since = request.GET.get('since')
+    if since:
+        try:
+            delta = GraphHelper.delta(state, int(since))
+        except ValueError:
+            return HttpResponseBadRequest()
+        if delta is not None:
+            return HttpJSONResponse(json.dumps(delta))
+
+    encoding = 'binary' if graph_binary_requested(request) else 'json'
+    encode = GraphHelper.encode if encoding == 'binary' else json.dumps
+    if state.get(encoding) is None or state[encoding][0] != state['version']:
+        state[encoding] = (state['version'], encode(GraphHelper.graph(state)))
+        get_cache('fat').set(GraphHelper.cache_key, state)
+    return graph_response(request, state[encoding][1])
+
+
+def get_partial_graph_json(request):
+    try:
+        if 'tile' in request.GET:
+            z, x, y = [int(v) for v in request.GET['tile'].split('/')]
+            bounds = GraphHelper.tile_bounds(z, x, y)
+        else:
+            bounds = [float(v) for v in request.GET['bbox'].split(',')]
+        bbox = Polygon.from_bbox(bounds)
+    except (ValueError, TypeError):
+        return HttpResponseBadRequest()
+    bbox.srid = settings.API_SRID
+
+    graph = GraphHelper.subgraph(bbox)
+    graph['bbox'] = bounds
+    if 'tile' in request.GET:
+        # Let client fetch surroundings lazily
+        graph['tile'] = [z, x, y]
+        graph['neighbours'] = GraphHelper.tile_neighbours(z, x, y)
+    if graph_binary_requested(request):
+        return graph_response(request, GraphHelper.encode(graph))
+    return graph_response(request, json.dumps(graph))
+
+
+_routing_graph = {}
+
+
+def get_routing_graph():
+    """
+    Returns the in-process routing graph, rebuilt when paths have changed.
+    """
+    latest = Path.latest_updated()
+    cached = _routing_graph.get('graph')
+    if cached is not None:
+        cache_latest, graph = cached
+        if cache_latest and latest and cache_latest >= latest:
+            return graph
+    graph = graph_lib.routing_graph_of_qs(Path.objects.all())
+    _routing_graph['graph'] = (latest, graph)
+    return graph
+
+
+def _route_extremity(params, prefix):
+    """
+    Returns ``(path pk, position)`` from request parameters : either explicitly
+    (``<prefix>_path`` and ``<prefix>_position``), or a point
+    (``<prefix>_lng`` and ``<prefix>_lat``) located on the closest path (or
+    on ``<prefix>_path`` if specified).
+    """
+    path_pk = params.get('%s_path' % prefix)
+    position = params.get('%s_position' % prefix)
+    if path_pk is not None and position is not None:
+        position = float(position)
+        if not 0.0 <= position <= 1.0:
+            raise ValueError("Invalid position %s" % position)
+        return int(path_pk), position
+    point = Point(float(params['%s_lng' % prefix]),
+                  float(params['%s_lat' % prefix]), srid=settings.API_SRID)
+    path = Path.objects.get(pk=int(path_pk)) if path_pk else Path.closest(point)
+    position, offset = path.interpolate(point)
+    return path.pk, position
+
+
+def get_route_json(request):
+    """
+    Shortest route between two points of the paths network.
+    Result can be given to ``Topology.deserialize()``.
+    """
+    try:
+        start = _route_extremity(request.GET, 'from')
+        end = _route_extremity(request.GET, 'to')
+    except (KeyError, ValueError, Path.DoesNotExist) as e:
+        return HttpResponseBadRequest("Invalid route parameters: %s" % e)
+
+    graph = get_routing_graph()
+    try:
+        found = graph.route(start, end)
+    except KeyError as e:
+        return HttpResponseBadRequest("Unknown path %s" % e)
+    if found is None:
+        return HttpJSONResponse(json.dumps(None))
+    serialized, length = found
+    serialized['length'] = length
+    return HttpJSONResponse(json.dumps(serialized))
 
 
 class TrailDetail(MapEntityDetail):
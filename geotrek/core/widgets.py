@@ -74,6 +74,7 @@ class BaseTopologyWidget(forms.Textarea):
         context['topology'] = value
         context['topologyjson'] = topologyjson
         context['path_snapping'] = True
+        context['graph_tile_zoom'] = settings.PATH_GRAPH_TILE_ZOOM
         return context
 
 
@@ -7,6 +7,7 @@ from mapentity.models import MapEntityMixin
 
 from geotrek.common.utils import classproperty
 from geotrek.core.models import Topology, Path
+from geotrek.core.helpers import TopologyHelper
 from geotrek.authent.models import StructureRelatedManager, StructureRelated
 
 
@@ -125,6 +126,7 @@ class Infrastructure(BaseInfrastructure):
 
 Path.add_property('infrastructures', lambda self: Infrastructure.path_infrastructures(self))
 Topology.add_property('infrastructures', lambda self: Infrastructure.topology_infrastructures(self))
+TopologyHelper.add_relation('infrastructures', Infrastructure)
 
 
 class SignageGISManager(gismodels.GeoManager):
@@ -159,3 +161,4 @@ class Signage(BaseInfrastructure):
 
 Path.add_property('signages', lambda self: Signage.path_signages(self))
 Topology.add_property('signages', lambda self: Signage.topology_signages(self))
+TopologyHelper.add_relation('signages', Signage)
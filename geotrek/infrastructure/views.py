@@ -5,6 +5,7 @@ from mapentity.views import (MapEntityLayer, MapEntityList, MapEntityJsonList, M
 
 from geotrek.authent.decorators import same_structure_required, editor_required
 from geotrek.core.models import AltimetryMixin
+from geotrek.core.helpers import prefetch_topology_relations
 from .models import Infrastructure, Signage
 from .filters import InfrastructureFilter, SignageFilter
 from .forms import InfrastructureForm, SignageForm
@@ -22,12 +23,18 @@ class InfrastructureList(MapEntityList):
 
 
 class InfrastructureJsonList(MapEntityJsonList, InfrastructureList):
-    pass
+    def get_queryset(self):
+        qs = super(InfrastructureJsonList, self).get_queryset()
+        return prefetch_topology_relations(qs, 'cities')
 
 
 class InfrastructureFormatList(MapEntityFormat, InfrastructureList):
     columns = InfrastructureList.columns + AltimetryMixin.COLUMNS
 
+    def get_queryset(self):
+        qs = super(InfrastructureFormatList, self).get_queryset()
+        return prefetch_topology_relations(qs, 'cities')
+
 
 class InfrastructureDetail(MapEntityDetail):
     queryset = Infrastructure.objects.existing()
@@ -83,12 +90,18 @@ class SignageList(MapEntityList):
 
 
 class SignageJsonList(MapEntityJsonList, SignageList):
-    pass
+    def get_queryset(self):
+        qs = super(SignageJsonList, self).get_queryset()
+        return prefetch_topology_relations(qs, 'cities')
 
 
 class SignageFormatList(MapEntityFormat, SignageList):
     columns = SignageList.columns + AltimetryMixin.COLUMNS
 
+    def get_queryset(self):
+        qs = super(SignageFormatList, self).get_queryset()
+        return prefetch_topology_relations(qs, 'cities')
+
 
 class SignageDetail(MapEntityDetail):
     queryset = Signage.objects.existing()
@@ -5,7 +5,7 @@ from django.utils.translation import ugettext_lazy as _
 from django_filters import ModelChoiceFilter
 from mapentity.filters import MapEntityFilterSet
 
-from geotrek.core.models import Topology, Path
+from geotrek.core.models import Topology, Path, PathAggregation
 from geotrek.common.models import Organism
 from geotrek.common.filters import StructureRelatedFilterSet
 
@@ -59,8 +59,9 @@ class SignageManagementEdgeFilter(OrganismFilter):
 
 def filter(qs, edges):
     """
-    This piece of code was moved from core, and should be rewritten nicely
-    with managers : TODO !
+    Filters ``qs`` (paths, topologies, interventions or projects) with
+    topologies overlapping ``edges``. Querysets are nested as subqueries,
+    thus filtering runs as a single query.
     """
     # TODO: this is wrong, land should not depend on maintenance
     import geotrek.maintenance as maintenance
@@ -69,29 +70,20 @@ def filter(qs, edges):
 
     # In case, we filter on paths
     if qs.model == Path:
-        paths = []
-        for o in overlapping:
-            paths.extend(o.paths.all())
-        return qs.filter(pk__in=[path.pk for path in set(paths)])
+        aggregations = PathAggregation.objects.filter(topo_object__in=overlapping)
+        return qs.filter(pk__in=aggregations.values('path'))
 
     # TODO: This is (amazingly) ugly in terms of OOP. Should refactor overlapping()
     elif issubclass(qs.model, maintenance.models.Intervention):
-        return qs.filter(topology__in=[topo.pk for topo in overlapping])
+        return qs.filter(topology__in=overlapping)
     elif issubclass(qs.model, maintenance.models.Project):
-        # Find all interventions overlapping those edges
-        interventions = filter(maintenance.models.Intervention.objects.existing()
-                                                              .select_related(depth=1)
-                                                              .filter(project__in=qs),
-                               edges)
-        # Return only the projects concerned by the interventions
-        projects = []
-        for intervention in interventions:
-            projects.append(intervention.project.pk)
-        return qs.filter(pk__in=set(projects))
+        # Projects of the interventions overlapping those edges
+        interventions = filter(maintenance.models.Intervention.objects.existing(), edges)
+        return qs.filter(pk__in=interventions.values('project'))
 
     else:
         assert issubclass(qs.model, Topology), "%s is not a Topology as expected" % qs.model
-        return qs.filter(pk__in=[topo.pk for topo in overlapping])
+        return qs.filter(pk__in=overlapping)
 
 
 class TopoFilter(ModelChoiceFilter):
@@ -8,6 +8,7 @@ from mapentity.models import MapEntityMixin
 
 from geotrek.authent.models import StructureRelated
 from geotrek.core.models import Topology, Path
+from geotrek.core.helpers import TopologyHelper
 from geotrek.common.models import Organism
 from geotrek.maintenance.models import Intervention, Project
 
@@ -74,6 +75,7 @@ Path.add_property('physical_edges', PhysicalEdge.path_physicals)
 Topology.add_property('physical_edges', PhysicalEdge.topology_physicals)
 Intervention.add_property('physical_edges', lambda self: self.topology.physical_edges if self.topology else [])
 Project.add_property('physical_edges', lambda self: self.edges_by_attr('physical_edges'))
+TopologyHelper.add_relation('physical_edges', PhysicalEdge, select_related=['physical_type'])
 
 
 class LandType(StructureRelated):
@@ -138,6 +140,7 @@ Path.add_property('land_edges', LandEdge.path_lands)
 Topology.add_property('land_edges', LandEdge.topology_lands)
 Intervention.add_property('land_edges', lambda self: self.topology.land_edges if self.topology else [])
 Project.add_property('land_edges', lambda self: self.edges_by_attr('land_edges'))
+TopologyHelper.add_relation('land_edges', LandEdge, select_related=['land_type'])
 
 
 class CompetenceEdge(MapEntityMixin, Topology):
@@ -188,6 +191,7 @@ Path.add_property('competence_edges', CompetenceEdge.path_competences)
 Topology.add_property('competence_edges', CompetenceEdge.topology_competences)
 Intervention.add_property('competence_edges', lambda self: self.topology.competence_edges if self.topology else [])
 Project.add_property('competence_edges', lambda self: self.edges_by_attr('competence_edges'))
+TopologyHelper.add_relation('competence_edges', CompetenceEdge, select_related=['organization'])
 
 
 class WorkManagementEdge(MapEntityMixin, Topology):
@@ -238,6 +242,7 @@ Path.add_property('work_edges', WorkManagementEdge.path_works)
 Topology.add_property('work_edges', WorkManagementEdge.topology_works)
 Intervention.add_property('work_edges', lambda self: self.topology.work_edges if self.topology else [])
 Project.add_property('work_edges', lambda self: self.edges_by_attr('work_edges'))
+TopologyHelper.add_relation('work_edges', WorkManagementEdge, select_related=['organization'])
 
 
 class SignageManagementEdge(MapEntityMixin, Topology):
@@ -288,6 +293,7 @@ Path.add_property('signage_edges', SignageManagementEdge.path_signages)
 Topology.add_property('signage_edges', SignageManagementEdge.topology_signages)
 Intervention.add_property('signage_edges', lambda self: self.topology.signage_edges if self.topology else [])
 Project.add_property('signage_edges', lambda self: self.edges_by_attr('signage_edges'))
+TopologyHelper.add_relation('signage_edges', SignageManagementEdge, select_related=['organization'])
 
 
 """
@@ -365,6 +371,8 @@ Intervention.add_property('area_edges', lambda self: self.topology.area_edges if
 Intervention.add_property('areas', lambda self: self.topology.areas if self.topology else [])
 Project.add_property('area_edges', lambda self: self.edges_by_attr('area_edges'))
 Project.add_property('areas', lambda self: list(set(map(attrgetter('restricted_area'), self.area_edges))))
+TopologyHelper.add_relation('area_edges', RestrictedAreaEdge, select_related=['restricted_area__area_type'])
+TopologyHelper.add_relation('areas', RestrictedAreaEdge, 'restricted_area', select_related=['restricted_area__area_type'])
 
 
 class City(models.Model):
@@ -418,6 +426,8 @@ Intervention.add_property('city_edges', lambda self: self.topology.city_edges if
 Intervention.add_property('cities', lambda self: self.topology.cities if self.topology else [])
 Project.add_property('city_edges', lambda self: self.edges_by_attr('city_edges'))
 Project.add_property('cities', lambda self: list(set(map(attrgetter('city'), self.city_edges))))
+TopologyHelper.add_relation('city_edges', CityEdge, select_related=['city'])
+TopologyHelper.add_relation('cities', CityEdge, 'city')
 
 
 class District(models.Model):
@@ -469,3 +479,5 @@ Intervention.add_property('district_edges', lambda self: self.topology.district_
 Intervention.add_property('districts', lambda self: self.topology.districts if self.topology else [])
 Project.add_property('district_edges', lambda self: self.edges_by_attr('district_edges'))
 Project.add_property('districts', lambda self: list(set(map(attrgetter('district'), self.district_edges))))
+TopologyHelper.add_relation('district_edges', DistrictEdge, select_related=['district'])
+TopologyHelper.add_relation('districts', DistrictEdge, 'district')
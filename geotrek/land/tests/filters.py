@@ -1,11 +1,15 @@
 # -*- coding: utf-8 -*-
 
+from django.conf import settings
 from django.test import TestCase
+from django.db import connection
 
 from geotrek.land.factories import (
     PhysicalEdgeFactory, LandEdgeFactory, CompetenceEdgeFactory,
-    WorkManagementEdgeFactory, SignageManagementEdgeFactory
+    WorkManagementEdgeFactory, SignageManagementEdgeFactory,
+    CityEdgeFactory, DistrictEdgeFactory
 )
+from geotrek.land.filters import TopoFilter, EdgeFilterSet
 
 from geotrek.core.factories import PathFactory, PathAggregationFactory, getRandomLineStringInBounds
 
@@ -51,3 +55,47 @@ class LandFiltersTest(TestCase):
 
     def test_filter_by_signage_management_edge(self):
         self._filter_by_edge(SignageManagementEdgeFactory, 'signage', lambda edge: edge.organization.pk)
+
+
+class EdgeFiltersQueriesTest(TestCase):
+    """
+    Filtering by edges runs as a single query, whatever the number of
+    overlapping topologies.
+    """
+    filterclass = None
+
+    edges = {
+        'city': (CityEdgeFactory, lambda edge: edge.city.pk),
+        'district': (DistrictEdgeFactory, lambda edge: edge.district.pk),
+        'physical_type': (PhysicalEdgeFactory, lambda edge: edge.physical_type.pk),
+        'land_type': (LandEdgeFactory, lambda edge: edge.land_type.pk),
+        'competence': (CompetenceEdgeFactory, lambda edge: edge.organization.pk),
+        'signage': (SignageManagementEdgeFactory, lambda edge: edge.organization.pk),
+        'work': (WorkManagementEdgeFactory, lambda edge: edge.organization.pk),
+    }
+
+    def count_queries(self, data):
+        settings.DEBUG = True
+        before = len(connection.queries)
+        list(self.filterclass(data=data).qs)
+        count = len(connection.queries) - before
+        settings.DEBUG = False
+        return count
+
+    def test_number_of_queries(self):
+        if self.filterclass is None:
+            # Do not run abstract tests
+            return
+        # Every edge filter is measured
+        filters = [key for key, f in EdgeFilterSet.base_filters.items() if isinstance(f, TopoFilter)]
+        self.assertItemsEqual(filters, self.edges.keys())
+        values = {}
+        for key, (edgefactoryclass, getvalue) in self.edges.items():
+            edges = [edgefactoryclass.create() for i in range(3)]
+            values[key] = getvalue(edges[0])
+
+        unfiltered = self.count_queries({})
+        for key, value in values.items():
+            # One more query to fetch the value (form validation)
+            self.assertEqual(self.count_queries({key: value}), unfiltered + 1,
+                             msg="Filtering by %s" % key)
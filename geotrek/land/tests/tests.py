@@ -6,8 +6,9 @@ from django.core.urlresolvers import reverse
 from geotrek.common.tests import CommonTest
 
 from geotrek.authent.factories import PathManagerFactory
-from geotrek.core.models import Topology
-from geotrek.core.factories import PathFactory, PathAggregationFactory
+from geotrek.core.models import Topology, Path
+from geotrek.core.factories import PathFactory, PathAggregationFactory, TopologyFactory
+from geotrek.core.helpers import prefetch_topology_relations
 from geotrek.common.factories import OrganismFactory
 from geotrek.land.models import (PhysicalEdge, LandEdge, CompetenceEdge,
                                  WorkManagementEdge, SignageManagementEdge, City)
@@ -84,6 +85,43 @@ class DistrictEdgeTest(EdgeHelperTest):
 
 
 
+class PrefetchRelationsTest(TestCase):
+
+    def setUp(self):
+        self.p1 = PathFactory.create(geom=LineString((0, 0, 0), (10, 0, 0)))
+        self.p2 = PathFactory.create(geom=LineString((10, 0, 0), (10, 10, 0)))
+        for path, start, end in [(self.p1, 0.0, 1.0), (self.p2, 0.0, 0.5)]:
+            edge = CityEdgeFactory.create(no_path=True)
+            edge.add_path(path, start=start, end=end)
+            edge = DistrictEdgeFactory.create(no_path=True)
+            edge.add_path(path, start=start, end=end)
+        self.topologies = []
+        for path, start, end in [(self.p1, 0.0, 0.5), (self.p2, 0.6, 1.0), (self.p2, 0.2, 0.3)]:
+            topology = TopologyFactory.create(no_path=True)
+            topology.add_path(path, start=start, end=end)
+            self.topologies.append(topology.pk)
+
+    def assertPrefetched(self, queryset, names):
+        expected = {}
+        for obj in queryset:
+            for name in names:
+                expected[(obj.pk, name)] = sorted(o.pk for o in getattr(obj, name))
+        # Objects, overlapping topologies and one per relation
+        with self.assertNumQueries(2 + len(names)):
+            objects = prefetch_topology_relations(queryset.all(), *names)
+        with self.assertNumQueries(0):
+            for obj in objects:
+                for name in names:
+                    self.assertEqual([o.pk for o in getattr(obj, name)], expected[(obj.pk, name)])
+                    self.assertEqual(getattr(obj, '%s_csv_display' % name), getattr(obj, name))
+
+    def test_topologies(self):
+        self.assertPrefetched(Topology.objects.filter(pk__in=self.topologies), ['cities', 'districts'])
+
+    def test_paths(self):
+        self.assertPrefetched(Path.objects.filter(pk__in=[self.p1.pk, self.p2.pk]), ['cities', 'city_edges'])
+
+
 class PhysicalEdgeViewsTest(CommonTest):
     model = PhysicalEdge
     modelfactory = PhysicalEdgeFactory
@@ -9,6 +9,7 @@ from mapentity.models import MapEntityMixin
 
 from geotrek.authent.models import StructureRelated
 from geotrek.core.models import Topology, AltimetryMixin, Path, Trail
+from geotrek.core.helpers import TopologyHelper
 from geotrek.common.models import Organism, TimeStampedModel, NoDeleteMixin
 from geotrek.common.utils import classproperty
 from geotrek.infrastructure.models import Infrastructure, Signage
@@ -222,6 +223,8 @@ class Intervention(MapEntityMixin, AltimetryMixin, TimeStampedModel, StructureRe
 Path.add_property('interventions', lambda self: Intervention.path_interventions(self))
 Trail.add_property('interventions', lambda self: Intervention.trail_interventions(self))
 Topology.add_property('interventions', lambda self: Intervention.topology_interventions(self))
+TopologyHelper.add_relation('interventions', Intervention, through='topology')
+TopologyHelper.add_topology_lookup(Intervention, 'topology')
 
 
 class InterventionStatus(StructureRelated):
@@ -443,6 +446,8 @@ class Project(MapEntityMixin, TimeStampedModel, StructureRelated, NoDeleteMixin)
 Path.add_property('projects', lambda self: Project.path_projects(self))
 Topology.add_property('projects', lambda self: Project.topology_projects(self))
 Trail.add_property('projects', lambda self: Project.trail_projects(self))
+TopologyHelper.add_relation('projects', Project, through='interventions__topology')
+TopologyHelper.add_topology_lookup(Project, 'interventions__topology')
 
 
 class ProjectType(StructureRelated):
@@ -8,6 +8,7 @@ from geotrek.land.factories import (
 )
 from geotrek.core.factories import PathFactory, PathAggregationFactory, getRandomLineStringInBounds, TopologyFactory
 
+from geotrek.land.tests.filters import EdgeFiltersQueriesTest
 from geotrek.maintenance.filters import ProjectFilter, InterventionFilter
 from geotrek.maintenance.factories import InterventionFactory, ProjectFactory
 
@@ -209,3 +210,13 @@ class ProjectFilteringByLandTest(TestCase):
 
         self.assertEqual(len(qs), 1)
         self.assertEqual(qs[0], seek_proj)
+
+
+class InterventionFilterQueriesTest(EdgeFiltersQueriesTest):
+
+    filterclass = InterventionFilter
+
+
+class ProjectFilterQueriesTest(EdgeFiltersQueriesTest):
+
+    filterclass = ProjectFilter
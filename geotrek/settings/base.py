@@ -337,8 +337,18 @@ DEFAULT_STRUCTURE_NAME = gettext_noop('Default')
 
 SNAP_DISTANCE = 30  # Distance of snapping in pixels
 
+PATH_CLOSEST_RADIUS = 100  # Search radius of closest path in meters (further is slower)
+
 ALTIMETRIC_PROFILE_PRECISION = 25  # Sampling precision in meters
 
+# Copy of DEM kept by ``loaddem`` for sampling elevations without querying
+# the database (requires NumPy). If None, DEM is only sampled in database.
+DEM_ARRAY_PATH = None
+
+# Zoom level of tiles used to load paths graph in topology forms.
+# If None, the whole graph is loaded at once.
+PATH_GRAPH_TILE_ZOOM = None
+
 # Let this be defined at instance-level
 LEAFLET_CONFIG = {
     'SRID': SRID,
@@ -1,10 +1,27 @@
 from django.utils.translation import ugettext_lazy as _
-from geotrek.land.filters import TopoFilter, EdgeFilterSet
+from geotrek.land.filters import TopoFilter, TopoFilterCity, TopoFilterDistrict, EdgeFilterSet
 
-from .models import Trek, POI
+from .models import Trek, POI, TrekPOI, TrekCity, TrekDistrict
+
+
+class TrekCityFilter(TopoFilterCity):
+    def filter(self, qs, value):
+        if not value:
+            return qs
+        return qs.filter(pk__in=TrekCity.objects.filter(city=value).values('trek'))
+
+
+class TrekDistrictFilter(TopoFilterDistrict):
+    def filter(self, qs, value):
+        if not value:
+            return qs
+        return qs.filter(pk__in=TrekDistrict.objects.filter(district=value).values('trek'))
 
 
 class TrekFilter(EdgeFilterSet):
+    city = TrekCityFilter(label=_('City'), required=False)
+    district = TrekDistrictFilter(label=_('District'), required=False)
+
     class Meta(EdgeFilterSet.Meta):
         model = Trek
         fields = EdgeFilterSet.Meta.fields + ['published', 'difficulty', 'duration', 'themes', 'networks', 'usages', 'route', 'is_park_centered']
@@ -13,6 +30,11 @@ class TrekFilter(EdgeFilterSet):
 class POITrekFilter(TopoFilter):
     queryset = Trek.objects.existing()
 
+    def filter(self, qs, value):
+        if not value:
+            return qs
+        return qs.filter(pk__in=TrekPOI.objects.filter(trek=value).values('poi'))
+
 
 class POIFilter(EdgeFilterSet):
     trek = POITrekFilter(label=_("Trek"), required=False)
@@ -0,0 +1,151 @@
+import uuid
+import hashlib
+
+from django.conf import settings
+from django.core.cache import get_cache
+from django.db.models import Count, Max
+from django.test.client import RequestFactory
+from django.utils import translation
+
+
+class TrekCacheHelper(object):
+    """
+    Responses of the public trek API are cached by trek, language and
+    versions of their dependencies : one for the trek (itself, its
+    attachments, POIs and relationships), one shared by all treks
+    (lookup tables, paths, land layers).
+
+    Versions are kept in cache too, so that a hit does not touch
+    database. Bumping a version orphans the responses built with the
+    previous one.
+    """
+    version_key = 'trek_json_version'
+    catalog_version_key = 'trek_catalog_version'
+
+    @classmethod
+    def trek_version_key(cls, pk):
+        return '%s-%s' % (cls.version_key, pk)
+
+    @classmethod
+    def versions(cls, pk):
+        """
+        Shared and trek versions. Evicted versions are renewed.
+        """
+        cache = get_cache('default')
+        keys = [cls.version_key, cls.trek_version_key(pk)]
+        versions = cache.get_many(keys)
+        missing = dict((key, uuid.uuid4().hex) for key in keys if key not in versions)
+        if missing:
+            cache.set_many(missing)
+            versions.update(missing)
+        return [versions[key] for key in keys]
+
+    @classmethod
+    def bump(cls, pks=None):
+        """
+        Invalidate cached responses of treks ``pks``, or of all treks.
+        """
+        cache = get_cache('default')
+        if pks is None:
+            cache.set(cls.version_key, uuid.uuid4().hex)
+        else:
+            cache.set_many(dict((cls.trek_version_key(pk), uuid.uuid4().hex) for pk in set(pks)))
+        # Catalog lists all treks
+        get_cache('fat').set(cls.catalog_version_key, uuid.uuid4().hex)
+
+    @classmethod
+    def response_key(cls, pk, language):
+        return 'trek_json-%s-%s-%s-%s' % ((pk, language) + tuple(cls.versions(pk)))
+
+    @classmethod
+    def get(cls, key):
+        """
+        Cached ``(content, content type, last modified)`` of a response,
+        or None.
+        """
+        return get_cache('default').get(key)
+
+    @classmethod
+    def set(cls, key, response):
+        get_cache('default').set(key, (response.content, response['Content-Type'],
+                                       response.get('Last-Modified')))
+
+    @classmethod
+    def catalog_version(cls):
+        """
+        Version of trek-related data renewed by ``bump()``, or None if
+        ``fat`` cache does not keep it (e.g. ``DummyCache``).
+        """
+        cache = get_cache('fat')
+        version = cache.get(cls.catalog_version_key)
+        if version is None:
+            # Evicted: any new version invalidates clients copies
+            cache.add(cls.catalog_version_key, uuid.uuid4().hex)
+            version = cache.get(cls.catalog_version_key)
+        return version
+
+    @classmethod
+    def catalog_etag(cls, language):
+        """
+        ETag of the catalog of treks (see ``TrekJsonCatalog``). Derived
+        from published treks (count and last update), and from the version
+        renewed by ``bump()`` on any trek-related change. None if this
+        version cannot be kept, since changes would go unnoticed.
+        """
+        from .models import Trek
+
+        version = cls.catalog_version()
+        if version is None:
+            return None
+        state = Trek.objects.existing().filter(published=True).aggregate(count=Count('pk'),
+                                                                         latest=Max('date_update'))
+        key = u'%s-%s-%s-%s' % (state['count'], state['latest'], version, language)
+        return '"%s"' % hashlib.md5(key.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def get_catalog(cls, etag):
+        """
+        Gzipped catalog of treks, or None.
+        """
+        if etag is None:
+            return None
+        return get_cache('fat').get('trek_catalog-%s' % etag.strip('"'))
+
+    @classmethod
+    def set_catalog(cls, etag, blob):
+        if etag is not None:
+            get_cache('fat').set('trek_catalog-%s' % etag.strip('"'), blob)
+
+    @classmethod
+    def warm(cls, pks, languages=None):
+        """
+        Build and cache responses of treks ``pks`` and the catalog of
+        treks, in all languages. Returns the number of responses built.
+        """
+        from .views import TrekJsonDetail, TrekJsonCatalog
+
+        view = TrekJsonDetail.as_view()
+        catalog = TrekJsonCatalog.as_view()
+        factory = RequestFactory()
+        languages = languages or [code for code, name in settings.LANGUAGES]
+        built = 0
+        current = translation.get_language()
+        try:
+            for language in languages:
+                translation.activate(language)
+                for pk in pks:
+                    if cls.get(cls.response_key(pk, language)) is not None:
+                        continue
+                    request = factory.get('/')
+                    request.LANGUAGE_CODE = language
+                    response = view(request, pk=str(pk))
+                    if response.status_code == 200:
+                        built += 1
+                if cls.get_catalog(cls.catalog_etag(language)) is None:
+                    request = factory.get('/')
+                    request.LANGUAGE_CODE = language
+                    catalog(request)
+                    built += 1
+        finally:
+            translation.activate(current)
+        return built
@@ -0,0 +1,32 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from geotrek.trekking.helpers import TrekCacheHelper
+from geotrek.trekking.models import Trek
+
+
+class Command(BaseCommand):
+    help = 'Build cached responses of public trek API (treks and catalog), for all languages.\n'
+    help += 'Responses already in cache (and up-to-date) are not rebuilt.\n'
+    can_import_settings = True
+
+    option_list = BaseCommand.option_list + (
+        make_option('--all',
+                    action='store_true',
+                    default=False,
+                    help='Include unpublished treks.'),
+        make_option('--invalidate',
+                    action='store_true',
+                    default=False,
+                    help='Invalidate all cached responses first (e.g. after loading paths or land layers).'),
+    )
+
+    def handle(self, *args, **options):
+        if options['invalidate']:
+            TrekCacheHelper.bump()
+        treks = Trek.objects.existing()
+        if not options['all']:
+            treks = treks.filter(published=True)
+        built = TrekCacheHelper.warm(list(treks.values_list('pk', flat=True)))
+        self.stdout.write('%s responses built.\n' % built)
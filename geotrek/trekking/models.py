@@ -4,6 +4,7 @@ import shutil
 
 from django.conf import settings
 from django.contrib.gis.db import models
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
 from django.core.urlresolvers import reverse
 from django.utils.translation import ugettext_lazy as _
 from django.template.defaultfilters import slugify
@@ -14,12 +15,18 @@ import simplekml
 from PIL import Image
 from mapentity.models import MapEntityMixin
 from mapentity.serializers import plain_text
+from paperclip.models import Attachment
 
 from geotrek.core.models import Path, Topology
+from geotrek.core.helpers import TopologyHelper, prefetched
+from geotrek.common.models import RenderJob
+from geotrek.common import rendering
 from geotrek.common.utils import classproperty
 from geotrek.maintenance.models import Intervention, Project
+from geotrek.land.models import City, District
 
 from .templatetags import trekking_tags
+from .helpers import TrekCacheHelper
 
 
 logger = logging.getLogger(__name__)
@@ -172,15 +179,40 @@ class Trek(PicturesMixin, MapEntityMixin, Topology):
 
     @property
     def relationships(self):
+        if hasattr(self, '_relationships'):
+            return self._relationships
         # Does not matter if a or b
         return TrekRelationship.objects.filter(trek_a=self)
 
+    @relationships.setter
+    def relationships(self, values):
+        self._relationships = values
+
     @property
     def poi_types(self):
-        pks = set(self.pois.values_list('type', flat=True))
-        return POIType.objects.filter(pk__in=pks)
+        return POIType.objects.filter(pois__in=self.pois).distinct()
+
+    @property
+    @prefetched('cities')
+    def cities(self):
+        relations = TrekCity.objects.filter(trek=self)
+        return list(City.objects.filter(pk__in=relations.values('city')))
+
+    @property
+    @prefetched('districts')
+    def districts(self):
+        relations = TrekDistrict.objects.filter(trek=self)
+        return list(District.objects.filter(pk__in=relations.values('district')))
+
+    def get_rendered_files(self):
+        return [(RenderJob.ELEVATION_CHART, self.get_elevation_chart_path(), self.get_elevation_chart_date()),
+                (RenderJob.MAP_IMAGE, self.get_map_image_path(), self.date_update)]
 
     def prepare_map_image(self, rooturl):
+        rendering.prepare(self, RenderJob.MAP_IMAGE, self.get_map_image_path(), self.date_update,
+                          lambda: self.render_map_image(rooturl), rooturl)
+
+    def render_map_image(self, rooturl):
         """
         We override the default behaviour of map image preparation :
         if the trek has a attached picture file with *title* ``mapimage``, we use it
@@ -367,12 +399,16 @@ class Trek(PicturesMixin, MapEntityMixin, Topology):
 
     @classmethod
     def topology_treks(cls, topology):
+        if isinstance(topology, POI):
+            relations = TrekPOI.objects.filter(poi=topology)
+            return cls.objects.existing().filter(pk__in=relations.values('trek'))
         return cls.overlapping(topology)
 
 Path.add_property('treks', Trek.path_treks)
 Topology.add_property('treks', Trek.topology_treks)
 Intervention.add_property('treks', lambda self: self.topology.treks if self.topology else [])
 Project.add_property('treks', lambda self: self.edges_by_attr('treks'))
+TopologyHelper.add_relation('treks', Trek)
 
 
 class TrekRelationshipManager(models.Manager):
@@ -652,12 +688,50 @@ class POI(PicturesMixin, MapEntityMixin, Topology):
 
     @classmethod
     def topology_pois(cls, topology):
+        if isinstance(topology, Trek):
+            relations = TrekPOI.objects.filter(trek=topology)
+            return cls.objects.existing().filter(pk__in=relations.values('poi'))
         return cls.overlapping(topology)
 
 Path.add_property('pois', POI.path_pois)
 Topology.add_property('pois', POI.topology_pois)
 Intervention.add_property('pois', lambda self: self.topology.pois if self.topology else [])
 Project.add_property('pois', lambda self: self.edges_by_attr('pois'))
+TopologyHelper.add_relation('pois', POI, select_related=['type'])
+
+
+"""
+    Relations of treks with POIs, cities and districts are stored in tables
+    maintained at DB level (see ``sql/30_relations.sql``), when aggregations
+    of topologies change or when land layers are reloaded.
+"""
+
+
+class TrekPOI(models.Model):
+    trek = models.ForeignKey(Trek, related_name='+', db_column='itineraire')
+    poi = models.ForeignKey(POI, related_name='+', db_column='poi')
+
+    class Meta:
+        db_table = 'o_r_itineraire_poi'
+        managed = False
+
+
+class TrekCity(models.Model):
+    trek = models.ForeignKey(Trek, related_name='+', db_column='itineraire')
+    city = models.ForeignKey(City, related_name='+', db_column='commune')
+
+    class Meta:
+        db_table = 'o_r_itineraire_commune'
+        managed = False
+
+
+class TrekDistrict(models.Model):
+    trek = models.ForeignKey(Trek, related_name='+', db_column='itineraire')
+    district = models.ForeignKey(District, related_name='+', db_column='secteur')
+
+    class Meta:
+        db_table = 'o_r_itineraire_secteur'
+        managed = False
 
 
 class POIType(models.Model):
@@ -683,3 +757,56 @@ class POIType(models.Model):
         return u'<img src="%s" />' % (self.pictogram.url if self.pictogram else "")
     pictogram_img.short_description = _("Pictogram")
     pictogram_img.allow_tags = True
+
+
+"""
+    Invalidation of cached public API responses (see ``TrekCacheHelper``).
+"""
+
+
+def invalidate_trek(sender, instance, **kwargs):
+    # Related treks show its name and publication status
+    related = TrekRelationship.objects.filter(trek_b=instance).values_list('trek_a', flat=True)
+    TrekCacheHelper.bump([instance.pk] + list(related))
+
+
+def invalidate_relationship(sender, instance, **kwargs):
+    TrekCacheHelper.bump([instance.trek_a_id, instance.trek_b_id])
+
+
+def invalidate_poi_treks(sender, instance, **kwargs):
+    TrekCacheHelper.bump(TrekPOI.objects.filter(poi=instance).values_list('trek', flat=True))
+
+
+def invalidate_attachment_trek(sender, instance, **kwargs):
+    if instance.content_type.model_class() is Trek:
+        TrekCacheHelper.bump([instance.object_id])
+
+
+def invalidate_trek_m2m(sender, instance, **kwargs):
+    if isinstance(instance, Trek):
+        TrekCacheHelper.bump([instance.pk])
+    else:
+        TrekCacheHelper.bump()
+
+
+def invalidate_all_treks(sender, **kwargs):
+    TrekCacheHelper.bump()
+
+
+post_save.connect(invalidate_trek, sender=Trek)
+pre_delete.connect(invalidate_trek, sender=Trek)
+post_save.connect(invalidate_relationship, sender=TrekRelationship)
+post_delete.connect(invalidate_relationship, sender=TrekRelationship)
+post_save.connect(invalidate_poi_treks, sender=POI)
+pre_delete.connect(invalidate_poi_treks, sender=POI)
+post_save.connect(invalidate_attachment_trek, sender=Attachment)
+post_delete.connect(invalidate_attachment_trek, sender=Attachment)
+for field in ('themes', 'networks', 'usages', 'web_links'):
+    m2m_changed.connect(invalidate_trek_m2m, sender=getattr(Trek, field).through)
+# Lookup tables, and layers from which geometries, altimetry, cities and
+# districts of treks are computed at DB level
+for model in (TrekNetwork, Usage, Route, DifficultyLevel, Theme, InformationDesk,
+              WebLink, WebLinkCategory, Path, City, District):
+    post_save.connect(invalidate_all_treks, sender=model)
+    post_delete.connect(invalidate_all_treks, sender=model)
@@ -0,0 +1,248 @@
+-------------------------------------------------------------------------------
+-- Relations of treks with POIs, cities and districts.
+-- They are stored (instead of being computed on each read) and maintained
+-- incrementally when aggregations of topologies change, or when land layers
+-- are reloaded.
+-------------------------------------------------------------------------------
+
+DO LANGUAGE plpgsql $$
+BEGIN
+    PERFORM * FROM information_schema.tables WHERE table_name = 'o_r_itineraire_poi';
+    IF NOT FOUND THEN
+        CREATE TABLE o_r_itineraire_poi (
+            id serial PRIMARY KEY,
+            itineraire integer NOT NULL REFERENCES o_t_itineraire (evenement) ON DELETE CASCADE,
+            poi integer NOT NULL REFERENCES o_t_poi (evenement) ON DELETE CASCADE,
+            UNIQUE (itineraire, poi)
+        );
+        CREATE INDEX o_r_itineraire_poi_poi_idx ON o_r_itineraire_poi (poi);
+    END IF;
+
+    PERFORM * FROM information_schema.tables WHERE table_name = 'o_r_itineraire_commune';
+    IF NOT FOUND THEN
+        CREATE TABLE o_r_itineraire_commune (
+            id serial PRIMARY KEY,
+            itineraire integer NOT NULL REFERENCES o_t_itineraire (evenement) ON DELETE CASCADE,
+            commune varchar(6) NOT NULL REFERENCES l_commune (insee) ON DELETE CASCADE,
+            UNIQUE (itineraire, commune)
+        );
+        CREATE INDEX o_r_itineraire_commune_commune_idx ON o_r_itineraire_commune (commune);
+    END IF;
+
+    PERFORM * FROM information_schema.tables WHERE table_name = 'o_r_itineraire_secteur';
+    IF NOT FOUND THEN
+        CREATE TABLE o_r_itineraire_secteur (
+            id serial PRIMARY KEY,
+            itineraire integer NOT NULL REFERENCES o_t_itineraire (evenement) ON DELETE CASCADE,
+            secteur integer NOT NULL REFERENCES l_secteur (id) ON DELETE CASCADE,
+            UNIQUE (itineraire, secteur)
+        );
+        CREATE INDEX o_r_itineraire_secteur_secteur_idx ON o_r_itineraire_secteur (secteur);
+    END IF;
+END;
+$$;
+
+
+-------------------------------------------------------------------------------
+-- Compute all relations of some treks
+-------------------------------------------------------------------------------
+
+CREATE OR REPLACE FUNCTION ft_itineraire_relations(itineraires integer[]) RETURNS void AS $$
+BEGIN
+    DELETE FROM o_r_itineraire_poi WHERE itineraire = ANY(itineraires);
+    DELETE FROM o_r_itineraire_commune WHERE itineraire = ANY(itineraires);
+    DELETE FROM o_r_itineraire_secteur WHERE itineraire = ANY(itineraires);
+
+    INSERT INTO o_r_itineraire_poi (itineraire, poi)
+        SELECT DISTINCT t.evenement, p.evenement
+        FROM e_r_evenement_troncon t
+        JOIN e_r_evenement_troncon a ON a.intervalle && t.intervalle
+        JOIN o_t_poi p ON p.evenement = a.evenement
+        WHERE t.evenement = ANY(itineraires);
+
+    INSERT INTO o_r_itineraire_commune (itineraire, commune)
+        SELECT DISTINCT t.evenement, c.commune
+        FROM e_r_evenement_troncon t
+        JOIN e_r_evenement_troncon a ON a.intervalle && t.intervalle
+        JOIN f_t_commune c ON c.evenement = a.evenement
+        WHERE t.evenement = ANY(itineraires);
+
+    INSERT INTO o_r_itineraire_secteur (itineraire, secteur)
+        SELECT DISTINCT t.evenement, s.secteur
+        FROM e_r_evenement_troncon t
+        JOIN e_r_evenement_troncon a ON a.intervalle && t.intervalle
+        JOIN f_t_secteur s ON s.evenement = a.evenement
+        WHERE t.evenement = ANY(itineraires);
+END;
+$$ LANGUAGE plpgsql;
+
+
+-------------------------------------------------------------------------------
+-- Treks overlapping an interval
+-------------------------------------------------------------------------------
+
+CREATE OR REPLACE FUNCTION ft_itineraires_intervalle(zone box) RETURNS integer[] AS $$
+    SELECT coalesce(array_agg(DISTINCT i.evenement), ARRAY[]::integer[])
+    FROM e_r_evenement_troncon a
+    JOIN o_t_itineraire i ON i.evenement = a.evenement
+    WHERE a.intervalle && $1;
+$$ LANGUAGE sql STABLE;
+
+
+-------------------------------------------------------------------------------
+-- Add relations of a new aggregation (only additions are possible)
+-------------------------------------------------------------------------------
+
+CREATE OR REPLACE FUNCTION ft_itineraire_relations_ajout(eid integer, zone box) RETURNS void AS $$
+DECLARE
+    itineraires integer[];
+BEGIN
+    PERFORM * FROM o_t_itineraire WHERE evenement = eid;
+    IF FOUND THEN
+        -- The trek gains the POIs, cities and districts of this interval
+        INSERT INTO o_r_itineraire_poi (itineraire, poi)
+            SELECT DISTINCT eid, p.evenement
+            FROM e_r_evenement_troncon a JOIN o_t_poi p ON p.evenement = a.evenement
+            WHERE a.intervalle && zone
+              AND NOT EXISTS (SELECT 1 FROM o_r_itineraire_poi r WHERE r.itineraire = eid AND r.poi = p.evenement);
+        INSERT INTO o_r_itineraire_commune (itineraire, commune)
+            SELECT DISTINCT eid, c.commune
+            FROM e_r_evenement_troncon a JOIN f_t_commune c ON c.evenement = a.evenement
+            WHERE a.intervalle && zone
+              AND NOT EXISTS (SELECT 1 FROM o_r_itineraire_commune r WHERE r.itineraire = eid AND r.commune = c.commune);
+        INSERT INTO o_r_itineraire_secteur (itineraire, secteur)
+            SELECT DISTINCT eid, s.secteur
+            FROM e_r_evenement_troncon a JOIN f_t_secteur s ON s.evenement = a.evenement
+            WHERE a.intervalle && zone
+              AND NOT EXISTS (SELECT 1 FROM o_r_itineraire_secteur r WHERE r.itineraire = eid AND r.secteur = s.secteur);
+        RETURN;
+    END IF;
+
+    PERFORM 1 FROM o_t_poi WHERE evenement = eid
+        UNION ALL SELECT 1 FROM f_t_commune WHERE evenement = eid
+        UNION ALL SELECT 1 FROM f_t_secteur WHERE evenement = eid;
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+
+    -- Treks of this interval gain the POI, city or district
+    itineraires := ft_itineraires_intervalle(zone);
+    INSERT INTO o_r_itineraire_poi (itineraire, poi)
+        SELECT i, eid FROM unnest(itineraires) AS i
+        WHERE EXISTS (SELECT 1 FROM o_t_poi WHERE evenement = eid)
+          AND NOT EXISTS (SELECT 1 FROM o_r_itineraire_poi r WHERE r.itineraire = i AND r.poi = eid);
+    INSERT INTO o_r_itineraire_commune (itineraire, commune)
+        SELECT i, c.commune FROM unnest(itineraires) AS i, f_t_commune c
+        WHERE c.evenement = eid
+          AND NOT EXISTS (SELECT 1 FROM o_r_itineraire_commune r WHERE r.itineraire = i AND r.commune = c.commune);
+    INSERT INTO o_r_itineraire_secteur (itineraire, secteur)
+        SELECT i, s.secteur FROM unnest(itineraires) AS i, f_t_secteur s
+        WHERE s.evenement = eid
+          AND NOT EXISTS (SELECT 1 FROM o_r_itineraire_secteur r WHERE r.itineraire = i AND r.secteur = s.secteur);
+END;
+$$ LANGUAGE plpgsql;
+
+
+-------------------------------------------------------------------------------
+-- Recompute relations after an aggregation was removed or moved
+-------------------------------------------------------------------------------
+
+CREATE OR REPLACE FUNCTION ft_itineraire_relations_maj(eid integer, zone box) RETURNS void AS $$
+BEGIN
+    PERFORM * FROM o_t_itineraire WHERE evenement = eid;
+    IF FOUND THEN
+        PERFORM ft_itineraire_relations(ARRAY[eid]);
+        RETURN;
+    END IF;
+
+    PERFORM 1 FROM o_t_poi WHERE evenement = eid
+        UNION ALL SELECT 1 FROM f_t_commune WHERE evenement = eid
+        UNION ALL SELECT 1 FROM f_t_secteur WHERE evenement = eid;
+    IF FOUND THEN
+        PERFORM ft_itineraire_relations(ft_itineraires_intervalle(zone));
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+
+-------------------------------------------------------------------------------
+-- Maintain relations when aggregations change
+-------------------------------------------------------------------------------
+
+DROP TRIGGER IF EXISTS e_r_evenement_troncon_itineraire_relations_iud_tgr ON e_r_evenement_troncon;
+
+CREATE OR REPLACE FUNCTION itineraire_relations_evenement_troncon_iud() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM ft_itineraire_relations_ajout(NEW.evenement, NEW.intervalle);
+    ELSIF TG_OP = 'UPDATE' THEN
+        IF NEW.evenement IS DISTINCT FROM OLD.evenement OR NOT (NEW.intervalle ~= OLD.intervalle) THEN
+            PERFORM ft_itineraire_relations_maj(OLD.evenement, OLD.intervalle);
+            PERFORM ft_itineraire_relations_ajout(NEW.evenement, NEW.intervalle);
+        END IF;
+    ELSE
+        PERFORM ft_itineraire_relations_maj(OLD.evenement, OLD.intervalle);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER e_r_evenement_troncon_itineraire_relations_iud_tgr
+AFTER INSERT OR UPDATE OR DELETE ON e_r_evenement_troncon
+FOR EACH ROW EXECUTE PROCEDURE itineraire_relations_evenement_troncon_iud();
+
+
+-------------------------------------------------------------------------------
+-- Maintain relations when treks, POIs or land edges are created after their
+-- aggregations, or when land edges are removed (e.g. land layers reloaded)
+-------------------------------------------------------------------------------
+
+DROP TRIGGER IF EXISTS o_t_itineraire_relations_i_tgr ON o_t_itineraire;
+DROP TRIGGER IF EXISTS o_t_poi_itineraire_relations_i_tgr ON o_t_poi;
+DROP TRIGGER IF EXISTS f_t_commune_itineraire_relations_id_tgr ON f_t_commune;
+DROP TRIGGER IF EXISTS f_t_secteur_itineraire_relations_id_tgr ON f_t_secteur;
+
+CREATE OR REPLACE FUNCTION itineraire_relations_evenement_id() RETURNS trigger AS $$
+DECLARE
+    rec record;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        FOR rec IN SELECT intervalle FROM e_r_evenement_troncon WHERE evenement = NEW.evenement
+        LOOP
+            PERFORM ft_itineraire_relations_ajout(NEW.evenement, rec.intervalle);
+        END LOOP;
+    ELSE
+        PERFORM ft_itineraire_relations(ARRAY(
+            SELECT DISTINCT unnest(ft_itineraires_intervalle(intervalle))
+            FROM e_r_evenement_troncon WHERE evenement = OLD.evenement));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER o_t_itineraire_relations_i_tgr
+AFTER INSERT ON o_t_itineraire
+FOR EACH ROW EXECUTE PROCEDURE itineraire_relations_evenement_id();
+
+CREATE TRIGGER o_t_poi_itineraire_relations_i_tgr
+AFTER INSERT ON o_t_poi
+FOR EACH ROW EXECUTE PROCEDURE itineraire_relations_evenement_id();
+
+CREATE TRIGGER f_t_commune_itineraire_relations_id_tgr
+AFTER INSERT OR DELETE ON f_t_commune
+FOR EACH ROW EXECUTE PROCEDURE itineraire_relations_evenement_id();
+
+CREATE TRIGGER f_t_secteur_itineraire_relations_id_tgr
+AFTER INSERT OR DELETE ON f_t_secteur
+FOR EACH ROW EXECUTE PROCEDURE itineraire_relations_evenement_id();
+
+
+-------------------------------------------------------------------------------
+-- Fill relations of existing treks
+-------------------------------------------------------------------------------
+
+SELECT ft_itineraire_relations(array_agg(evenement))
+FROM o_t_itineraire
+WHERE NOT EXISTS (SELECT 1 FROM o_r_itineraire_poi)
+  AND NOT EXISTS (SELECT 1 FROM o_r_itineraire_commune)
+  AND NOT EXISTS (SELECT 1 FROM o_r_itineraire_secteur);
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
-from geotrek.land.tests.filters import LandFiltersTest
+from geotrek.land.tests.filters import LandFiltersTest, EdgeFiltersQueriesTest
 
-from geotrek.trekking.filters import TrekFilter
+from geotrek.trekking.filters import TrekFilter, POIFilter
 from geotrek.trekking.factories import TrekFactory
 
 
@@ -14,3 +14,13 @@ class TrekFilterLandTest(LandFiltersTest):
         useless_path, seek_path = super(TrekFilterLandTest, self).create_pair_of_distinct_path()
         self.create_pair_of_distinct_topologies(TrekFactory, useless_path, seek_path)
         return useless_path, seek_path
+
+
+class TrekFilterQueriesTest(EdgeFiltersQueriesTest):
+
+    filterclass = TrekFilter
+
+
+class POIFilterQueriesTest(EdgeFiltersQueriesTest):
+
+    filterclass = POIFilter
@@ -2,6 +2,8 @@
 # -*- coding: utf-8 -*-
 from django.conf import settings
 from django.test import TestCase
+from django.test.utils import override_settings
+from django.core.cache import get_cache
 
 from django.contrib.gis.geos import LineString, Polygon, MultiPolygon, MultiLineString
 import json
@@ -12,11 +14,13 @@ from mapentity.tests import MapEntityLiveTest
 
 from geotrek.common.factories import AttachmentFactory
 from geotrek.common.tests import CommonTest
+from geotrek.common.utils import polyline_decode
 from geotrek.common.utils.testdata import get_dummy_uploaded_image, get_dummy_uploaded_document
 from geotrek.authent.factories import TrekkingManagerFactory
 from geotrek.core.factories import PathFactory, PathAggregationFactory
 from geotrek.land.factories import DistrictFactory
-from geotrek.trekking.models import POI, Trek
+from geotrek.trekking.models import POI, Trek, TrekPOI, TrekDistrict
+from geotrek.trekking.helpers import TrekCacheHelper
 from geotrek.trekking.factories import (POIFactory, POITypeFactory, TrekFactory,
                                         TrekNetworkFactory, UsageFactory, WebLinkFactory,
                                         ThemeFactory, InformationDeskFactory)
@@ -93,6 +97,36 @@ class POIViewsTest(CommonTest):
 
         settings.DEBUG = False
 
+    def test_format_list_denormalized(self):
+        self.login()
+        path = PathFactory.create(geom=LineString((0, 0, 0), (4, 4, 2)))
+        trek = TrekFactory.create(no_path=True, name=u"Trek of POI")
+        trek.add_path(path)
+        poi = POIFactory.create(no_path=True)
+        poi.add_path(path, start=0.6, end=0.6)
+        DistrictFactory.create(name=u"District of POI", geom=MultiPolygon(
+            Polygon(((-2, -2), (9, -2), (9, 9), (-2, 9), (-2, -2)))))
+        DistrictFactory.create(name=u"District away")
+
+        def get_csv():
+            settings.DEBUG = True
+            num_queries_old = len(connection.queries)
+            response = self.client.get(self.model.get_format_list_url() + '?format=csv')
+            nb_queries = len(connection.queries) - num_queries_old
+            settings.DEBUG = False
+            return response.content, nb_queries
+
+        content, nb_queries = get_csv()
+        self.assertTrue(u"District of POI" in content.decode('utf-8'))
+        self.assertFalse(u"District away" in content.decode('utf-8'))
+        self.assertTrue(u"Trek of POI" in content.decode('utf-8'))
+
+        # Number of queries does not depend on land layers and treks records
+        for i in range(5):
+            DistrictFactory.create()
+            TrekFactory.create()
+        self.assertEqual(get_csv()[1], nb_queries)
+
 
 class TrekViewsTest(CommonTest):
     model = Trek
@@ -220,6 +254,25 @@ class TrekCustomViewTests(TestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
 
+    def test_profile(self):
+        trek = TrekFactory.create()
+        url = reverse('trekking:trek_profile', kwargs={'pk': trek.pk})
+        profile = json.loads(self.client.get(url).content)['profile']
+        self.assertTrue(len(profile) > 2)
+
+        response = self.client.get(url, {'points': 2})
+        simplified = json.loads(response.content)['profile']
+        self.assertEqual(simplified, [profile[0], profile[-1]])
+
+        response = self.client.get(url, {'format': 'polyline'})
+        encoded = json.loads(response.content)
+        rows = polyline_decode(str(encoded['profile']), len(encoded['fields']))
+        self.assertEqual(len(rows), len(profile))
+        self.assertEqual(rows[-1][0], round(profile[-1][0]))
+
+        response = self.client.get(url, {'points': 'many'})
+        self.assertEqual(response.status_code, 400)
+
     def test_json_translation(self):
         trek = TrekFactory.build()
         trek.name_fr = 'Voie lactee'
@@ -243,6 +296,89 @@ class TrekCustomViewTests(TestCase):
         obj = json.loads(response.content)
         self.assertEqual(obj['name'], trek.name_fr)
 
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                           'LOCATION': 'trek-json-tests'},
+                               'fat': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                       'LOCATION': 'trek-json-tests-fat'}})
+    def test_json_cache(self):
+        get_cache('default').clear()
+        trek = TrekFactory.create(name='Voie lactee')
+        url = reverse('trekking:trek_json_detail', kwargs={'pk': trek.pk})
+        self.assertEqual(json.loads(self.client.get(url).content)['name'], 'Voie lactee')
+
+        # Cache hits do not touch database
+        settings.DEBUG = True
+        num_queries_old = len(connection.queries)
+        response = self.client.get(url)
+        self.assertEqual(len(connection.queries), num_queries_old)
+        settings.DEBUG = False
+        self.assertEqual(json.loads(response.content)['name'], 'Voie lactee')
+
+        # Trek or lookups changes invalidate cache
+        trek.name = 'Milky way'
+        trek.save()
+        self.assertEqual(json.loads(self.client.get(url).content)['name'], 'Milky way')
+        trek.difficulty.difficulty = 'Hard'
+        trek.difficulty.save()
+        self.assertEqual(json.loads(self.client.get(url).content)['difficulty']['label'], 'Hard')
+
+        # Warm-up (trek and catalog)
+        get_cache('default').clear()
+        self.assertEqual(TrekCacheHelper.warm([trek.pk], ['en']), 2)
+        self.assertEqual(TrekCacheHelper.warm([trek.pk], ['en']), 0)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                           'LOCATION': 'trek-catalog-tests'},
+                               'fat': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                       'LOCATION': 'trek-catalog-tests-fat'}})
+    def test_json_catalog(self):
+        get_cache('default').clear()
+        trek = TrekFactory.create(name='Voie lactee')
+        TrekFactory.create(published=False)
+        url = reverse('trekking:trek_json_catalog')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        catalog = json.loads(response.content)
+        self.assertEqual(len(catalog), 1)
+        self.assertEqual(catalog[0]['pk'], trek.pk)
+        detail = json.loads(self.client.get(reverse('trekking:trek_json_detail', args=(trek.pk,))).content)
+        self.assertItemsEqual(catalog[0].keys(), detail.keys() + ['pk'])
+        self.assertEqual(catalog[0]['name'], detail['name'])
+
+        etag = response['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['ETag'], etag)
+
+        # Regenerated when treks change
+        trek.name = 'Milky way'
+        trek.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(json.loads(response.content)[0]['name'], 'Milky way')
+
+        # And when related data change
+        etag = response['ETag']
+        trek.difficulty.difficulty = 'Hard'
+        trek.difficulty.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)[0]['difficulty']['label'], 'Hard')
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+                               'fat': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+    def test_json_catalog_without_cache(self):
+        trek = TrekFactory.create()
+        url = reverse('trekking:trek_json_catalog')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        # Changes of related data would go unnoticed
+        self.assertFalse(response.has_header('ETag'))
+        self.assertEqual(json.loads(response.content)[0]['pk'], trek.pk)
+
     def test_geojson_translation(self):
         trek = TrekFactory.create(name='Voie lactee')
         trek.name_it = 'Via Lattea'
@@ -330,6 +466,36 @@ class RelatedObjectsTest(TestCase):
         poi.delete()
         self.assertItemsEqual(trek.pois, [])
 
+    def test_relations_are_stored(self):
+        p1 = PathFactory.create(geom=LineString((0, 0, 0), (4, 4, 2)))
+        p2 = PathFactory.create(geom=LineString((4, 4, 2), (8, 8, 4)))
+        trek = TrekFactory.create(no_path=True)
+        trek.add_path(p1)
+        poi = POIFactory.create(no_path=True)
+        poi.add_path(p1, start=0.6, end=0.6)
+        d1 = DistrictFactory.create(geom=MultiPolygon(
+            Polygon(((-2, -2), (3, -2), (3, 3), (-2, 3), (-2, -2)))))
+        self.assertItemsEqual(TrekPOI.objects.values_list('trek', 'poi'), [(trek.pk, poi.pk)])
+        self.assertItemsEqual(TrekDistrict.objects.values_list('trek', 'district'), [(trek.pk, d1.pk)])
+
+        # Moving the POI away removes the relation
+        poi.aggregations.all().delete()
+        poi.add_path(p2, start=0.6, end=0.6)
+        self.assertItemsEqual(trek.pois, [])
+        self.assertItemsEqual(poi.treks, [])
+        # Extending the trek restores it
+        trek.add_path(p2)
+        self.assertItemsEqual(trek.pois, [poi])
+        self.assertItemsEqual(poi.treks, [trek])
+
+        # Reloading a land layer updates relations
+        d1.geom = MultiPolygon(Polygon(((10, 10), (20, 10), (20, 20), (10, 20), (10, 10))))
+        d1.save()
+        self.assertItemsEqual(trek.districts, [])
+        d1.geom = MultiPolygon(Polygon(((5, 5), (9, 5), (9, 9), (5, 9), (5, 5))))
+        d1.save()
+        self.assertItemsEqual(trek.districts, [d1])
+
     def test_picture(self):
         trek = TrekFactory.create()
         AttachmentFactory.create(obj=trek)
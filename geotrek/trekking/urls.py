@@ -6,7 +6,7 @@ from geotrek.core.views import ElevationProfile, ElevationChart
 from . import models
 from .views import (
     TrekDocumentPublic, TrekPrint,
-    TrekJsonDetail, TrekGPXDetail, TrekKMLDetail, TrekPOIGeoJSON,
+    TrekJsonDetail, TrekJsonCatalog, TrekGPXDetail, TrekKMLDetail, TrekPOIGeoJSON,
     WebLinkCreatePopup
 )
 
@@ -16,6 +16,7 @@ urlpatterns = patterns('',
     url(r'^api/trek/trek-(?P<pk>\d+).pdf$', TrekPrint.as_view(), name="trek_printable"),
 
     url(r'^api/trek/trek-(?P<pk>\d+).json$', TrekJsonDetail.as_view(), name="trek_json_detail"),
+    url(r'^api/trek/treks.json$', TrekJsonCatalog.as_view(), name="trek_json_catalog"),
     url(r'^api/trek/trek-(?P<pk>\d+).gpx$', TrekGPXDetail.as_view(), name="trek_gpx_detail"),
     url(r'^api/trek/trek-(?P<pk>\d+).kml$', TrekKMLDetail.as_view(), name="trek_kml_detail"),
     url(r'^api/trek/(?P<pk>\d+)/profile.json$', ElevationProfile.as_view(model=models.Trek), name="trek_profile"),
@@ -1,9 +1,18 @@
+import re
+from gzip import GzipFile
+from StringIO import StringIO
+
 from django.conf import settings
-from django.http import HttpResponse, Http404
+from django.http import HttpResponse, HttpResponseNotModified, Http404
 from django.core.urlresolvers import reverse
 from django.core.exceptions import ObjectDoesNotExist
 from django.utils.decorators import method_decorator
 from django.utils.html import escape
+from django.utils.http import parse_http_date_safe
+from django.utils.text import compress_string
+from django.utils.cache import patch_vary_headers
+from django.utils.translation import get_language
+from django.views.generic import View
 from django.views.generic.edit import CreateView
 from django.views.generic.detail import BaseDetailView
 
@@ -16,10 +25,13 @@ from paperclip.models import Attachment
 
 from geotrek.authent.decorators import trekking_manager_required
 from geotrek.core.models import AltimetryMixin
+from geotrek.core.helpers import prefetch_topology_relations
 from geotrek.common.views import FormsetMixin
+from geotrek.common.utils.postgresql import stream_sql
 from geotrek.land.models import District, City, RestrictedArea
 
-from .models import Trek, POI, WebLink
+from .models import Trek, POI, WebLink, TrekRelationship
+from .helpers import TrekCacheHelper
 from .filters import TrekFilter, POIFilter
 from .forms import TrekForm, TrekRelationshipFormSet, POIForm, WebLinkCreateFormPopup
 
@@ -77,13 +89,34 @@ class TrekJsonDetail(LastModifiedMixin, JSONResponseMixin, BaseDetailView):
                'parking_location', 'thumbnail', 'pictures',
                'cities', 'districts', 'relationships', 'map_image_url']
 
+    def dispatch(self, request, *args, **kwargs):
+        # Cached responses are served without touching database
+        key = TrekCacheHelper.response_key(kwargs['pk'], get_language())
+        cached = TrekCacheHelper.get(key)
+        if cached is not None:
+            content, content_type, last_modified = cached
+            since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE'))
+            if last_modified and since and since >= parse_http_date_safe(last_modified):
+                return HttpResponseNotModified()
+            response = HttpResponse(content, content_type=content_type)
+            if last_modified:
+                response['Last-Modified'] = last_modified
+            return response
+        response = super(TrekJsonDetail, self).dispatch(request, *args, **kwargs)
+        if response.status_code == 200:
+            TrekCacheHelper.set(key, response)
+        return response
+
     def get_context_data(self, **kwargs):
+        return self.serialize(self.object)
+
+    @classmethod
+    def serialize(cls, trek):
         ctx = {}
-        for fname in self.columns:
-            ctx[fname] = getattr(self.object, 'serializable_%s' % fname,
-                                 getattr(self.object, fname))
+        for fname in cls.columns:
+            ctx[fname] = getattr(trek, 'serializable_%s' % fname,
+                                 getattr(trek, fname))
 
-        trek = self.get_object()
         ctx['altimetric_profile'] = reverse('trekking:trek_profile', args=(trek.pk,))
         ctx['poi_layer'] = reverse('trekking:trek_poi_geojson', args=(trek.pk,))
         ctx['gpx'] = reverse('trekking:trek_gpx_detail', args=(trek.pk,))
@@ -92,9 +125,70 @@ class TrekJsonDetail(LastModifiedMixin, JSONResponseMixin, BaseDetailView):
         return ctx
 
 
+class TrekJsonCatalog(JSONResponseMixin, View):
+    """
+    All published treks, serialized as in ``TrekJsonDetail``. The catalog
+    is built once (with relations loaded in batch) and kept gzipped in
+    cache, until any trek-related data changes.
+    """
+    accepts_gzip = re.compile(r'\bgzip\b')
+
+    def get(self, request, *args, **kwargs):
+        language = get_language()
+        etag = TrekCacheHelper.catalog_etag(language)
+        if etag and etag in [e.strip() for e in request.META.get('HTTP_IF_NONE_MATCH', '').split(',')]:
+            response = HttpResponseNotModified()
+        else:
+            blob = TrekCacheHelper.get_catalog(etag)
+            if blob is None:
+                blob = compress_string(self.build())
+                TrekCacheHelper.set_catalog(etag, blob)
+            if self.accepts_gzip.search(request.META.get('HTTP_ACCEPT_ENCODING', '')):
+                response = HttpResponse(blob, content_type='application/json')
+                response['Content-Encoding'] = 'gzip'
+            else:
+                content = GzipFile(fileobj=StringIO(blob)).read()
+                response = HttpResponse(content, content_type='application/json')
+        if etag:
+            response['ETag'] = etag
+        patch_vary_headers(response, ('Accept-Encoding', 'Accept-Language'))
+        return response
+
+    def build(self):
+        treks = Trek.objects.existing().filter(published=True).order_by('pk')
+        treks = treks.select_related('difficulty', 'information_desk', 'route')
+        treks = treks.prefetch_related('themes', 'networks', 'usages', 'web_links__category')
+        treks = prefetch_topology_relations(treks, 'cities', 'districts')
+
+        pks = [trek.pk for trek in treks]
+        relationships = {}
+        for rel in TrekRelationship.objects.filter(trek_a__in=pks).select_related('trek_b'):
+            relationships.setdefault(rel.trek_a_id, []).append(rel)
+        pictures = {}
+        attachments = Attachment.objects.filter(content_type__app_label=Trek._meta.app_label,
+                                                content_type__model=Trek._meta.object_name.lower(),
+                                                object_id__in=pks)
+        for attachment in attachments:
+            if attachment.is_image and attachment.title != 'mapimage':
+                pictures.setdefault(attachment.object_id, []).append(attachment)
+
+        catalog = []
+        for trek in treks:
+            trek.relationships = relationships.get(trek.pk, [])
+            trek.pictures = pictures.get(trek.pk, [])
+            serialized = TrekJsonDetail.serialize(trek)
+            serialized['pk'] = trek.pk
+            catalog.append(serialized)
+        return self.render_to_response(catalog).content
+
+
 class TrekFormatList(MapEntityFormat, TrekList):
     columns = set(TrekList.columns + TrekJsonDetail.columns + ['related', 'pois']) - set(['relationships', 'thumbnail', 'map_image_url', 'slug'])
 
+    def get_queryset(self):
+        qs = super(TrekFormatList, self).get_queryset()
+        return prefetch_topology_relations(qs, 'cities', 'districts', 'pois')
+
 
 class TrekGPXDetail(LastModifiedMixin, BaseDetailView):
     queryset = Trek.objects.existing()
@@ -242,27 +336,51 @@ class POIJsonList(MapEntityJsonList, POIList):
 class POIFormatList(MapEntityFormat, POIList):
     columns = set(POIList.columns + ['description', 'treks', 'districts', 'cities', 'areas'])
 
+    def denormalized(self, sql, objects):
+        """
+        Objects by POI id, from ``(poi id, object pk)`` rows of ``sql``,
+        streamed with a server-side cursor. Lists keep ``objects`` order.
+        """
+        ranks = dict((o.pk, i) for i, o in enumerate(objects))
+        related = {}
+        for pid, pk in stream_sql(sql):
+            if pk in ranks:
+                related.setdefault(pid, []).append(ranks[pk])
+        return dict((pid, [objects[i] for i in sorted(indices)])
+                    for pid, indices in related.items())
+
     def get_queryset(self):
         qs = super(POIFormatList, self).get_queryset()
 
+        poi_table = POI._meta.db_table
+        poi_pk = POI._meta.pk.column
         denormalized = {}
 
-        # Since Land layers should have less records, start by them.
-        land_layers = [('districts', District),
-                       ('cities', City),
-                       ('areas', RestrictedArea)]
-        for attrname, land_layer in land_layers:
-            denormalized[attrname] = {}
-            for d in land_layer.objects.all():
-                overlapping = POI.objects.existing().filter(geom__within=d.geom)
-                for pid in overlapping.values_list('id', flat=True):
-                    denormalized[attrname].setdefault(pid, []).append(d)
-
-        # Same for treks
-        denormalized['treks'] = {}
-        for d in Trek.objects.existing():
-            for pid in d.pois.all():
-                denormalized['treks'].setdefault(pid, []).append(d)
+        # One spatial join per land layer
+        land_layers = [('districts', District.objects.defer('geom')),
+                       ('cities', City.objects.defer('geom')),
+                       ('areas', RestrictedArea.objects.defer('geom').select_related('area_type'))]
+        for attrname, land_objects in land_layers:
+            opts = land_objects.model._meta
+            sql = """
+            SELECT p.%(poi_pk)s, l.%(pk)s
+            FROM %(poi_table)s p
+            JOIN e_t_evenement e ON e.id = p.%(poi_pk)s AND NOT e.supprime
+            JOIN %(table)s l ON ST_Within(e.geom, l.geom)
+            """ % dict(poi_table=poi_table, poi_pk=poi_pk, table=opts.db_table, pk=opts.pk.column)
+            denormalized[attrname] = self.denormalized(sql, list(land_objects))
+
+        # One overlap join for treks, on aggregations intervals
+        sql = """
+        SELECT DISTINCT p.%(poi_pk)s, t.%(trek_pk)s
+        FROM %(poi_table)s p
+        JOIN e_r_evenement_troncon pa ON pa.evenement = p.%(poi_pk)s
+        JOIN e_r_evenement_troncon ta ON ta.intervalle && pa.intervalle
+        JOIN %(trek_table)s t ON t.%(trek_pk)s = ta.evenement
+        JOIN e_t_evenement e ON e.id = p.%(poi_pk)s AND NOT e.supprime
+        """ % dict(poi_table=poi_table, poi_pk=poi_pk,
+                   trek_table=Trek._meta.db_table, trek_pk=Trek._meta.pk.column)
+        denormalized['treks'] = self.denormalized(sql, list(Trek.objects.existing()))
 
         for poi in qs:
             # Put denormalized in specific attribute used in serializers
@@ -27,6 +27,7 @@ setup(
         'easy-thumbnails == 1.1',
         'simplekml == 1.2.1',
         'pygal == 1.1.0',
+        'numpy == 1.7.1',
         'mapentity',  # pinned by buildout
         'django-extended-choices',  # pinned by buildout
     ] + test_requirements,